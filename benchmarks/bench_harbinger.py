@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+#
+# Benchmark the phases of a harbinger run against a synthetic organization
+# served locally by harbinger.mock_org.
+#
+# For every organization size and scanner configuration requested, a fresh
+# reference directory is created and get_repos(), scan(),
+# check_for_releases() and write_refs() are timed in turn (or the streaming
+# pipeline as a whole). For each phase the wall time, the number of
+# requests served, the peak resident set size of the process so far and the
+# throughput (repositories or dependencies per second) are reported.
+#
+# Examples:
+#   python benchmarks/bench_harbinger.py --repos 10 1000 --latency 0.01
+#   python benchmarks/bench_harbinger.py --repos 1000 --workers 1 8 32
+#   python benchmarks/bench_harbinger.py --output before.json
+#   python benchmarks/bench_harbinger.py --output after.json --compare before.json
+#   python benchmarks/bench_harbinger.py --pipeline --compare before.json
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+
+import yaml
+
+from harbinger.scanner import Scanner
+from harbinger.pipeline import Pipeline
+from harbinger.release_notifier import ReleaseNotifier
+from harbinger.mock_github3 import mock_gh
+from harbinger.mock_org import mock_org
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, in kilobytes elsewhere.
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+
+def measure(name, func, org, items, verbose=False):
+    before = org.server.count()
+    out = sys.stdout if verbose else open(os.devnull, 'w')
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(out):
+            func()
+    finally:
+        if not verbose:
+            out.close()
+    wall = time.perf_counter() - start
+    return {'phase': name,
+            'wall': wall,
+            'requests': org.server.count() - before,
+            'items': items(),
+            'throughput': items() / wall if wall else None,
+            'peak_rss_kb': peak_rss_kb()}
+
+
+def run_case(args, repos, workers):
+    ReleaseNotifier.github = None
+    with mock_org('benchorg', repos, density=args.density, deps=args.deps,
+                  deps_per_config=args.deps_per_config,
+                  delay=args.latency, seed=args.seed) as org:
+        with tempfile.TemporaryDirectory() as refdir:
+            with open(os.path.join(refdir, 'references.yml'), 'w') as f:
+                f.write(yaml.safe_dump(org.references()))
+            with open(os.devnull, 'w') as devnull, \
+                    contextlib.redirect_stdout(devnull):
+                scanner = Scanner('benchorg', refdir,
+                                  password='token',
+                                  gh=mock_gh('tagname', repos_url=org.repos_url),
+                                  workers=workers,
+                                  check_workers=args.check_workers,
+                                  discovery=args.discovery,
+                                  pool_size=max(10, workers,
+                                                args.check_workers),
+                                  cache=False,
+                                  incremental=False,
+                                  issue_pace=0)
+            scanner.raw_url = f'{org.url}/'
+            scanner.graphql_url = f'{org.url}/graphql'
+
+            def n_repos():
+                return len(scanner.repos)
+
+            def n_deps():
+                return len(scanner.notifiers)
+
+            phases = []
+            if args.pipeline:
+                phases.append(measure('pipeline', Pipeline(scanner).run, org,
+                                      n_repos, args.verbose))
+            else:
+                phases.append(measure('get_repos', scanner.get_repos, org,
+                                      n_repos, args.verbose))
+                phases.append(measure('scan', scanner.scan, org,
+                                      n_repos, args.verbose))
+                phases.append(measure('check_for_releases',
+                                      scanner.check_for_releases, org,
+                                      n_deps, args.verbose))
+            phases.append(measure('write_refs', scanner.write_refs, org,
+                                  lambda: len(scanner.refs), args.verbose))
+    return {'repos': repos,
+            'workers': workers,
+            'check_workers': args.check_workers,
+            'discovery': args.discovery,
+            'pipeline': args.pipeline,
+            'latency': args.latency,
+            'density': args.density,
+            'configs': len(org.requested),
+            'phases': phases}
+
+
+def case_name(case):
+    return (f'{case["repos"]} repos, workers={case["workers"]}, '
+            f'check_workers={case["check_workers"]}, '
+            f'discovery={case["discovery"]}'
+            + (', pipeline' if case['pipeline'] else ''))
+
+
+def print_case(case):
+    print(f'\n{case_name(case)} ({case["configs"]} configs, '
+          f'latency {case["latency"]}s)')
+    print(f'  {"phase":<20}{"wall [s]":>10}{"requests":>10}'
+          f'{"items/s":>12}{"peak RSS [MB]":>15}')
+    for p in case['phases']:
+        throughput = p['throughput']
+        rss = p['peak_rss_kb']
+        print(f'  {p["phase"]:<20}{p["wall"]:>10.3f}{p["requests"]:>10}'
+              f'{throughput if throughput is not None else float("nan"):>12.1f}'
+              f'{rss / 1024 if rss is not None else float("nan"):>15.1f}')
+
+
+def compare(results, baseline, title):
+    '''Print the wall time of each phase, and of the whole run, relative
+    to the case of `baseline` for the same organization size.'''
+    print(f'\n{title} (wall time ratio, < 1 is faster)')
+    for case in results:
+        base = baseline.get(case['repos'])
+        if base is None or base is case:
+            continue
+        print(f'  {case_name(case)} vs. {case_name(base)}')
+        base_walls = {p['phase']: p['wall'] for p in base['phases']}
+        walls = {p['phase']: p['wall'] for p in case['phases']}
+        base_walls['total'] = sum(base_walls.values())
+        walls['total'] = sum(walls.values())
+        for phase, wall in walls.items():
+            if base_walls.get(phase):
+                ratio = wall / base_walls[phase]
+                print(f'    {phase:<20}{base_walls[phase]:>10.3f}'
+                      f' -> {wall:>8.3f}  x{ratio:.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='Time the phases of a harbinger run against a local '
+            'synthetic Github organization.')
+    parser.add_argument('--repos', type=int, nargs='+', default=[10, 1000],
+                        help='Organization sizes to run. Default: 10 1000')
+    parser.add_argument('--density', type=float, default=0.2,
+                        help='Fraction of repositories with a harbinger.cfg '
+                        'file. Default: 0.2')
+    parser.add_argument('--deps', type=int, default=20,
+                        help='Number of distinct upstream dependencies. '
+                        'Default: 20')
+    parser.add_argument('--deps-per-config', type=int, default=2,
+                        help='Dependencies requested per config. Default: 2')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Seconds added to every response. Default: 0')
+    parser.add_argument('-w', '--workers', type=int, nargs='+', default=[1],
+                        help='Config fetch concurrency levels to run; the '
+                        'first is the baseline of the comparison. Default: 1')
+    parser.add_argument('-c', '--check-workers', type=int, default=1,
+                        help='Dependency check concurrency. Default: 1')
+    parser.add_argument('--discovery', choices=['rest', 'graphql'],
+                        default='rest', help='Discovery method. Default: rest')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Time the streaming pipeline instead of the '
+                        'separate phases.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the synthetic organization. Default: 0')
+    parser.add_argument('--output', type=str,
+                        help='Write the results to this JSON file.')
+    parser.add_argument('--compare', type=str,
+                        help='JSON results of an earlier benchmark run to '
+                        'compare against.')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Show the output of harbinger itself.')
+    args = parser.parse_args()
+
+    results = []
+    for repos in args.repos:
+        for workers in args.workers:
+            case = run_case(args, repos, workers)
+            print_case(case)
+            results.append(case)
+
+    if len(args.workers) > 1:
+        first = {case['repos']: case for case in results
+                 if case['workers'] == args.workers[0]}
+        compare(results, first, f'Compared to workers={args.workers[0]}')
+    if args.compare:
+        with open(args.compare) as f:
+            earlier = json.load(f)
+        # Each case is compared to the earlier case of the same size run
+        # with the same number of workers, if any, else to the first one.
+        for workers in args.workers:
+            baseline = {}
+            for case in earlier:
+                if (case['repos'] not in baseline or
+                        case['workers'] == workers):
+                    baseline[case['repos']] = case
+            compare([case for case in results if case['workers'] == workers],
+                    baseline, f'Compared to {args.compare}')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
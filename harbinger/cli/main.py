@@ -13,6 +13,26 @@ import json
 
 from harbinger.release_notifier import *
 from harbinger.scanner import *
+from harbinger.daemon import Daemon
+from harbinger.schedule import PollSchedule
+from harbinger.ratelimit import RateLimiter
+from harbinger.pipeline import Pipeline
+from harbinger.lookup_cache import LookupCache
+from harbinger.multiscanner import MultiScanner, read_targets
+from harbinger import subscribers
+
+def list_subscribers(dep, refdir):
+    '''Print the repositories requesting `dep` according to the index
+    saved by the last scan. Needs no Github access.'''
+    subs = subscribers.read_all(refdir).get(dep, [])
+    if not subs:
+        print(f'No repository requests {dep}.')
+        return
+    print(f'{dep} is requested by {len(subs)} repositories:')
+    for sub in subs:
+        params = ', '.join(f'{k}: {v}' for k, v in sub['params'].items())
+        print(f'  {sub["repo"]}' + (f' ({params})' if params else ''))
+
 
 def main():
 
@@ -52,10 +72,143 @@ def main():
     parser.add_argument('-o',
                         '--org',
                         type=str,
-                        help='Github organization (or user account) scan.')
+                        action='append',
+                        help='Github organization (or user account) scan. '
+                        'May be given several times to scan several '
+                        'organizations in one run.')
+    parser.add_argument('-t',
+                        '--targets',
+                        type=str,
+                        help='YAML file listing further organizations (or '
+                        'user accounts) to scan.')
+    parser.add_argument('-w',
+                        '--workers',
+                        type=int,
+                        default=1,
+                        help='Number of repositories to check for a '
+                        'harbinger.cfg file concurrently. Default: 1')
+    parser.add_argument('-c',
+                        '--check-workers',
+                        type=int,
+                        default=1,
+                        help='Number of dependencies to check for new '
+                        'releases concurrently. Default: 1')
+    parser.add_argument('--no-cache',
+                        action='store_true',
+                        help='Do not use or update the HTTP response cache '
+                        'kept in the reference directory.')
+    parser.add_argument('--store',
+                        choices=['yaml', 'sqlite'],
+                        default='yaml',
+                        help='Format in which reference versions are kept in '
+                        'the reference directory: references.yml or an SQLite '
+                        'database, references.db, which is seeded from '
+                        'references.yml when first used. Default: yaml')
+    parser.add_argument('--full-scan',
+                        action='store_true',
+                        help='Fetch the harbinger.cfg file of every '
+                        'repository, instead of only those of repositories '
+                        'pushed to since the previous scan.')
+    parser.add_argument('--discovery',
+                        choices=['rest', 'graphql'],
+                        default='rest',
+                        help='Method used to list repositories and retrieve '
+                        'their harbinger.cfg files. \'graphql\' needs only '
+                        'one request per 100 repositories but requires the '
+                        'password to be a Github access token. Default: rest')
+    parser.add_argument('--min-interval',
+                        type=float,
+                        default=0,
+                        help='Minimum number of seconds between two checks '
+                        'of the same dependency. Default: 0')
+    parser.add_argument('--max-interval',
+                        type=float,
+                        default=0,
+                        help='Maximum number of seconds between two checks '
+                        'of the same dependency. Within these bounds, each '
+                        'dependency is checked at a rate that follows its '
+                        'observed release cadence. Default: the minimum')
+    parser.add_argument('--rate',
+                        type=float,
+                        help='Maximum sustained number of Github requests per '
+                        'second. Independently of this, requests pause when '
+                        'the Github rate limit quota runs low. Default: no '
+                        'pacing')
+    parser.add_argument('--on-existing',
+                        choices=['skip', 'comment'],
+                        default='skip',
+                        help='What to do with a release notice when an issue '
+                        'for it is already open in the target repository: '
+                        'skip it or add it as a comment. The notice of a '
+                        'newer release is always added as a comment to the '
+                        'open issue. Default: skip')
+    parser.add_argument('--pool-size',
+                        type=int,
+                        default=10,
+                        help='Number of HTTP connections kept open per host '
+                        'for reuse. Default: 10')
+    parser.add_argument('--timeout',
+                        type=float,
+                        default=30,
+                        help='Seconds to wait on an unresponsive server '
+                        'before giving up. Default: 30')
+    parser.add_argument('--pipeline',
+                        action='store_true',
+                        help='Overlap repository discovery, config retrieval, '
+                        'dependency checks and issue posting, so that release '
+                        'notices go out while the scan is still in progress.')
+    parser.add_argument('--lookup-cache',
+                        type=str,
+                        help='SQLite file in which to keep recent upstream '
+                        'lookup results. Harbinger instances given the same '
+                        'file reuse each other\'s results. Default: none')
+    parser.add_argument('--lookup-ttl',
+                        type=float,
+                        default=3600,
+                        help='Seconds for which a lookup result kept in the '
+                        'lookup cache is reused. Default: 3600')
+    parser.add_argument('--metrics',
+                        type=str,
+                        help='File to which counters and timings of the run '
+                        'are written: in the Prometheus text format if the '
+                        'name ends in .prom, as a JSON report otherwise. In '
+                        'serve mode it is rewritten after each scan and '
+                        'check.')
+    subparsers = parser.add_subparsers(dest='command',
+                                       title='commands',
+                                       description='Without a command, run a '
+                                       'single scan and check, then exit.')
+    serve = subparsers.add_parser('serve',
+                                  help='Run continuously, rescanning '
+                                  'repositories and checking dependencies on '
+                                  'their own schedules.')
+    serve.add_argument('--scan-interval',
+                       type=float,
+                       default=3600,
+                       help='Seconds between scans of the repositories for '
+                       'harbinger.cfg files. Default: 3600')
+    serve.add_argument('--check-interval',
+                       type=float,
+                       default=900,
+                       help='Seconds between checks of the dependencies for '
+                       'new releases. Default: 900')
+    serve.add_argument('--jitter',
+                       type=float,
+                       default=0.1,
+                       help='Fraction by which each interval is randomly '
+                       'varied. Default: 0.1')
+    subs = subparsers.add_parser('subscribers',
+                                 help='List the repositories requesting a '
+                                 'dependency, as found by the last scan.')
+    subs.add_argument('dep',
+                      help='Dependency name, as used in harbinger.cfg files.')
    
     args = parser.parse_args()
 
+    if args.command == 'subscribers':
+        list_subscribers(args.dep, args.refdir or './')
+        return
+
     #if not args.dry_run:
     if not args.username:
         try:
@@ -86,14 +239,66 @@ def main():
     else:
         refdir = './'
 
-    org = args.org
+    orgs = list(args.org or [])
+    if args.targets:
+        orgs += read_targets(args.targets)
+    # Keep the first occurrence of each organization.
+    orgs = list(dict.fromkeys(orgs))
+    if not orgs:
+        parser.error('No organization given; use -o or -t.')
+    if args.pipeline and len(orgs) > 1:
+        parser.error('--pipeline supports a single organization.')
     
     username = os.environ[username_envvar]
     password = os.environ[password_envvar]
     
+    schedule = PollSchedule(min_interval=args.min_interval,
+                            max_interval=max(args.min_interval,
+                                             args.max_interval))
+    lookup_cache = None
+    if args.lookup_cache:
+        lookup_cache = LookupCache(args.lookup_cache, ttl=args.lookup_ttl)
     #scanner = Scanner(org, refdir, username, password, args.dry_run)
-    scanner = Scanner(org, refdir, username, password)
-    repos = scanner.get_repos()
-    scanner.scan()
-    scanner.check_for_releases()
-    scanner.write_refs()
+    if len(orgs) > 1:
+        scanner_class = MultiScanner
+        org = orgs
+    else:
+        scanner_class = Scanner
+        org = orgs[0]
+    scanner = scanner_class(org, refdir, username, password,
+                            workers=args.workers,
+                            cache=not args.no_cache, discovery=args.discovery,
+                            check_workers=args.check_workers,
+                            schedule=schedule,
+                            limiter=RateLimiter(rate=args.rate),
+                            pool_size=max(args.pool_size, args.workers,
+                                          args.check_workers),
+                            timeout=args.timeout,
+                            incremental=not args.full_scan,
+                            store=args.store, on_existing=args.on_existing,
+                            lookup_cache=lookup_cache)
+    if args.command == 'serve':
+        daemon = Daemon(scanner,
+                        scan_interval=args.scan_interval,
+                        check_interval=args.check_interval,
+                        jitter=args.jitter,
+                        metrics_file=args.metrics)
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            pass
+        return
+    # The references of the dependencies checked before a failure are
+    # written all the same.
+    try:
+        if args.pipeline:
+            Pipeline(scanner).run()
+        else:
+            repos = scanner.get_repos()
+            scanner.scan()
+            scanner.check_for_releases()
+    finally:
+        scanner.write_refs()
+    print(f'Github API usage: {scanner.limiter.report()}')
+    if args.metrics:
+        scanner.metrics.write(args.metrics)
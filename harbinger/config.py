@@ -0,0 +1,164 @@
+# Compiled repository configs.
+#
+# A harbinger.cfg file is parsed into a RepoConfig: the dependencies it
+# requests, each with its parameters, and the problems found with it. Every
+# dependency must be served by an available plugin, and plugins may check
+# their own parameters through a validate_params() classmethod, so mistakes
+# such as a misspelt dependency name or an unknown release style are reported
+# when the config is scanned rather than when the dependency is checked.
+# Dependencies with problems are left out; the others are still monitored.
+#
+# Compiled configs are cached on disk by the hash of the file contents, so a
+# config is only parsed and validated again once the file changes.
+import os
+import json
+import time
+import hashlib
+import threading
+import configparser
+
+from .plugins.registry import registry
+from .utils import atomic_write
+
+# Bump when the compiled form or the validation rules change, so that older
+# cache entries are no longer used.
+schema_version = 1
+
+
+class RepoConfig():
+    '''RepoConfig class
+
+    Parameters
+    ----------
+    deps: Valid dependencies requested, mapped to their parameters (dict of
+          str to str).
+    errors: Descriptions of the problems found in the config file.
+    '''
+
+    def __init__(self, deps=None, errors=None):
+        self.deps = deps if deps is not None else {}
+        self.errors = errors if errors is not None else []
+
+    @property
+    def valid(self):
+        return not self.errors
+
+    def to_dict(self):
+        return {'deps': {dep: dict(params) for dep, params in self.deps.items()},
+                'errors': list(self.errors)}
+
+    @classmethod
+    def from_dict(cls, data):
+        # Copies are made both ways, as parameters are handed on to plugins.
+        return cls({dep: dict(params) for dep, params in data['deps'].items()},
+                   list(data['errors']))
+
+
+def validate_dep(dep, params):
+    '''Return the problems with the dependency `dep` requested with
+    `params`, and whether the plugin serving it could be found.'''
+    try:
+        plugin_class = registry.get(dep, params)
+    except ImportError:
+        return [f'[{dep}]: no plugin available for this dependency'], False
+    validate = getattr(plugin_class, 'validate_params', None)
+    if validate is None:
+        return [], True
+    return [f'[{dep}]: {problem}' for problem in validate(params)], True
+
+
+def compile_config(rawconfig):
+    '''Parse and validate the contents of a harbinger.cfg file. Returns
+    the RepoConfig and whether it may be cached, which it may not if a
+    plugin could not be found, as it may be installed later on.'''
+    config = configparser.ConfigParser()
+    try:
+        config.read_string(rawconfig)
+    except configparser.Error as e:
+        # Error messages may span several lines; the first one says it all.
+        message = str(e).splitlines()[0]
+        return RepoConfig(errors=[f'unreadable config: {message}']), True
+    repoconfig = RepoConfig()
+    cacheable = True
+    for dep in config.sections():
+        params = dict(config[dep])
+        problems, found = validate_dep(dep, params)
+        cacheable = cacheable and found
+        if problems:
+            repoconfig.errors.extend(problems)
+        else:
+            repoconfig.deps[dep] = params
+    return repoconfig, cacheable
+
+
+class ConfigCache():
+    '''ConfigCache class
+
+    Parameters
+    ----------
+    path: File in which compiled configs are persisted between runs. It is
+          created on the first call to save().
+    max_age: Entries not used for this many seconds are dropped on save.
+             Default value: 30 days
+    clock: Function returning the current time, in seconds.
+    metrics: Optional Metrics object in which to count cache hits and
+             misses.
+    '''
+
+    def __init__(self, path, max_age=30 * 24 * 3600, clock=time.time,
+                 metrics=None):
+        self.path = path
+        self.max_age = max_age
+        self.clock = clock
+        self.metrics = metrics
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.entries = json.load(f)
+
+    def save(self):
+        now = self.clock()
+        with self._lock:
+            self.entries = {key: entry for key, entry in self.entries.items()
+                            if now - entry['used'] <= self.max_age}
+            text = json.dumps(self.entries)
+        atomic_write(self.path, text)
+
+    def count(self, name):
+        if self.metrics is not None:
+            self.metrics.incr(name)
+
+    @staticmethod
+    def key(rawconfig):
+        data = f'{schema_version}\0{rawconfig}'.encode()
+        return hashlib.sha256(data).hexdigest()
+
+    def compile(self, rawconfig):
+        '''Return the RepoConfig of the config file contents `rawconfig`,
+        compiling it only if it is not in the cache.'''
+        key = self.key(rawconfig)
+        now = self.clock()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry['used'] = now
+                self.hits += 1
+                self.count('config_cache_hits')
+                return RepoConfig.from_dict(entry['config'])
+            self.misses += 1
+        self.count('config_cache_misses')
+        repoconfig, cacheable = compile_config(rawconfig)
+        if cacheable:
+            with self._lock:
+                self.entries[key] = {'config': repoconfig.to_dict(),
+                                     'used': now}
+        return repoconfig
+
+    def __len__(self):
+        return len(self.entries)
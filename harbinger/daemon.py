@@ -0,0 +1,111 @@
+# Long-running service mode.
+#
+# Instead of being relaunched by cron, a single process keeps its Scanner,
+# and with it the authenticated Github session, the reference values and
+# the discovered repository configs, in memory between cycles. Repository
+# configs are rescanned and dependencies rechecked on separate schedules.
+import time
+import random
+import traceback
+
+
+class Daemon():
+    '''Daemon class
+
+    Parameters
+    ----------
+    scanner: Scanner object kept alive between cycles.
+    scan_interval: Seconds between rescans of the repositories for
+                   harbinger.cfg files.
+    check_interval: Seconds between checks of the dependencies for new
+                    releases. Reference values are written after each check.
+    jitter: Fraction by which each interval is randomly lengthened or
+            shortened, so that several instances do not hit the same
+            servers in lockstep.
+    clock: Function returning the current time in seconds.
+    sleep: Function used to wait between cycles.
+    metrics_file: File to which the scanner's metrics are written after
+                  each task, e.g. for the Prometheus textfile collector.
+                  Default value: None
+    '''
+
+    def __init__(self,
+                 scanner,
+                 scan_interval=3600,
+                 check_interval=900,
+                 jitter=0.1,
+                 clock=time.monotonic,
+                 sleep=time.sleep,
+                 metrics_file=None):
+        self.scanner = scanner
+        self.scan_interval = scan_interval
+        self.check_interval = check_interval
+        self.jitter = jitter
+        self.clock = clock
+        self.sleep = sleep
+        self.metrics_file = metrics_file
+        # Both tasks are due immediately on startup.
+        self.next_scan = self.clock()
+        self.next_check = self.next_scan
+        self.running = False
+
+    def jittered(self, interval):
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def rescan(self):
+        self.scanner.get_repos()
+        self.scanner.scan()
+
+    def recheck(self):
+        # The references of the dependencies checked before a failure are
+        # written all the same.
+        try:
+            self.scanner.check_for_releases()
+        finally:
+            self.scanner.write_refs()
+        limiter = getattr(self.scanner, 'limiter', None)
+        if limiter:
+            print(f'Github API usage: {limiter.report()}')
+
+    def step(self):
+        '''Run whichever tasks are due and return the number of seconds
+        until the next one is.'''
+        now = self.clock()
+        if now >= self.next_scan:
+            self.run_task(self.rescan)
+            self.next_scan = now + self.jittered(self.scan_interval)
+            # Check newly discovered configs right away.
+            self.next_check = now
+        if now >= self.next_check:
+            self.run_task(self.recheck)
+            self.next_check = now + self.jittered(self.check_interval)
+        return max(0, min(self.next_scan, self.next_check) - self.clock())
+
+    def run_task(self, task):
+        # A failed cycle (e.g. a network outage) must not end the service;
+        # the task is simply retried when it next comes due.
+        metrics = getattr(self.scanner, 'metrics', None)
+        try:
+            task()
+        except Exception:
+            traceback.print_exc()
+            if metrics is not None:
+                metrics.incr('task_failures', task=task.__name__)
+        if metrics is not None and self.metrics_file:
+            metrics.write(self.metrics_file)
+
+    def run(self, cycles=None):
+        '''Run until stop() is called or, if given, `cycles` steps have been
+        taken.'''
+        self.running = True
+        while self.running:
+            delay = self.step()
+            if cycles is not None:
+                cycles -= 1
+                if cycles <= 0:
+                    break
+            self.sleep(delay)
+        self.running = False
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,143 @@
+# Repository discovery backends.
+#
+# A discovery backend enumerates the repositories of the organization (or
+# user account) being scanned and retrieves the harbinger config file, if
+# any, from each of them. Scanner delegates both steps to the backend
+# selected by name when it is constructed.
+from abc import ABC, abstractmethod
+
+import requests
+
+
+class Discovery(ABC):
+    '''Discovery class
+
+    Parameters
+    ----------
+    scanner: The Scanner object the backend discovers repositories for.
+             Backends use its org, cfg_file, credentials and HTTP helpers.
+    '''
+
+    def __init__(self, scanner):
+        self.scanner = scanner
+        # Time of the latest push to each listed repository, as an ISO 8601
+        # string, filled in while paging.
+        self.pushed_at = {}
+
+    @abstractmethod
+    def pages(self):
+        '''Yield successive lists of repository names until all
+        repositories of the account have been listed. Record the time of
+        the latest push to each in self.pushed_at.'''
+
+    @abstractmethod
+    def fetch_config(self, repo):
+        '''Return the raw text of the config file of `repo`, or None if
+        the repository does not provide one. Failures to retrieve it are
+        raised.'''
+
+
+class RESTDiscovery(Discovery):
+    '''List repositories through the paged REST API and fetch each config
+    file separately from raw.githubusercontent.com.
+
+    Costs one request per 100 repositories plus one request per
+    repository.'''
+
+    def pages(self):
+        page = 1
+        while True:
+            url = f'{self.scanner.acc.repos_url}?per_page=100&page={page}'
+            jdata = self.scanner.getjson(url)
+            if jdata == []:
+                return
+            for repo in jdata:
+                self.pushed_at[repo['name']] = repo.get('pushed_at')
+            yield [repo['name'] for repo in jdata]
+            page += 1
+
+    def fetch_config(self, repo):
+        # NOTE: This raw link takes a nonzero amount of time to reflect
+        #       the file contents. The graphql backend avoids this.
+        scanner = self.scanner
+        url = f'{scanner.raw_url}{scanner.org}/{repo}/master/{scanner.cfg_file}'
+        try:
+            return scanner.fetch(url)
+        except requests.HTTPError as e:
+            # Only a missing file means there is no config; other errors
+            # say nothing about it.
+            if e.response is not None and e.response.status_code == 404:
+                return None
+            raise
+
+
+class GraphQLDiscovery(Discovery):
+    '''List repositories together with the contents of their config file
+    blob using the Github GraphQL API.
+
+    Costs one request per 100 repositories. The config file text is
+    collected while paging, so fetch_config() makes no requests of its
+    own. The API requires a token, which is taken from the scanner's
+    password.'''
+
+    query = '''
+query($login: String!, $cursor: String, $expression: String!) {
+  repositoryOwner(login: $login) {
+    repositories(first: 100, after: $cursor) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        name
+        pushedAt
+        object(expression: $expression) { ... on Blob { text } }
+      }
+    }
+  }
+}
+'''
+
+    def __init__(self, scanner):
+        super().__init__(scanner)
+        self.configs = {}
+
+    def post(self, variables):
+        scanner = self.scanner
+        headers = {}
+        if scanner.password:
+            headers['Authorization'] = f'bearer {scanner.password}'
+        response = scanner.session.post(scanner.graphql_url,
+                                        json={'query': self.query,
+                                              'variables': variables},
+                                        headers=headers)
+        response.raise_for_status()
+        jdata = response.json()
+        if jdata.get('errors'):
+            raise RuntimeError(f'GraphQL query failed: {jdata["errors"]}')
+        return jdata['data']
+
+    def pages(self):
+        variables = {'login': self.scanner.org,
+                     'cursor': None,
+                     'expression': f'master:{self.scanner.cfg_file}'}
+        while True:
+            data = self.post(variables)
+            repositories = data['repositoryOwner']['repositories']
+            names = []
+            for node in repositories['nodes']:
+                names.append(node['name'])
+                self.pushed_at[node['name']] = node.get('pushedAt')
+                blob = node['object']
+                if blob and blob.get('text') is not None:
+                    self.configs[node['name']] = blob['text']
+            yield names
+            if not repositories['pageInfo']['hasNextPage']:
+                return
+            variables['cursor'] = repositories['pageInfo']['endCursor']
+
+    def fetch_config(self, repo):
+        return self.configs.get(repo)
+
+
+backends = {
+    'rest': RESTDiscovery,
+    'graphql': GraphQLDiscovery,
+}
@@ -0,0 +1,103 @@
+# Persistent cache of HTTP validators and response bodies.
+#
+# Between scheduled runs almost none of the repository listing pages or
+# harbinger.cfg files change. Remembering the ETag/Last-Modified validators
+# sent with each response allows the next run to issue conditional requests
+# that the server answers with a body-less '304 Not Modified', which is both
+# faster and, for the Github API, does not count against the rate limit.
+# The plugins keep the validators of upstream resources in the reference
+# values instead, using the helper functions below.
+import os
+import json
+import threading
+
+from .utils import atomic_write
+
+# Key under which each validator is saved, and the response header carrying
+# it.
+validator_headers = (('etag', 'ETag'), ('last_modified', 'Last-Modified'))
+
+
+def conditional_headers(saved, prefix=''):
+    '''Return the conditional request headers built from the validators
+    saved in the dict `saved`, under keys starting with `prefix`.'''
+    headers = {}
+    if saved.get(f'{prefix}etag'):
+        headers['If-None-Match'] = saved[f'{prefix}etag']
+    if saved.get(f'{prefix}last_modified'):
+        headers['If-Modified-Since'] = saved[f'{prefix}last_modified']
+    return headers
+
+
+def response_validators(headers, prefix='', extra=()):
+    '''Return the validators present in the response `headers`, keyed for
+    saving with `prefix`. `extra` gives further (key, header) pairs to
+    record, e.g. Content-Length.'''
+    validators = {}
+    for key, header in validator_headers + tuple(extra):
+        if headers.get(header):
+            validators[f'{prefix}{key}'] = headers[header]
+    return validators
+
+
+def validators_match(saved, validators, prefix=''):
+    '''Do the `validators` of a response match those saved in `saved`?
+    Some servers ignore conditional requests and send the full content with
+    its validators, which still show whether it has changed. Extra
+    validators are only trusted alongside an ETag or Last-Modified.'''
+    if not any(f'{prefix}{key}' in validators for key, header in
+               validator_headers):
+        return False
+    return all(saved.get(key) == value for key, value in validators.items())
+
+
+class HTTPCache():
+    '''HTTPCache class
+
+    Parameters
+    ----------
+    path: File in which cache entries are persisted between runs. It is
+          created on the first call to save().
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.entries = json.load(f)
+
+    def save(self):
+        with self._lock:
+            text = json.dumps(self.entries)
+        atomic_write(self.path, text)
+
+    def request_headers(self, url):
+        '''Return the conditional request headers to send for `url`.'''
+        with self._lock:
+            entry = self.entries.get(url)
+        return conditional_headers(entry or {})
+
+    def get(self, url):
+        '''Return the cached body for `url`.'''
+        with self._lock:
+            return self.entries[url]['body']
+
+    def store(self, url, headers, body):
+        '''Record the body of a successful response to `url` if the server
+        provided any validators with it.'''
+        validators = response_validators(headers)
+        if not validators:
+            return
+        entry = {'etag': None, 'last_modified': None, 'body': body}
+        entry.update(validators)
+        with self._lock:
+            self.entries[url] = entry
+
+    def discard(self, url):
+        with self._lock:
+            self.entries.pop(url, None)
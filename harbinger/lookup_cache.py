@@ -0,0 +1,126 @@
+# Cross-run cache of upstream version lookups.
+#
+# Several harbinger instances (e.g. one per organization) tend to monitor the
+# same upstream projects. The outcome of a lookup only depends on the plugin,
+# its parameters and the reference version it is compared against, so it can
+# be shared: the result of each lookup is kept in an SQLite file, for a
+# limited time, and instances pointed at the same file reuse each other's
+# results instead of querying the upstream project again.
+import json
+import time
+import sqlite3
+import hashlib
+
+from .schedule import PollSchedule
+
+
+class LookupCache():
+    '''LookupCache class
+
+    Parameters
+    ----------
+    path: SQLite file holding the cached lookups. May be shared by any
+          number of harbinger processes.
+    ttl: Number of seconds a lookup result remains valid.
+         Default value: 3600
+    max_entries: Number of lookup results kept. When exceeded, the least
+                 recently used results are evicted.
+                 Default value: 1000
+    clock: Function returning the current time in seconds since the epoch.
+    '''
+
+    schema = '''
+CREATE TABLE IF NOT EXISTS lookups (
+    key TEXT PRIMARY KEY,
+    plugin TEXT NOT NULL,
+    result TEXT NOT NULL,
+    stored REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lookups_used ON lookups (used);
+'''
+
+    def __init__(self,
+                 path,
+                 ttl=3600,
+                 max_entries=1000,
+                 clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+
+    def connect(self):
+        # Other processes may hold a write lock for a short while.
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.executescript(self.schema)
+        return conn
+
+    @staticmethod
+    def key(plugin, params, ref):
+        '''Return the cache key of a lookup made by the plugin named
+        `plugin` with `params`, against the reference dict `ref`. Scheduling
+        fields of the reference do not affect the lookup and are left out.'''
+        ref = {k: v for k, v in (ref or {}).items()
+               if k not in PollSchedule.fields}
+        data = json.dumps([plugin, params, ref], sort_keys=True, default=str)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def get(self, key):
+        '''Return the result stored under `key`, or None if there is none
+        or it has expired.'''
+        now = self.clock()
+        conn = self.connect()
+        try:
+            with conn:
+                row = conn.execute('SELECT result, stored FROM lookups '
+                                   'WHERE key = ?', (key,)).fetchone()
+                if row is None or now - row[1] >= self.ttl:
+                    if row is not None:
+                        conn.execute('DELETE FROM lookups WHERE key = ?',
+                                     (key,))
+                    self.misses += 1
+                    return None
+                conn.execute('UPDATE lookups SET used = ? WHERE key = ?',
+                             (now, key))
+        finally:
+            conn.close()
+        self.hits += 1
+        return json.loads(row[0])
+
+    def fresh(self, key):
+        '''Is an unexpired result stored under `key`? Unlike get(), does
+        not count as a use of the entry.'''
+        conn = self.connect()
+        try:
+            row = conn.execute('SELECT stored FROM lookups WHERE key = ?',
+                               (key,)).fetchone()
+        finally:
+            conn.close()
+        return row is not None and self.clock() - row[0] < self.ttl
+
+    def put(self, key, plugin, result):
+        '''Store the JSON-serializable `result` of a lookup made by the
+        plugin named `plugin` under `key`.'''
+        now = self.clock()
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO lookups '
+                             'VALUES (?, ?, ?, ?, ?)',
+                             (key, plugin, json.dumps(result), now, now))
+                conn.execute('DELETE FROM lookups WHERE key NOT IN '
+                             '(SELECT key FROM lookups '
+                             'ORDER BY used DESC LIMIT ?)',
+                             (self.max_entries,))
+        finally:
+            conn.close()
+
+    def __len__(self):
+        conn = self.connect()
+        try:
+            return conn.execute('SELECT COUNT(*) FROM lookups').fetchone()[0]
+        finally:
+            conn.close()
@@ -0,0 +1,183 @@
+# Run metrics.
+#
+# A Metrics object collects counters and latency histograms during a run:
+# the time taken by each phase, each HTTP request and each plugin lookup,
+# and the number of requests, cache hits, missing files and rate limit
+# waits. They are exported at the end of a run either as a JSON report or in
+# the Prometheus text format, for instance to a file picked up by the node
+# exporter textfile collector.
+import json
+import time
+import threading
+import functools
+import contextlib
+
+from .utils import atomic_write
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram():
+    '''Distribution of observed values over fixed buckets.'''
+
+    def __init__(self, buckets=default_buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def cumulative(self):
+        '''Return (upper bound, number of values at or below it) pairs,
+        ending with the '+Inf' bucket.'''
+        pairs = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            pairs.append((bound, total))
+        pairs.append(('+Inf', self.count))
+        return pairs
+
+
+class Metrics():
+    '''Metrics class
+
+    Parameters
+    ----------
+    prefix: Prefix of the metric names in the Prometheus export.
+            Default value: 'harbinger'
+    clock: Function used to time operations.
+
+    Metrics are identified by a name and a set of labels given as keyword
+    arguments, e.g. incr('http_requests', host='api.github.com').
+    All methods may be called from several threads at once.
+    '''
+
+    def __init__(self, prefix='harbinger', clock=time.perf_counter):
+        self.prefix = prefix
+        self.clock = clock
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(name, labels):
+        return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+    def incr(self, name, amount=1, **labels):
+        '''Add `amount` to a counter.'''
+        key = self.key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        '''Record `value` in a histogram.'''
+        key = self.key(name, labels)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        '''Record the time spent in the with-block in a histogram, in
+        seconds.'''
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.observe(name, self.clock() - start, **labels)
+
+    def counter(self, name, **labels):
+        '''Return the current value of a counter.'''
+        with self._lock:
+            return self.counters.get(self.key(name, labels), 0)
+
+    def histogram(self, name, **labels):
+        '''Return a histogram, or None if nothing was recorded in it.'''
+        with self._lock:
+            return self.histograms.get(self.key(name, labels))
+
+    def report(self):
+        '''Return all metrics as a JSON-serializable dict.'''
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = []
+            for (name, labels), hist in sorted(self.histograms.items()):
+                histograms.append({
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': hist.count,
+                    'sum': hist.sum,
+                    'min': hist.min,
+                    'max': hist.max,
+                    'buckets': [[bound, count]
+                                for bound, count in hist.cumulative()]})
+        return {'counters': counters, 'histograms': histograms}
+
+    def prometheus(self):
+        '''Return all metrics in the Prometheus text exposition format.'''
+        def labelstr(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            inner = ','.join('{}="{}"'.format(
+                    k, v.replace('\\', '\\\\').replace('"', '\\"'))
+                    for k, v in pairs)
+            return '{' + inner + '}'
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = f'{self.prefix}_{name}_total'
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} counter')
+                    typed.add(metric)
+                lines.append(f'{metric}{labelstr(labels)} {value}')
+            for (name, labels), hist in sorted(self.histograms.items()):
+                metric = f'{self.prefix}_{name}'
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} histogram')
+                    typed.add(metric)
+                for bound, count in hist.cumulative():
+                    le = (('le', str(bound)),)
+                    lines.append(f'{metric}_bucket{labelstr(labels, le)} {count}')
+                lines.append(f'{metric}_sum{labelstr(labels)} {hist.sum}')
+                lines.append(f'{metric}_count{labelstr(labels)} {hist.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        '''Write all metrics to `path`: in the Prometheus text format if
+        its name ends in .prom, as a JSON report otherwise. The file is
+        replaced atomically, so a collector never reads a partial file.'''
+        if path.endswith('.prom'):
+            text = self.prometheus()
+        else:
+            text = json.dumps(self.report(), indent=2)
+        atomic_write(path, text)
+
+
+def timed(name, **labels):
+    '''Decorator recording the time spent in a method of an object that
+    has a `metrics` attribute.'''
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.timer(name, **labels):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,13 +1,85 @@
 
 # Class hierarchy used to mock the components of github3.py for testing.
 class mock_gh_release():
-    def __init__(self, tag):
+    def __init__(self, tag, name=None, body='', draft=False):
         self.tag_name = tag
+        self.name = name
+        self.body = body
+        self.draft = draft
+
+class mock_gh_commit():
+    def __init__(self, sha, message):
+        self.sha = sha
+        self.message = message
+
+class mock_gh_tag():
+    def __init__(self, name):
+        self.name = name
+
+class mock_gh_comment():
+    def __init__(self, body):
+        self.body = body
+
+class mock_gh_issue():
+    def __init__(self, title, body):
+        self.title = title
+        self.body = body
+        self.comment_bodies = []
+    def create_comment(self, body):
+        self.comment_bodies.append(body)
+        return(mock_gh_comment(body))
+    def comments(self):
+        return([mock_gh_comment(body) for body in self.comment_bodies])
+
+class mock_gh_response():
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.data = data
+    @property
+    def ok(self):
+        return(self.status_code < 400)
+    def json(self):
+        return(self.data)
+
+class mock_gh_session():
+    '''Requests made by hand through the session of the github3.py object.
+    Only the compare and GraphQL APIs are served.'''
+    def __init__(self, gh):
+        self.gh = gh
+    def get(self, url, params=None, **kwargs):
+        if '/compare/' not in url:
+            return(mock_gh_response(404))
+        return(self.gh.compare(url, params))
+    def post(self, url, json=None, **kwargs):
+        if not url.endswith('/graphql'):
+            return(mock_gh_response(404))
+        return(self.gh.graphql(json['query'], json['variables']))
 
 class mock_gh_repository():
-    def __init__(self, tag, release=True):
+    def __init__(self, tag, release=True, open_issues=None, gh=None,
+                 html_url=None):
         self.tag = tag
         self.release = release
+        self.open_issues = open_issues if open_issues is not None else []
+        self.gh = gh
+        self.html_url = html_url
+        self.session = gh.session if gh is not None else None
+        self.url = None
+        if html_url:
+            self.url = html_url.replace('https://github.com',
+                                        'https://api.github.com/repos')
+    def issues(self, state='open'):
+        return(list(self.open_issues))
+    def tags(self, number=-1):
+        # Yields lazily, like the paged github3.py iterator, and counts the
+        # tags actually consumed.
+        for name in self.gh.tags:
+            self.gh.tags_listed += 1
+            yield mock_gh_tag(name)
+    def releases(self, number=-1):
+        for release in self.gh.releases:
+            self.gh.releases_listed += 1
+            yield release
     def latest_release(self):
         if self.release:
             return(mock_gh_release(self.tag))
@@ -17,12 +89,80 @@ class mock_gh_repository_no_rel():
         self.tag = tag
         self.release = release
 
+class mock_gh_user():
+    def __init__(self, login, repos_url=None):
+        self.login = login
+        self.repos_url = repos_url
+
 class mock_gh():
-    def __init__(self, tag, release=True):
+    def __init__(self, tag, release=True, repos_url=None, tags=None,
+                 releases=None, commits=None, tags_by_date=None):
         self.tag = tag
         self.release = release
+        self.repos_url = repos_url
+        self.session = mock_gh_session(self)
+        # Tags in name order, as listed by the REST API, and in the order
+        # of their commit dates, newest first, as listed by the GraphQL API.
+        # Without the latter, GraphQL requests fail as unauthenticated.
+        self.tags = tags if tags is not None else []
+        self.tags_by_date = tags_by_date
+        self.tags_listed = 0
+        self.tag_pages = 0
+        self.releases = releases if releases is not None else []
+        self.releases_listed = 0
+        self.commits = commits if commits is not None else []
+        self.compares = []
+        self.compare_page_size = None
+        self.compare_status = 200
+        self.issues = []
+        self.open_issues = {}
+        self.repository_calls = 0
+    def user(self, login):
+        # A '{login}' placeholder in repos_url is replaced by the login.
+        repos_url = self.repos_url
+        if repos_url:
+            repos_url = repos_url.replace('{login}', login)
+        return(mock_gh_user(login, repos_url))
     def repository(self, owner, repo):
+        self.repository_calls += 1
         if self.release:
-            return(mock_gh_repository(self.tag, self.release))
+            return(mock_gh_repository(self.tag, self.release,
+                    self.open_issues.get(f'{owner}/{repo}'), gh=self,
+                    html_url=f'https://github.com/{owner}/{repo}'))
         else:
             return(mock_gh_repository_no_rel(self.tag, self.release))
+    def compare(self, url, params):
+        # The commits between any two refs are gh.commits, in the order
+        # given.
+        base, head = url.split('/compare/')[1].split('...')
+        html_url = url.replace('https://api.github.com/repos',
+                               'https://github.com')
+        per_page = self.compare_page_size or params['per_page']
+        page = params['page']
+        self.compares.append((base, head, page))
+        if self.compare_status != 200:
+            return(mock_gh_response(self.compare_status))
+        commits = self.commits[(page - 1) * per_page:page * per_page]
+        return(mock_gh_response(200, {
+                'total_commits': len(self.commits),
+                'html_url': html_url,
+                'commits': [{'sha': commit.sha,
+                             'commit': {'message': commit.message}}
+                            for commit in commits]}))
+    def graphql(self, query, variables):
+        if self.tags_by_date is None:
+            return(mock_gh_response(401, {'message': 'Requires authentication'}))
+        start = int(variables['cursor'] or 0)
+        end = start + variables['first']
+        names = self.tags_by_date[start:end]
+        self.tags_listed += len(names)
+        self.tag_pages += 1
+        refs = {'pageInfo': {'hasNextPage': end < len(self.tags_by_date),
+                             'endCursor': str(end)},
+                'nodes': [{'name': name} for name in names]}
+        return(mock_gh_response(200, {'data': {'repository': {'refs': refs}}}))
+    def create_issue(self, owner, repo, title, body):
+        self.issues.append((f'{owner}/{repo}', title, body))
+        issue = mock_gh_issue(title, body)
+        self.open_issues.setdefault(f'{owner}/{repo}', []).append(issue)
+        return(issue)
@@ -0,0 +1,149 @@
+# Local HTTP stand-in server used to exercise the network-facing code paths
+# in tests without talking to Github or any upstream project.
+import threading
+import time
+import socketserver
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class mock_http_server():
+    '''Serve canned responses from a background thread.
+
+    Parameters
+    ----------
+    routes: dict mapping a request path to a response. The full path
+            (including any query string) is tried first, then the path
+            with the query string removed. A response may be
+              - a str or bytes body, served with status 200
+              - a (status, headers, body) tuple
+              - a callable taking (method, path, headers, body) and
+                returning one of the above.
+            Requests for unknown paths receive a 404.
+    delay: Seconds to wait before answering each request, to simulate
+           network latency.
+    ranges: Whether to honor single byte range requests ('Range: bytes=...')
+            made for bodies served with status 200.
+            Default value: True
+    '''
+
+    def __init__(self, routes=None, delay=0, ranges=True):
+        self.routes = routes if routes is not None else {}
+        self.delay = delay
+        self.ranges = ranges
+        self.requests = []
+        self._lock = threading.Lock()
+        self.server = _ThreadingHTTPServer(('127.0.0.1', 0),
+                                           self._make_handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def connections(self):
+        '''Number of distinct client connections requests arrived on.'''
+        with self._lock:
+            return len(set(r[3] for r in self.requests))
+
+    def count(self, method=None, path=None):
+        '''Number of requests received, optionally filtered by method
+        and/or by path (query string ignored).'''
+        with self._lock:
+            return len([r for r in self.requests
+                        if (method is None or r[0] == method) and
+                           (path is None or r[1].split('?')[0] == path)])
+
+    def respond(self, method, path, headers, body, client=None):
+        with self._lock:
+            self.requests.append((method, path, headers, client))
+        if self.delay:
+            time.sleep(self.delay)
+        response = self.routes.get(path)
+        if response is None:
+            response = self.routes.get(path.split('?')[0])
+        if callable(response):
+            response = response(method, path, headers, body)
+        if response is None:
+            return (404, {}, b'404: Not Found')
+        if not isinstance(response, tuple):
+            response = (200, {}, response)
+        status, rheaders, rbody = response
+        if isinstance(rbody, str):
+            rbody = rbody.encode()
+        if self.ranges and status == 200 and headers.get('Range'):
+            return self.partial(headers['Range'], rheaders, rbody)
+        return (status, rheaders, rbody)
+
+    @staticmethod
+    def partial(byte_range, headers, body):
+        '''Answer a request for `byte_range` ('bytes=first-last',
+        'bytes=first-' or 'bytes=-suffix_length') of `body`.'''
+        first, last = byte_range.split('=', 1)[1].split('-')
+        size = len(body)
+        if not first:
+            first, last = max(size - int(last), 0), size - 1
+        else:
+            first = int(first)
+            last = min(int(last), size - 1) if last else size - 1
+        if first >= size:
+            return (416, {'Content-Range': f'bytes */{size}'}, b'')
+        headers = dict(headers, **{'Content-Range': f'bytes {first}-{last}/{size}'})
+        return (206, headers, body[first:last + 1])
+
+    def _make_handler(self):
+        server = self
+
+        class handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def _handle(self, method):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length) if length else b''
+                status, headers, rbody = server.respond(
+                        method, self.path, dict(self.headers), body,
+                        self.client_address)
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                if 'Content-Length' not in headers:
+                    self.send_header('Content-Length', str(len(rbody)))
+                self.end_headers()
+                if method != 'HEAD' and status not in (204, 304):
+                    self.wfile.write(rbody)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_HEAD(self):
+                self._handle('HEAD')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        return handler
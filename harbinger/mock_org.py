@@ -0,0 +1,204 @@
+# Synthetic Github organization served by a local mock_http_server.
+#
+# Generates an organization with any number of repositories, a chosen
+# fraction of which carry a harbinger.cfg file requesting dependencies from
+# a pool of synthetic upstream projects, and serves everything harbinger
+# talks to during a run: the REST repository listing, the raw config files,
+# the GraphQL API, a HEASARC-like cfitsio tarball and a release endpoint per
+# synthetic upstream. Used by the benchmark suite and by tests that need a
+# realistic organization.
+import io
+import json
+import random
+import tarfile
+
+import requests
+
+from .mock_http import mock_http_server
+from .plugins import plugin
+from .plugins.registry import registry
+
+cfitsio_path = '/FTP/software/fitsio/c/cfitsio_latest.tar.gz'
+fitsio_h = b'''#define CFITSIO_VERSION 4.0.0
+#define CFITSIO_MICRO 0
+#define CFITSIO_MINOR 0
+#define CFITSIO_MAJOR 4
+#define CFITSIO_SONAME 9
+'''
+changes_txt = b'''   Version 4.0.0 - May 2021
+
+     - Synthetic release served by the mock organization.
+
+   Version 3.49 - Aug 2020
+
+     - Previous release.
+'''
+
+
+def cfitsio_tarball():
+    '''Return a gzipped source tarball laid out like those of cfitsio.'''
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w:gz') as tfile:
+        for name, data in (('cfitsio-4.0.0/fitsio.h', fitsio_h),
+                           ('cfitsio-4.0.0/docs/changes.txt', changes_txt),
+                           ('cfitsio-4.0.0/filler.c', bytes(200000))):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tfile.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+class upstream_plugin(plugin.Plugin):
+    '''Plugin for the synthetic upstream projects: fetches the version
+    published at the 'url' parameter of the dependency.'''
+    needs_session = True
+
+    def __init__(self, params, ref_ver_data, session=None):
+        self.ref_ver_data = ref_ver_data
+        response = (session or requests).get(params['url'])
+        response.raise_for_status()
+        self.release = response.json()
+
+    def new_version_available(self):
+        return self.release['version'] != self.ref_ver_data['version']
+
+    def version_data(self):
+        return({'version': self.release['version']})
+
+    def get_extra(self):
+        return(self.release['notes'])
+
+
+class mock_org():
+    '''mock_org class
+
+    Parameters
+    ----------
+    org: Organization name.
+    repos: Number of repositories in the organization.
+    density: Fraction of the repositories that have a harbinger.cfg file.
+             Default value: 0.2
+    deps: Number of distinct synthetic upstream projects. cfitsio is always
+          one of them.
+          Default value: 20
+    deps_per_config: Number of dependencies requested by each config file.
+                     Default value: 2
+    delay: Seconds to wait before answering each request, to simulate
+           network latency.
+           Default value: 0
+    page_size: Number of repositories per listing page.
+               Default value: 100
+    seed: Seed of the random choices, making the organization reproducible.
+          Default value: 0
+    '''
+
+    def __init__(self,
+                 org,
+                 repos,
+                 density=0.2,
+                 deps=20,
+                 deps_per_config=2,
+                 delay=0,
+                 page_size=100,
+                 seed=0):
+        self.org = org
+        self.page_size = page_size
+        self.repos = [f'repo{i:05d}' for i in range(repos)]
+        self.deps = ['cfitsio'] + [f'upstream{i:03d}' for i in range(deps - 1)]
+        rng = random.Random(seed)
+        self.requested = {}
+        for repo in self.repos:
+            if rng.random() < density:
+                self.requested[repo] = rng.sample(
+                        self.deps, min(deps_per_config, len(self.deps)))
+        self.server = mock_http_server(self.routes(), delay=delay)
+        self.configs = {}
+        # Plugin classes registered under the names of the synthetic
+        # dependencies before start(), put back by stop().
+        self.replaced = {}
+
+    @property
+    def url(self):
+        return self.server.url
+
+    @property
+    def repos_url(self):
+        return f'{self.url}/users/{self.org}/repos'
+
+    def start(self):
+        self.server.start()
+        # Config files point at the server, so are only known once started.
+        self.configs = {repo: self.config(deps)
+                        for repo, deps in self.requested.items()}
+        for repo, cfg in self.configs.items():
+            self.server.routes[f'/{self.org}/{repo}/master/harbinger.cfg'] = cfg
+        for dep in self.deps[1:]:
+            self.replaced[dep] = registry.classes.get(dep)
+            registry.register(dep, upstream_plugin)
+        return self
+
+    def stop(self):
+        self.server.stop()
+        for dep, plugin_class in self.replaced.items():
+            registry.unregister(dep, plugin_class)
+        self.replaced = {}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def config(self, deps):
+        sections = []
+        for dep in deps:
+            if dep == 'cfitsio':
+                url = f'{self.url}{cfitsio_path}'
+            else:
+                url = f'{self.url}/releases/{dep}'
+            sections.append(f'[{dep}]\nurl = {url}\n')
+        return '\n'.join(sections)
+
+    def references(self):
+        '''Return reference values for all dependencies, each one release
+        behind the version served.'''
+        refs = {dep: {'version': '0.9'} for dep in self.deps[1:]}
+        refs['cfitsio'] = {'version': '3.49', 'soname': '8'}
+        return refs
+
+    def routes(self):
+        routes = {f'/users/{self.org}/repos': self.listing,
+                  '/graphql': self.graphql,
+                  cfitsio_path: (200, {'ETag': '"cfitsio-4.0.0"'},
+                                 cfitsio_tarball())}
+        for dep in self.deps[1:]:
+            routes[f'/releases/{dep}'] = json.dumps(
+                    {'version': '1.0', 'notes': f'{dep} 1.0 release notes'})
+        return routes
+
+    def node(self, repo):
+        return {'name': repo, 'pushed_at': '2020-01-01T00:00:00Z'}
+
+    def listing(self, method, path, headers, body):
+        page = int(path.split('page=')[-1].split('&')[0])
+        start = (page - 1) * self.page_size
+        return json.dumps([self.node(repo) for repo in
+                           self.repos[start:start + self.page_size]])
+
+    def graphql(self, method, path, headers, body):
+        variables = json.loads(body)['variables']
+        start = int(variables['cursor'] or 0)
+        end = start + self.page_size
+        nodes = []
+        for repo in self.repos[start:end]:
+            blob = None
+            if repo in self.configs:
+                blob = {'text': self.configs[repo]}
+            nodes.append({'name': repo, 'pushedAt': '2020-01-01T00:00:00Z',
+                          'object': blob})
+        page_info = {'hasNextPage': end < len(self.repos),
+                     'endCursor': str(end)}
+        data = {'repositoryOwner': {'repositories': {'pageInfo': page_info,
+                                                     'nodes': nodes}}}
+        return json.dumps({'data': data})
+
@@ -0,0 +1,104 @@
+# Several organizations in a single run.
+#
+# MultiScanner drives one Scanner per organization (or user account). The
+# Scanners share the Github connection, the pooled HTTP session, the rate
+# limit governor, the reference values, the metrics and the issue queue;
+# only the HTTP cache and the scan state, which describe the repositories of
+# one organization, are kept apart, in a subdirectory of the reference
+# directory named after it. Organizations are listed and scanned
+# concurrently. The subscriber indexes of all of them are then merged and
+# checked together, so each unique dependency is queried upstream once per
+# run however many organizations request it, and its release notice is
+# posted to every requesting repository.
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from .scanner import Scanner
+from .metrics import timed
+from . import subscribers as subscriber_index
+
+
+def read_targets(path):
+    '''Return the organization (or user account) names listed in the YAML
+    file `path`.'''
+    with open(path) as f:
+        targets = yaml.safe_load(f)
+    if (not isinstance(targets, list) or
+            not all(isinstance(t, str) for t in targets)):
+        raise ValueError(f'{path} must hold a list of organization names.')
+    return targets
+
+
+class MultiScanner():
+    '''MultiScanner class
+
+    Parameters
+    ----------
+    orgs: Names of the Github organizations (or user accounts) to scan.
+    refdir: Reference directory shared by all organizations.
+    args, kwargs: Further Scanner arguments, applied to every organization.
+    '''
+
+    def __init__(self, orgs, refdir, *args, **kwargs):
+        self.orgs = list(orgs)
+        self.refdir = os.path.abspath(refdir)
+        self.scanners = []
+        for org in self.orgs:
+            scanner = Scanner(org, refdir, *args,
+                              statedir=os.path.join(self.refdir, org),
+                              **kwargs)
+            if not self.scanners:
+                # Later organizations share what the first one set up.
+                kwargs.update(gh=scanner.gh,
+                              session=scanner.session,
+                              limiter=scanner.limiter,
+                              store=scanner.store,
+                              metrics=scanner.metrics)
+            self.scanners.append(scanner)
+        self.primary = self.scanners[0]
+        self.refs = self.primary.refs
+        for scanner in self.scanners:
+            scanner.refs = self.refs
+            scanner.issues = self.primary.issues
+        self.limiter = self.primary.limiter
+        self.metrics = self.primary.metrics
+        self.repos = []
+        self.dep_requests = {}
+        self.subscribers = {}
+        self.config_errors = {}
+        self.notifiers = {}
+
+    def each(self, method):
+        '''Call `method` of every Scanner concurrently and return the
+        results in organization order.'''
+        with ThreadPoolExecutor(max_workers=len(self.scanners)) as pool:
+            return list(pool.map(method, self.scanners))
+
+    def get_repos(self):
+        '''List the repositories of all organizations, as 'org/repo'.'''
+        self.each(Scanner.get_repos)
+        self.repos = [f'{scanner.org}/{repo}' for scanner in self.scanners
+                      for repo in scanner.repos]
+        return self.repos
+
+    def scan(self):
+        self.each(Scanner.scan)
+        self.dep_requests = {f'{scanner.org}/{repo}': repoconfig
+                             for scanner in self.scanners
+                             for repo, repoconfig in
+                             scanner.dep_requests.items()}
+        self.subscribers = subscriber_index.build_index(self.dep_requests)
+        self.config_errors = {f'{scanner.org}/{repo}': errors
+                              for scanner in self.scanners
+                              for repo, errors in
+                              scanner.config_errors.items()}
+
+    @timed('phase_seconds', phase='check_for_releases')
+    def check_for_releases(self):
+        self.primary.check_subscribers(self.subscribers)
+        self.notifiers = self.primary.notifiers
+
+    def write_refs(self):
+        self.primary.write_refs()
@@ -0,0 +1,154 @@
+# Issue notification stage.
+#
+# Release notices are queued during the check phase and posted together
+# afterwards. The open issues of each target repository are listed once per
+# run, so that a notice whose issue is already open (e.g. when a run is
+# repeated after the reference file failed to be written) is skipped or
+# added as a comment instead of being posted again. Notices carry a hidden
+# marker naming the version they announce: an open issue announcing an
+# older release of the same dependency receives the newer notice as a
+# comment. New issues are created at a steady pace, as Github discourages
+# bursts of content creation. A notice that fails to be posted, e.g. to an
+# archived repository, is recorded against its dependency and does not hold
+# back the others.
+import time
+
+
+def version_marker(version):
+    '''Hidden line identifying the release announced by a notice.'''
+    return f'<!-- harbinger release: {version} -->'
+
+
+class IssueQueue():
+    '''IssueQueue class
+
+    Parameters
+    ----------
+    gh: A github3.py object to use when interacting with Github.
+        NOTE: Must be an authenticated connection if issues are to be posted
+        successfully.
+    on_existing: What to do with a notice for which an open issue with the
+                 same title, announcing the same release, exists: 'skip' it
+                 or add it as a 'comment'. Notices of a newer release are
+                 always added as a comment.
+                 Default value: 'skip'
+    pace: Minimum number of seconds between two issue creations.
+          Default value: 1
+    dry_run: If True, notices are printed instead of being posted.
+             Default value: False
+    sleep: Function used to wait between issue creations.
+    metrics: Optional Metrics object in which to count the notices.
+    '''
+
+    def __init__(self,
+                 gh,
+                 on_existing='skip',
+                 pace=1,
+                 dry_run=False,
+                 sleep=time.sleep,
+                 metrics=None):
+        if on_existing not in ('skip', 'comment'):
+            raise ValueError(f'Invalid on_existing value: {on_existing}')
+        self.gh = gh
+        self.on_existing = on_existing
+        self.pace = pace
+        self.dry_run = dry_run
+        self.sleep = sleep
+        self.metrics = metrics
+        self.open_issues = {}
+        self.pending = []
+        # Notices that failed to be posted since the last reset(), by
+        # dependency and then by repository.
+        self.errors = {}
+        self.last_created = None
+        self.created = 0
+        self.skipped = 0
+        self.commented = 0
+
+    def existing(self, reponame):
+        '''Return the open issues of `reponame` by title. Listed once per
+        repository until the next reset(), then kept up to date as issues
+        are created.'''
+        if reponame not in self.open_issues:
+            owner, repo = reponame.split('/')
+            ghrepo = self.gh.repository(owner, repo)
+            self.open_issues[reponame] = {issue.title: issue
+                                          for issue in ghrepo.issues(state='open')}
+        return self.open_issues[reponame]
+
+    def count(self, name):
+        if self.metrics is not None:
+            self.metrics.incr(name)
+
+    def add(self, reponame, title, body, version=None, dep=None):
+        '''Queue a notice for posting to `reponame`. `version` is the
+        release announced, if known, and `dep` the dependency it is about,
+        under which a failure to post it is recorded.'''
+        if version is not None:
+            body = f'{body}\n\n{version_marker(version)}'
+        self.pending.append((reponame, title, body, version, dep))
+
+    @staticmethod
+    def announces(issue, version):
+        '''Does `issue`, or one of its comments, announce `version`? Without
+        a version, any issue with the same title does.'''
+        if version is None:
+            return True
+        marker = version_marker(version)
+        if marker in (issue.body or ''):
+            return True
+        return any(marker in (comment.body or '')
+                   for comment in issue.comments())
+
+    def reset(self):
+        '''Forget the open issues listed and the failures recorded so far.
+        Called at the start of each run, as issues may have been opened or
+        closed since the last one.'''
+        self.open_issues = {}
+        self.errors = {}
+
+    def failed(self, dep):
+        '''Did a notice about `dep` fail to be posted since the last
+        reset()?'''
+        return dep in self.errors
+
+    def flush(self):
+        '''Post all queued notices, in the order they were added.'''
+        pending, self.pending = self.pending, []
+        for reponame, title, body, version, dep in pending:
+            if self.dry_run:
+                print(body)
+                continue
+            try:
+                self.post(reponame, title, body, version)
+            except Exception as e:
+                print(f'Posting "{title}" to {reponame} failed: {e!r}')
+                self.errors.setdefault(dep, {})[reponame] = repr(e)
+                self.count('issues_failed')
+
+    def post(self, reponame, title, body, version):
+        '''Post one notice, unless an open issue already announces it.'''
+        existing = self.existing(reponame)
+        if title in existing:
+            issue = existing[title]
+            if (self.on_existing == 'comment' or
+                    not self.announces(issue, version)):
+                print(f'Commenting on open issue "{title}" in {reponame}...')
+                issue.create_comment(body)
+                self.commented += 1
+                self.count('issues_commented')
+            else:
+                print(f'Issue "{title}" already open in {reponame}, skipping.')
+                self.skipped += 1
+                self.count('issues_skipped')
+            return
+        if self.last_created is not None:
+            self.sleep(max(0, self.pace -
+                           (time.monotonic() - self.last_created)))
+        owner, repo = reponame.split('/')
+        print(f'Posting "{title}" to {reponame}...')
+        issue = self.gh.create_issue(owner, repo, title, body)
+        self.last_created = time.monotonic()
+        existing[title] = issue
+        self.created += 1
+        self.count('issues_created')
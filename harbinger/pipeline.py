@@ -0,0 +1,221 @@
+# Streaming pipeline API.
+#
+# Scanner.get_repos(), scan() and check_for_releases() run one after the
+# other, each waiting for the previous phase to finish. Pipeline runs the
+# same steps as overlapping asyncio stages connected by bounded queues:
+#
+#   discover --repos--> fetch configs --configs--> check deps --releases--> notify
+#
+# Repositories are handed on as soon as their listing page arrives, each
+# dependency check starts as soon as the first config requesting it has
+# been parsed, and release notices are posted as soon as a check detects a
+# new version, so the first notices go out while discovery is still paging.
+# The blocking network calls themselves run on a thread pool. As checks
+# start one at a time, plugins are not handed a batch of lookups through
+# prefetch() as they are by a phased run.
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Pipeline():
+    '''Pipeline class
+
+    Parameters
+    ----------
+    scanner: Scanner providing discovery, config retrieval, dependency
+             checks, reference storage and the issue queue. Its repos,
+             dep_requests and notifiers are filled in as by a phased run.
+    fetch_concurrency: Number of config files fetched at once.
+                       Default value: the scanner's workers setting
+    check_concurrency: Number of dependencies checked at once.
+                       Default value: the scanner's check_workers setting
+    queue_size: Capacity of each queue between two stages. A full queue
+                holds up the stage feeding it.
+                Default value: 100
+    '''
+
+    def __init__(self,
+                 scanner,
+                 fetch_concurrency=None,
+                 check_concurrency=None,
+                 queue_size=100):
+        self.scanner = scanner
+        self.fetch_concurrency = fetch_concurrency or scanner.workers
+        self.check_concurrency = check_concurrency or scanner.check_workers
+        self.queue_size = queue_size
+
+    def run(self):
+        '''Run the pipeline to completion.'''
+        loop = asyncio.new_event_loop()
+        try:
+            with self.scanner.metrics.timer('phase_seconds', phase='pipeline'):
+                loop.run_until_complete(self.run_async())
+        finally:
+            loop.close()
+
+    def call(self, func, *args):
+        '''Run the blocking function `func` on the thread pool.'''
+        return self.loop.run_in_executor(self.executor, func, *args)
+
+    async def run_async(self):
+        scanner = self.scanner
+        self.loop = asyncio.get_event_loop()
+        self.executor = ThreadPoolExecutor(
+                max_workers=self.fetch_concurrency + self.check_concurrency + 2)
+        self.now = scanner.schedule.clock()
+        self.previous = scanner.previous_scan()
+        self.repos = []
+        self.dep_requests = {}
+        self.config_errors = {}
+        self.state = {}
+        self.detected = []
+        scanner.notifiers = {}
+        scanner.fetch_errors = {}
+        scanner.check_errors = {}
+        scanner.issues.reset()
+        print(f'Scanning {scanner.org}...')
+        repos = asyncio.Queue(self.queue_size)
+        configs = asyncio.Queue(self.queue_size)
+        releases = asyncio.Queue(self.queue_size)
+        stages = [asyncio.ensure_future(stage) for stage in
+                  (self.discover(repos),
+                   self.fetch_configs(repos, configs),
+                   self.check_deps(configs, releases),
+                   self.notify(releases))]
+        try:
+            await asyncio.gather(*stages)
+        except BaseException:
+            for stage in stages:
+                stage.cancel()
+            # Let the cancelled stages unwind before the loop is closed.
+            await asyncio.gather(*stages, return_exceptions=True)
+            raise
+        finally:
+            self.executor.shutdown()
+        scanner.record_detected(self.detected, self.now)
+        scanner.repos = self.repos
+        scanner.dep_requests = {repo: self.dep_requests[repo]
+                                for repo in self.repos
+                                if repo in self.dep_requests}
+        scanner.report_config_errors({repo: self.config_errors[repo]
+                                      for repo in self.repos
+                                      if repo in self.config_errors})
+        scanner.write_subscribers()
+        if scanner.incremental:
+            scanner.write_scan_state({repo: self.state[repo]
+                                      for repo in self.repos})
+        scanner.configs.save()
+        if scanner.cache:
+            scanner.cache.save()
+
+    async def discover(self, repos):
+        pages = self.scanner.discovery.pages()
+        while True:
+            page = await self.call(next, pages, None)
+            if page is None:
+                break
+            for repo in page:
+                self.repos.append(repo)
+                await repos.put(repo)
+        for i in range(self.fetch_concurrency):
+            await repos.put(None)
+
+    async def fetch_configs(self, repos, configs):
+        await asyncio.gather(*[self.fetch_worker(repos, configs)
+                               for i in range(self.fetch_concurrency)])
+        await configs.put(None)
+
+    async def fetch_worker(self, repos, configs):
+        scanner = self.scanner
+        while True:
+            repo = await repos.get()
+            if repo is None:
+                return
+            entry = scanner.unchanged_config(repo, self.previous)
+            retrieved = True
+            if entry:
+                rawconfig = entry['rawconfig']
+                scanner.metrics.incr('configs_unchanged')
+            else:
+                rawconfig, retrieved = await self.call(
+                        scanner.retrieve_config, repo, self.previous)
+            repoconfig, errors = scanner.resolve_config(rawconfig)
+            self.state[repo] = scanner.state_entry(repo, rawconfig, self.now,
+                                                   retrieved)
+            if errors:
+                self.config_errors[repo] = errors
+            if repoconfig is None:
+                continue
+            print(f'{repo}: Found config')
+            scanner.metrics.incr('configs_found')
+            self.dep_requests[repo] = repoconfig
+            await configs.put((repo, repoconfig))
+
+    async def check_deps(self, configs, releases):
+        scanner = self.scanner
+        limit = asyncio.Semaphore(self.check_concurrency)
+        # Each dependency is checked once, by the first repository to
+        # request it; later subscribers wait on the same check.
+        checks = {}
+        subscriptions = []
+        try:
+            while True:
+                item = await configs.get()
+                if item is None:
+                    break
+                repo, repoconfig = item
+                for dep, params in repoconfig.items():
+                    if dep not in checks:
+                        checks[dep] = None
+                        noti = scanner.new_notifier(f'{scanner.org}/{repo}',
+                                                    dep, params, self.now)
+                        if noti is not None:
+                            scanner.notifiers[dep] = noti
+                            checks[dep] = asyncio.ensure_future(
+                                    self.check(noti, limit))
+                    if checks[dep] is not None:
+                        subscriptions.append(asyncio.ensure_future(
+                                self.subscribe(repo, checks[dep], releases)))
+            await asyncio.gather(*subscriptions)
+        except BaseException:
+            for task in subscriptions + list(checks.values()):
+                if task is not None:
+                    task.cancel()
+            raise
+        await releases.put(None)
+
+    async def check(self, noti, limit):
+        # A failed check does not hold back the others. The dependency is
+        # left as it was, so the next run checks it again.
+        async with limit:
+            try:
+                await self.call(noti.check_for_release)
+            except Exception as e:
+                print(f'{noti.dep_name}: check failed: {e!r}')
+                self.scanner.check_errors[noti.dep_name] = repr(e)
+                return None
+        if noti.new_version_detected:
+            # Recorded once all notices have been posted.
+            self.detected.append(noti)
+        else:
+            self.scanner.record_check(noti, self.now)
+        return noti
+
+    async def subscribe(self, repo, check, releases):
+        noti = await check
+        if noti is not None and noti.new_version_detected:
+            await releases.put((repo, noti))
+
+    async def notify(self, releases):
+        scanner = self.scanner
+        while True:
+            item = await releases.get()
+            if item is None:
+                return
+            repo, noti = item
+            scanner.issues.add(f'{scanner.org}/{repo}',
+                               noti.issue_title,
+                               noti.comment,
+                               noti.ref.get('version'),
+                               dep=noti.dep_name)
+            await self.call(scanner.issues.flush)
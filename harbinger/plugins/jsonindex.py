@@ -0,0 +1,197 @@
+# Base class of the plugins tracking packages published on an index with a
+# JSON API, such as PyPI or anaconda.org.
+#
+# One JSON document per package lists its releases. It is fetched with a
+# conditional request built from the validators saved in the reference, so
+# an unchanged package costs a body-less '304 Not Modified'. Neither index
+# can describe several packages in one response, so when several
+# dependencies are served by the same index their documents are fetched
+# together beforehand: prefetch() is called once per plugin class with all
+# the dependencies about to be checked, requests each distinct document once,
+# concurrently over the pooled session, and keeps the responses on the
+# session until the plugin objects are created.
+import copy
+import threading
+from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+from ..plugins import plugin
+from ..httpcache import (conditional_headers, response_validators,
+                         validators_match)
+from ..utils import version_key
+
+# Releases listed in the notice, newest first.
+max_listed_releases = 20
+
+
+class IndexPlugin(plugin.Plugin):
+    '''Plugin for a package published on a JSON index. Subclasses give the
+    URL of the document of a package and read the releases from it.
+
+    Parameters (config file)
+    ------------------------
+    package: Name of the package on the index.
+             Default value: the dependency name
+    index_url: Base URL of the index API.
+               Default value: the public index
+    pre_releases: Whether pre-releases count as new versions ('yes'/'no').
+                  Default value: 'no'
+    '''
+    needs_session = True
+    default_index_url = None
+    # Guards the responses kept in session.prefetched, by (plugin class,
+    # document URL, request headers).
+    prefetch_lock = threading.Lock()
+    prefetch_workers = 8
+
+    @classmethod
+    @abstractmethod
+    def document_url(cls, params):
+        '''URL of the JSON document describing the package.'''
+
+    @classmethod
+    def validate_params(cls, params):
+        problems = []
+        index_url = params.get('index_url', cls.default_index_url)
+        if urlsplit(index_url).scheme not in ('http', 'https'):
+            problems.append(f'index_url must be an http(s) URL, '
+                            f'not {index_url!r}')
+        if params.get('pre_releases', 'no').lower() not in \
+                ('yes', 'no', 'true', 'false', 'on', 'off', '1', '0'):
+            problems.append('pre_releases must be yes or no')
+        return problems
+
+    @classmethod
+    def index_url(cls, params):
+        return params.get('index_url', cls.default_index_url).rstrip('/')
+
+    @staticmethod
+    def package(params):
+        return params.get('package', params['name'])
+
+    @classmethod
+    def prefetch(cls, lookups, session=None):
+        '''Fetch the documents needed by `lookups`, a list of (params,
+        reference) pairs, each distinct one once and several at a time. The
+        responses are kept on `session`, without which nothing is done.'''
+        if session is None:
+            return
+        keys = []
+        for params, ref_ver_data in lookups:
+            key = cls.request_key(params, ref_ver_data)
+            if key not in keys:
+                keys.append(key)
+        if len(keys) < 2:
+            # Nothing to gain over fetching it when the plugin is created.
+            return
+        def fetch(key):
+            url, headers = key[1:]
+            try:
+                return cls.fetch(session, url, dict(headers))
+            except requests.RequestException as e:
+                # Left to the plugin object, which reports the failure.
+                print(f'Prefetch of {url} failed: {e}')
+                return None
+        workers = min(cls.prefetch_workers, len(keys))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            responses = list(pool.map(fetch, keys))
+        with cls.prefetch_lock:
+            for key, response in zip(keys, responses):
+                if response is not None:
+                    session.prefetched[key] = response
+
+    @classmethod
+    def request_key(cls, params, ref_ver_data):
+        headers = conditional_headers(ref_ver_data)
+        return (cls, cls.document_url(params), tuple(sorted(headers.items())))
+
+    @staticmethod
+    def fetch(session, url, headers):
+        '''GET the document at `url`. Returns the status, the response
+        headers and the decoded document (None unless the status is 200).'''
+        response = (session or requests).get(url, headers=headers)
+        if response.status_code == 304:
+            return 304, response.headers, None
+        response.raise_for_status()
+        return response.status_code, response.headers, response.json()
+
+    def __init__(self, params, ref_ver_data, session=None):
+        self.ref_ver_data = ref_ver_data
+        self.new_ver_data = copy.deepcopy(self.ref_ver_data)
+        self.package_name = self.package(params)
+        self.pre_releases = params.get('pre_releases', 'no').lower() in \
+                ('yes', 'true', 'on', '1')
+        self.releases = []
+        self.links = []
+        key = self.request_key(params, ref_ver_data)
+        url, headers = key[1], dict(key[2])
+        response = None
+        if session is not None:
+            with self.prefetch_lock:
+                response = session.prefetched.pop(key, None)
+        if response is None:
+            response = self.fetch(session, url, headers)
+        status, rheaders, document = response
+        validators = response_validators(rheaders)
+        if status == 304 or validators_match(self.ref_ver_data, validators):
+            self.version = self.ref_ver_data['version']
+            return
+        self.new_ver_data.update(validators)
+        # (version, upload date, notes, yanked) of each release.
+        self.releases = self.read_releases(document)
+        self.links = self.read_links(document)
+        candidates = [r for r in self.releases if not r[3] and
+                      (self.pre_releases or version_key(r[0])[1] != 0)]
+        if not candidates:
+            raise RuntimeError(f'No release of {self.package_name} found '
+                               f'at {url}.')
+        self.version = max(candidates, key=lambda r: version_key(r[0]))[0]
+        self.new_ver_data['version'] = self.version
+
+    @abstractmethod
+    def read_releases(self, document):
+        '''Return the (version, upload date, notes, yanked) tuple of each
+        release listed in `document`.'''
+
+    def read_links(self, document):
+        '''Return the (title, URL) pairs to list at the end of the
+        notice.'''
+        return []
+
+    def new_version_available(self):
+        return self.new_ver_data['version'] != self.ref_ver_data['version']
+
+    def version_data(self):
+        '''Return reference dict with updated version and other values.'''
+        return(self.new_ver_data)
+
+    def get_extra(self):
+        '''Return the releases made since the reference version, newest
+        first, with their upload date and notes, followed by the project
+        links.'''
+        ref_key = version_key(str(self.ref_ver_data['version']))
+        new_key = version_key(self.version)
+        newer = sorted((r for r in self.releases
+                        if ref_key < version_key(r[0]) <= new_key),
+                       key=lambda r: version_key(r[0]), reverse=True)
+        lines = [f'Releases of {self.package_name} since '
+                 f'{self.ref_ver_data["version"]}:', '']
+        for version, date, notes, yanked in newer[:max_listed_releases]:
+            line = f'- {version}'
+            if date:
+                line += f' ({date[:10]})'
+            if yanked:
+                line += ' [yanked]'
+            if notes:
+                line += f': {notes}'
+            lines.append(line)
+        if len(newer) > max_listed_releases:
+            lines.append(f'- ... and {len(newer) - max_listed_releases} '
+                         f'earlier releases')
+        if self.links:
+            lines.append('')
+            lines.extend(f'{title}: {url}' for title, url in self.links)
+        return('\n'.join(lines))
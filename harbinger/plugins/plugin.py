@@ -1,6 +1,18 @@
 from abc import ABC, abstractmethod
 
 class Plugin(ABC):
+    # Set to True by plugins that need an authenticated github3.py object.
+    # It is passed as the third positional argument to __init__().
+    needs_github = False
+    # Set to True by plugins that need to create files while gathering
+    # version information. A temporary directory is passed to __init__()
+    # as the `scratch_dir` keyword argument and removed afterwards.
+    needs_scratch_dir = False
+    # Set to True by plugins that make HTTP requests. The scanner's pooled
+    # HTTPSession (or None, in which case the plugin should fall back to
+    # its own connections) is passed as the `session` keyword argument.
+    needs_session = False
+
     def __init__(self, params, reference):
         super().__init__()
         #TODO: Investigate whether having these abstract properties
@@ -8,6 +20,21 @@ class Plugin(ABC):
         #self.ref_ver_data = None
         #self.new_ver_data = None
 
+    @classmethod
+    def validate_params(cls, params):
+        '''Return a list of the problems with the parameters `params` given
+        to the dependency in a config file, checked when the config is
+        scanned. Plugins taking parameters override this.'''
+        return []
+
+    @classmethod
+    def prefetch(cls, lookups, session=None):
+        '''Called once per check run, before any object of the class is
+        created, with the (params, reference) pair of every dependency of
+        the run served by this plugin, so that plugins able to batch their
+        lookups may do so. `session` is the HTTPSession of the run, or
+        None.'''
+
     @abstractmethod
     def new_version_available(self):
         '''Is a new version of the dependency available?'''
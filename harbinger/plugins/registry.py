@@ -0,0 +1,103 @@
+# Registry mapping dependency names to release check plugin classes.
+#
+# Plugin classes are resolved once per process and cached. Besides the
+# plugins bundled in this package (modules named relcheck_<name>), plugins
+# may be provided by other installed distributions through the
+# 'harbinger.plugins' entry point group, where the entry point name is the
+# plugin name and its value the plugin class, e.g.
+#
+#   entry_points={'harbinger.plugins': ['mylib = mypkg.relcheck:plugin']}
+#
+# A dependency may also name the plugin serving it with the 'type'
+# parameter of its config section, for generic plugins that can track many
+# projects, e.g. 'type: httpindex'.
+import importlib
+import threading
+
+try:
+    from importlib import metadata
+except ImportError:  # Python < 3.8
+    metadata = None
+
+entry_point_group = 'harbinger.plugins'
+
+
+def iter_entry_points(group):
+    if metadata is None:
+        import pkg_resources
+        return pkg_resources.iter_entry_points(group)
+    eps = metadata.entry_points()
+    if hasattr(eps, 'select'):
+        return eps.select(group=group)
+    return eps.get(group, [])
+
+
+class PluginRegistry():
+    '''PluginRegistry class
+
+    Resolves the plugin class responsible for a dependency name. Lookups
+    are cached, so importing a plugin module and scanning the installed
+    entry points happen at most once per process.
+    '''
+
+    def __init__(self):
+        self.classes = {}
+        self._entry_points = None
+        self._lock = threading.Lock()
+
+    def plugin_name(self, dep_name, params=None):
+        '''The plugin named by the 'type' parameter of the dependency, if
+        given, serves it. Otherwise, dependencies hosted on Github
+        ('owner/repo') are all served by the github plugin; any other
+        dependency name is a plugin name.'''
+        if params and params.get('type'):
+            return params['type']
+        if '/' in dep_name:
+            return 'github'
+        return dep_name
+
+    def entry_points(self):
+        '''Return the plugin entry points of installed distributions by
+        name. They are not loaded until a dependency needs them.'''
+        if self._entry_points is None:
+            self._entry_points = {ep.name: ep
+                                  for ep in iter_entry_points(entry_point_group)}
+        return self._entry_points
+
+    def register(self, name, plugin_class):
+        '''Make `plugin_class` available under the plugin name `name`.'''
+        with self._lock:
+            self.classes[name] = plugin_class
+
+    def unregister(self, name, plugin_class=None):
+        '''Forget the plugin class known under the plugin name `name`, or
+        put back `plugin_class`, e.g. one replaced by register().'''
+        with self._lock:
+            if plugin_class is None:
+                self.classes.pop(name, None)
+            else:
+                self.classes[name] = plugin_class
+
+    def get(self, dep_name, params=None):
+        '''Return the plugin class for `dep_name`, requested with `params`.
+        Raises ImportError if no plugin is available.'''
+        name = self.plugin_name(dep_name, params)
+        with self._lock:
+            if name not in self.classes:
+                self.classes[name] = self.resolve(name)
+            return self.classes[name]
+
+    def resolve(self, name):
+        entry_point = self.entry_points().get(name)
+        if entry_point is not None:
+            return entry_point.load()
+        module_name = f'.plugins.relcheck_{name}'
+        try:
+            module = importlib.import_module(module_name, 'harbinger')
+        except ImportError as e:
+            print(f'Import of plugin {module_name} failed.\n\n')
+            raise ImportError(f'No plugin available for {name}') from e
+        return module.plugin
+
+
+registry = PluginRegistry()
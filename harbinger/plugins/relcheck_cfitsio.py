@@ -1,43 +1,57 @@
 # cfitsio-specific version update checker
+import io
 import os
-import urllib.request
 import tarfile
 import copy
 
+import requests
+
 from ..plugins import plugin
+from ..httpcache import (conditional_headers, response_validators,
+                         validators_match)
+
+latest_URL = ('http://heasarc.gsfc.nasa.gov/FTP/software/fitsio/c/'
+              'cfitsio_latest.tar.gz')
 
 class plugin(plugin.Plugin):
+    needs_session = True
 
-    def __init__(self, params, ref_ver_data, tarball=None):
-        '''Download and extract key files from source tarball.
+    def __init__(self, params, ref_ver_data, tarball=None, session=None):
+        '''Probe upstream with a conditional request built from the
+        validators saved in the reference; stop there if it is unchanged.
+        Otherwise, stream the source tarball.
         Read in header file.
-        Read in changelog file.'''
+        Read in changelog file.
+        Nothing is written to disk.'''
 
         self.ref_ver_data = ref_ver_data
         self.new_ver_data = copy.deepcopy(self.ref_ver_data)
 
         if tarball:
-            latest_tar = tarball
+            with open(tarball, 'rb') as f:
+                self.read_tarball(f)
         else:
-            latest_tar = 'cfitsio_latest.tar.gz'
-            latest_URL = f'http://heasarc.gsfc.nasa.gov/FTP/software/fitsio/c/{latest_tar}'
-            urllib.request.urlretrieve(latest_URL, latest_tar)
-    
-        tfile = tarfile.open(latest_tar, mode='r')
-        members = tfile.getmembers()
-        changesfile_path = ""
-        for member in members:
-            bname = os.path.basename(member.path)
-            if bname == 'fitsio.h':
-                tfile.extract(member.path)
-                fitsio_h_path = member.path
-            if bname == 'changes.txt' or bname == "ChangeLog":
-                tfile.extract(member.path)
-                changesfile_path = member.path
-        with open(fitsio_h_path, 'r') as f:
-            self.header = f.readlines()
-        with open(changesfile_path) as f:
-            self.changelog = f.readlines()
+            if session is None:
+                session = requests
+            url = params.get('url', latest_URL)
+            response = session.get(url,
+                                   headers=conditional_headers(
+                                           self.ref_ver_data),
+                                   stream=True)
+            with response:
+                if response.status_code == 304:
+                    self.use_reference()
+                    return
+                response.raise_for_status()
+                validators = response_validators(
+                        response.headers,
+                        extra=(('content_length', 'Content-Length'),))
+                if validators_match(self.ref_ver_data, validators):
+                    self.use_reference()
+                    return
+                self.read_tarball(response.raw)
+            self.new_ver_data.update(validators)
+
         # Extract version value from the source code. Update new_ver_data.
         for line in self.header:
             if 'CFITSIO_VERSION' in line.strip():
@@ -52,6 +66,42 @@ class plugin(plugin.Plugin):
                 self.new_ver_data['soname'] = self.soname
                 break
 
+    def use_reference(self):
+        '''Fast path taken when the upstream tarball has not changed since
+        the reference was recorded: nothing is downloaded and the reference
+        values are reported as current.'''
+        self.header = []
+        self.changelog = []
+        self.version = self.ref_ver_data['version']
+        self.soname = self.ref_ver_data.get('soname')
+
+    def read_tarball(self, fileobj):
+        '''Read the header and changelog files from a gzipped tar stream.
+
+        The archive is read sequentially and reading stops as soon as both
+        files have been seen, so the remainder of the archive is never
+        transferred or decompressed.'''
+        header = None
+        changelog = None
+        with tarfile.open(fileobj=fileobj, mode='r|gz') as tfile:
+            for member in tfile:
+                bname = os.path.basename(member.name)
+                if bname == 'fitsio.h':
+                    header = tfile.extractfile(member).read()
+                if bname == 'changes.txt' or bname == "ChangeLog":
+                    changelog = tfile.extractfile(member).read()
+                if header is not None and changelog is not None:
+                    break
+        if header is None:
+            raise RuntimeError('fitsio.h not found in cfitsio source tarball.')
+        self.header = self.readlines(header)
+        self.changelog = self.readlines(changelog or b'')
+
+    @staticmethod
+    def readlines(data):
+        text = data.decode(errors='replace')
+        return io.StringIO(text, newline=None).readlines()
+
     def new_version_available(self):
         return self.new_ver_data['version'] != self.ref_ver_data['version']
 
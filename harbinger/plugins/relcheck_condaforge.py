@@ -0,0 +1,46 @@
+# conda-forge version update checker, selected with 'type: condaforge' in
+# the config section of the dependency:
+#
+#   [cfitsio-conda]
+#   type: condaforge
+#   package: cfitsio
+#
+# Reads the files uploaded for the package from the anaconda.org API
+# (https://api.anaconda.org/package/conda-forge/<package>). Only files
+# carrying the 'main' label count as releases. The channel may be changed
+# with the 'channel' parameter; see jsonindex.IndexPlugin for the others.
+from .jsonindex import IndexPlugin
+
+
+class plugin(IndexPlugin):
+    default_index_url = 'https://api.anaconda.org'
+
+    @classmethod
+    def document_url(cls, params):
+        channel = params.get('channel', 'conda-forge')
+        return f'{cls.index_url(params)}/package/{channel}/{cls.package(params)}'
+
+    def read_releases(self, document):
+        uploads = {}
+        for f in document.get('files', []):
+            labels = f.get('labels')
+            if labels is not None and 'main' not in labels:
+                continue
+            uploads.setdefault(f['version'], []).append(f)
+        releases = []
+        for version, files in uploads.items():
+            dates = [f['upload_time'] for f in files if f.get('upload_time')]
+            subdirs = set((f.get('attrs') or {}).get('subdir') for f in files)
+            subdirs.discard(None)
+            releases.append((version, min(dates, default=None),
+                             ', '.join(sorted(subdirs)), False))
+        return releases
+
+    def read_links(self, document):
+        links = []
+        for title, key in (('Project page', 'html_url'),
+                           ('Home page', 'home'),
+                           ('Source', 'dev_url')):
+            if document.get(key):
+                links.append((title, document[key]))
+        return links
@@ -4,12 +4,100 @@
 # the version queries via the Github API. Other plugins do not have this
 # requirement and thus do not need the `github` argument on the __init__()
 # call.
+import re
 import copy
+import threading
+from collections import OrderedDict
+
 import github3
+import requests
+
+from ..utils import version_key
+
+# Tags that look like plain release versions, e.g. '1.2.3' or 'v1.2'.
+default_tag_regex = r'^v?(\d+(?:\.\d+)*)$'
+
+# Tags of a repository, most recently committed first, a page at a time.
+# The REST API only lists tags by name.
+tags_query = '''
+query($owner: String!, $name: String!, $first: Int!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    refs(refPrefix: "refs/tags/", first: $first, after: $cursor,
+         orderBy: {field: TAG_COMMIT_DATE, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes { name }
+    }
+  }
+}
+'''
+tag_page_size = 100
+
+
+# Commits listed in the changelog, oldest first. They are requested from the
+# compare API in pages of this size.
+max_listed_commits = 50
+
+# Changelogs already assembled during this process, by (repository,
+# reference tags, new tag), most recently used last.
+changelog_cache = OrderedDict()
+changelog_cache_size = 128
+changelog_cache_lock = threading.Lock()
+
+
+class Truncated():
+    '''Text accumulated up to a limit on its UTF-8 encoded size.'''
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.parts = []
+        self.full = False
+
+    def add(self, text):
+        '''Append `text`, cut short at the limit. Returns False once the
+        limit has been reached.'''
+        if self.full:
+            return False
+        data = text.encode()
+        room = self.max_bytes - self.size
+        if len(data) > room:
+            data = data[:room]
+            self.full = True
+        self.parts.append(data.decode(errors='ignore'))
+        self.size += len(data)
+        return not self.full
+
+    def value(self):
+        text = ''.join(self.parts).rstrip()
+        if self.full:
+            text += '\n\n(Truncated.)'
+        return text
 
-# TODO: Handle regex as a parameter to use when selecting tags?
 
 class plugin():
+    needs_github = True
+    needs_scratch_dir = False
+    needs_session = False
+    release_styles = ('github', 'tag-only')
+
+    @classmethod
+    def validate_params(cls, params):
+        problems = []
+        release_style = params.get('release_style')
+        if release_style is None:
+            problems.append('release_style is required')
+        elif release_style not in cls.release_styles:
+            problems.append(f'unknown release_style {release_style!r}, '
+                            f'expected one of {", ".join(cls.release_styles)}')
+        try:
+            re.compile(params.get('tag_regex', default_tag_regex))
+        except re.error as e:
+            problems.append(f'invalid tag_regex: {e}')
+        for name in ('changelog_bytes', 'changelog_releases'):
+            value = params.get(name)
+            if value is not None and not value.isdigit():
+                problems.append(f'{name} must be a whole number, not {value!r}')
+        return problems
 
     def __init__(self, params, ref_ver_data, github):
 
@@ -19,6 +107,11 @@ class plugin():
         owner = params['name'].split('/')[0]
         repo = params['name'].split('/')[1]
         ghrepo = github.repository(owner, repo)
+        self.name = params['name']
+        self.ghrepo = ghrepo
+        # Bounds on the changelog assembled by get_extra().
+        self.changelog_bytes = int(params.get('changelog_bytes', 4000))
+        self.changelog_releases = int(params.get('changelog_releases', 20))
         # Determine the 'best' release version.
         # This will depend on how the repository is organized and how releases are done.
         # Easiest is if the repo uses Github releases consistently. Just query that.
@@ -44,10 +137,78 @@ class plugin():
                 self.version = self.tag_name
         if release_style == 'tag-only':
             print('Checking for a tag-style release...')
-            print('Checking for tag of appropriate type to signify release...')
-            self.version = 'tagoly'
+            self.tag_name, self.version = self.latest_tag(ghrepo, params)
+            self.new_ver_data['tag'] = self.tag_name
         self.new_ver_data['version'] = self.version
+
+    def latest_tag(self, ghrepo, params):
+        '''Return the name and version of the highest release tag.
+
+        Only tags matching the 'tag_regex' parameter count as releases. The
+        version is the first group of the match, if any, else the tag name.
+        Tags are listed most recently committed first through the GraphQL
+        API, so the listing stops at the tag recorded in the reference.
+        Should that fail, e.g. without a token, all tags are listed by
+        name instead. Set 'stop_at_reference' to 'yes' to stop that listing
+        at the reference tag too, for repositories whose tag names sort in
+        release order.'''
+        pattern = re.compile(params.get('tag_regex', default_tag_regex))
+        stop_at_reference = params.get('stop_at_reference', 'no').lower() \
+                in ('yes', 'true', 'on', '1')
+        ref_tag = self.ref_ver_data.get('tag')
+        try:
+            names = self.tags_by_date(ghrepo)
+            stop_at_reference = True
+        except (RuntimeError, requests.RequestException) as e:
+            print(f'Tags of {params["name"]} could not be listed by date '
+                  f'({e}), listing them by name.')
+            names = (tag.name for tag in ghrepo.tags())
+        best = None
+        for name in names:
+            match = pattern.search(name)
+            if match:
+                version = match.group(1) if match.groups() else name
+                key = version_key(version)
+                if best is None or key > best[0]:
+                    best = (key, name, version)
+            if stop_at_reference and name == ref_tag:
+                break
+        if best is None:
+            raise RuntimeError(f'No tag matching {pattern.pattern} found in '
+                               f'{params["name"]}.')
+        return best[1], best[2]
     
+    def tag_page(self, ghrepo, cursor):
+        '''Return a page of the tags of `ghrepo`, most recently committed
+        first, from the GraphQL API.'''
+        owner, name = self.name.split('/')
+        url = f'{ghrepo.url.split("/repos/")[0]}/graphql'
+        response = ghrepo.session.post(url, json={
+                'query': tags_query,
+                'variables': {'owner': owner, 'name': name,
+                              'first': tag_page_size, 'cursor': cursor}})
+        if not response.ok:
+            raise RuntimeError(f'GraphQL request failed with status '
+                               f'{response.status_code}')
+        jdata = response.json()
+        if jdata.get('errors'):
+            raise RuntimeError(f'GraphQL query failed: {jdata["errors"]}')
+        return jdata['data']['repository']['refs']
+
+    def tags_by_date(self, ghrepo):
+        '''Return an iterator over the tag names of `ghrepo`, most recently
+        committed first. The first page is requested right away, so that
+        the GraphQL API being unavailable is raised by this call.'''
+        refs = self.tag_page(ghrepo, None)
+        def names(refs):
+            while True:
+                for node in refs['nodes']:
+                    yield node['name']
+                if not refs['pageInfo']['hasNextPage']:
+                    return
+                refs = self.tag_page(ghrepo, refs['pageInfo']['endCursor'])
+        return names(refs)
+
     def new_version_available(self):
         return self.new_ver_data['version'] != self.ref_ver_data['version']
 
@@ -55,6 +216,98 @@ class plugin():
         '''Return reference dict with updated version and other values.'''
         return(self.new_ver_data)
 
+    def reference_tags(self):
+        '''Tag names under which the reference version may have been
+        released.'''
+        if self.ref_ver_data.get('tag'):
+            return {self.ref_ver_data['tag']}
+        version = str(self.ref_ver_data['version'])
+        return {version, f'v{version}'}
+
     def get_extra(self):
-        return('No changelog')
+        '''Return the notes of the releases made since the reference
+        version and a summary of the commits in between, at most
+        'changelog_bytes' bytes long.'''
+        key = (self.name, tuple(sorted(self.reference_tags())), self.tag_name)
+        with changelog_cache_lock:
+            if key in changelog_cache:
+                changelog_cache.move_to_end(key)
+                return changelog_cache[key]
+        changelog = self.changelog()
+        with changelog_cache_lock:
+            changelog_cache[key] = changelog
+            if len(changelog_cache) > changelog_cache_size:
+                changelog_cache.popitem(last=False)
+        return changelog
+
+    def changelog(self):
+        text = Truncated(self.changelog_bytes)
+        ref_tags = self.reference_tags()
+        base = self.ref_ver_data.get('tag')
+        # Releases are listed newest first, page by page; listing stops at
+        # the reference release, or once the byte limit has been reached.
+        for count, release in enumerate(self.ghrepo.releases()):
+            if release.tag_name in ref_tags:
+                base = release.tag_name
+                break
+            if count >= self.changelog_releases:
+                text.add('(Earlier releases omitted.)\n\n')
+                break
+            if release.draft:
+                continue
+            title = release.name or release.tag_name
+            if not text.add(f'## {title}\n\n{release.body or ""}\n\n'):
+                break
+        if base is not None and not text.full:
+            self.add_commits(text, base)
+        if not text.parts:
+            return('No changelog')
+        return text.value()
+
+    def compare_page(self, base, page):
+        '''Return page `page` of the comparison of the tag `base` with the
+        new tag, as decoded JSON, or None if it is not available.
+        github3.py's compare_commits() takes no paging parameters, so the
+        request is made through the session of the repository object.'''
+        url = f'{self.ghrepo.url}/compare/{base}...{self.tag_name}'
+        params = {'per_page': max_listed_commits, 'page': page}
+        response = self.ghrepo.session.get(url, params=params)
+        if response.status_code != 200:
+            print(f'Commits since {base} not available: status '
+                  f'{response.status_code}')
+            return None
+        return response.json()
 
+    def add_commits(self, text, base):
+        '''Add the commits made between the tag `base` and the new tag to
+        `text`, at most max_listed_commits of them. The count given is the
+        total reported by the compare API, which includes the commits of
+        branches merged in between.'''
+        commits = []
+        page = 1
+        try:
+            while True:
+                comparison = self.compare_page(base, page)
+                if comparison is None:
+                    return
+                if page == 1:
+                    total = comparison['total_commits']
+                    url = comparison['html_url']
+                commits.extend(comparison['commits'])
+                if (not comparison['commits'] or
+                        len(commits) >= min(total, max_listed_commits)):
+                    break
+                page += 1
+        except requests.RequestException:
+            return
+        if not total:
+            return
+        commits = commits[:max_listed_commits]
+        listed = ''
+        if total > len(commits):
+            listed = f' (first {len(commits)} listed)'
+        text.add(f'{total} commits since {base}{listed}: {url}\n\n')
+        for commit in commits:
+            summary = (commit['commit']['message'] or '').split('\n')[0]
+            if not text.add(f'- {commit["sha"][:7]} {summary}\n'):
+                break
@@ -0,0 +1,382 @@
+# Generic version update checker for projects publishing versioned files
+# in a directory served over HTTP(S) or FTP.
+#
+# Selected with 'type: httpindex' in the config section of the dependency:
+#
+#   [libfoo]
+#   type: httpindex
+#   url: https://example.org/pub/libfoo/
+#   filename_regex: ^libfoo-(\d+\.\d+\.\d+)\.tar\.gz$
+#
+# The directory listing is fetched with a conditional request and the file
+# names matching 'filename_regex' are compared; the first group of the match
+# is the version. Projects whose file names carry no version (e.g.
+# 'libfoo_latest.tar.gz') give the archive member holding it with
+# 'version_file' (a glob pattern, e.g. '*/version.h') and 'version_regex'.
+# The archive is then only partially read: tarballs are streamed and reading
+# stops at the version file, while the members of zip archives are located
+# and read with HTTP Range requests.
+import io
+import re
+import copy
+import ftplib
+import fnmatch
+import posixpath
+import tarfile
+import zipfile
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit, unquote
+
+import requests
+
+from ..plugins import plugin
+from ..httpcache import (conditional_headers, response_validators,
+                         validators_match)
+from ..utils import version_key
+
+# First dotted number found in the version file.
+default_version_regex = r'(\d+(?:\.\d+)+)'
+# Names of the files published since the reference version listed in the
+# release notice.
+max_listed_files = 20
+
+
+class LinkParser(HTMLParser):
+    '''Collects the targets of the links of an HTML page.'''
+
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            if href:
+                self.links.append(href)
+
+
+def listing_names(text):
+    '''Return the names of the entries of a directory listing, in order.
+    HTML listings are read from their links; any other listing (such as
+    that of an FTP server) is taken to have one entry per line, its name
+    being the last word of the line.'''
+    parser = LinkParser()
+    parser.feed(text)
+    if parser.links:
+        paths = [urlsplit(href).path for href in parser.links]
+    else:
+        paths = [line.split()[-1] for line in text.splitlines() if line.strip()]
+    names = []
+    for path in paths:
+        name = posixpath.basename(unquote(path).rstrip('/'))
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+class RangeFile():
+    '''Read-only, seekable file object over an HTTP resource. Only the
+    parts of the resource that are read are transferred, through Range
+    requests of at least `block_size` bytes.
+
+    Parameters
+    ----------
+    session: requests.Session-like object with which to make the requests.
+    url: URL of the resource.
+    headers: Headers sent along with the first request, typically
+             conditional request headers.
+    block_size: Minimum number of bytes to request at once. The first
+                request fetches that many bytes from the end of the
+                resource, where the index of a zip archive is found.
+                Default value: 65536
+    '''
+
+    def __init__(self, session, url, headers=None, block_size=65536):
+        self.session = session
+        self.url = url
+        self.block_size = block_size
+        self.blocks = {}
+        self.pos = 0
+        self.requests = 0
+        # Answered with the whole body by servers not supporting ranges,
+        # or with no body at all if the conditional request matched.
+        response = self.get(dict(headers or {},
+                                 Range=f'bytes=-{block_size}'))
+        self.status = response.status_code
+        self.headers = response.headers
+        if self.status == 304:
+            self.size = 0
+            return
+        response.raise_for_status()
+        if self.status == 206:
+            first, self.size = self.content_range(response)
+        else:
+            first, self.size = 0, len(response.content)
+        self.blocks[first] = response.content
+
+    def get(self, headers):
+        self.requests += 1
+        return self.session.get(self.url, headers=headers)
+
+    @staticmethod
+    def content_range(response):
+        '''Return the offset of the body of a 206 response and the size of
+        the whole resource.'''
+        value = response.headers['Content-Range']
+        span, size = value.split(' ', 1)[1].split('/')
+        return int(span.split('-')[0]), int(size)
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.pos = max(offset, 0)
+        return self.pos
+
+    def cached(self, offset):
+        '''Return the cached block holding the byte at `offset` and its
+        start offset, or (None, None).'''
+        for start, data in self.blocks.items():
+            if start <= offset < start + len(data):
+                return start, data
+        return None, None
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.pos
+        size = min(size, self.size - self.pos)
+        parts = []
+        while size > 0:
+            start, data = self.cached(self.pos)
+            if data is None:
+                length = max(size, self.block_size)
+                last = min(self.pos + length, self.size) - 1
+                response = self.get({'Range': f'bytes={self.pos}-{last}'})
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise RuntimeError(f'{self.url}: range request refused.')
+                start = self.content_range(response)[0]
+                data = response.content
+                self.blocks[start] = data
+            chunk = data[self.pos - start:self.pos - start + size]
+            parts.append(chunk)
+            self.pos += len(chunk)
+            size -= len(chunk)
+        return b''.join(parts)
+
+
+class plugin(plugin.Plugin):
+    needs_session = True
+
+    @classmethod
+    def validate_params(cls, params):
+        problems = []
+        url = params.get('url')
+        if not url:
+            problems.append('url is required')
+        elif urlsplit(url).scheme not in ('http', 'https', 'ftp'):
+            problems.append(f'url must be an http(s) or ftp URL, not {url!r}')
+        patterns = {}
+        for name in ('filename_regex', 'version_regex'):
+            try:
+                patterns[name] = re.compile(params.get(name, ''))
+            except re.error as e:
+                problems.append(f'invalid {name}: {e}')
+        if not params.get('filename_regex'):
+            problems.append('filename_regex is required')
+        elif ('filename_regex' in patterns and
+                not patterns['filename_regex'].groups and
+                not params.get('version_file')):
+            problems.append('filename_regex captures no version and no '
+                            'version_file is given')
+        return problems
+
+    def __init__(self, params, ref_ver_data, session=None):
+        '''Fetch the directory listing, unless unchanged since the
+        reference was recorded, and find the newest file in it. Read the
+        version from inside that file if asked to.'''
+        self.ref_ver_data = ref_ver_data
+        self.new_ver_data = copy.deepcopy(self.ref_ver_data)
+        self.session = session if session is not None else requests
+        self.url = params['url']
+        if not self.url.endswith('/'):
+            self.url += '/'
+        self.pattern = re.compile(params['filename_regex'])
+        self.version_file = params.get('version_file')
+        self.version_pattern = re.compile(params.get('version_regex',
+                                                     default_version_regex))
+        self.files = []
+        listing = self.read_listing()
+        if listing is None:
+            self.use_reference()
+            return
+        self.files = self.matching_files(listing)
+        if not self.files:
+            raise RuntimeError(f'No file matching {self.pattern.pattern} '
+                               f'found at {self.url}.')
+        self.file, self.version = self.files[-1]
+        self.file_url = urljoin(self.url, self.file)
+        self.new_ver_data['file'] = self.file
+        if self.version_file:
+            self.version = self.read_version()
+        self.new_ver_data['version'] = self.version
+
+    def use_reference(self):
+        self.file = self.ref_ver_data.get('file')
+        self.file_url = urljoin(self.url, self.file or '')
+        self.version = self.ref_ver_data['version']
+
+    def record_validators(self, headers, prefix=''):
+        '''Save the validators of a response in the new reference, and
+        return whether they match those of the current reference.'''
+        validators = response_validators(headers, prefix)
+        self.new_ver_data.update(validators)
+        return validators_match(self.ref_ver_data, validators, prefix)
+
+    def read_listing(self):
+        '''Return the text of the directory listing, or None if it has not
+        changed since the reference was recorded.'''
+        if urlsplit(self.url).scheme == 'ftp':
+            ftp, path = self.ftp_connect(self.url)
+            with ftp:
+                return '\n'.join(ftp.nlst(path))
+        response = self.session.get(self.url,
+                                     headers=conditional_headers(
+                                             self.ref_ver_data))
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        if self.record_validators(response.headers):
+            return None
+        return response.text
+
+    def matching_files(self, listing):
+        '''Return the (name, version) pairs of the listed files matching
+        the filename pattern, oldest version first. The version is the
+        first group of the match, if any.'''
+        files = []
+        for name in listing_names(listing):
+            match = self.pattern.search(name)
+            if match:
+                version = match.group(1) if match.groups() else None
+                files.append((name, version))
+        return sorted(files, key=lambda f: version_key(f[1] or ''))
+
+    @staticmethod
+    def ftp_connect(url):
+        parts = urlsplit(url)
+        ftp = ftplib.FTP(parts.hostname)
+        ftp.login(parts.username or 'anonymous', parts.password or '')
+        return ftp, unquote(parts.path)
+
+    def member_matches(self, name):
+        return (fnmatch.fnmatch(name, self.version_file) or
+                fnmatch.fnmatch(posixpath.basename(name), self.version_file))
+
+    def read_version(self):
+        '''Return the version found in the version file of the newest
+        archive, which is only read as far as needed.'''
+        if self.file == self.ref_ver_data.get('file'):
+            headers = conditional_headers(self.ref_ver_data, 'file_')
+        else:
+            headers = {}
+        if urlsplit(self.file_url).scheme == 'ftp':
+            content = self.ftp_member()
+        elif self.file.endswith(('.zip', '.whl')):
+            content = self.zip_member(headers)
+        else:
+            content = self.tar_member(headers)
+        if content is None:
+            return self.ref_ver_data['version']
+        match = self.version_pattern.search(content.decode(errors='replace'))
+        if match is None:
+            raise RuntimeError(f'No version found in {self.version_file} of '
+                               f'{self.file_url}.')
+        return match.group(1) if match.groups() else match.group()
+
+    def zip_member(self, headers):
+        '''Read the version file from a zip archive with Range requests:
+        one for the index at the end of the archive and, unless the member
+        lies within it, one for the member itself. Returns None if the
+        archive has not changed.'''
+        fileobj = RangeFile(self.session, self.file_url, headers)
+        if fileobj.status == 304 or \
+                self.record_validators(fileobj.headers, 'file_'):
+            return None
+        with zipfile.ZipFile(fileobj) as archive:
+            for name in archive.namelist():
+                if self.member_matches(name):
+                    return archive.read(name)
+        return self.not_found()
+
+    def tar_member(self, headers):
+        '''Stream a tar archive until the version file has been read; the
+        remainder is never transferred. Returns None if the archive has not
+        changed.'''
+        response = self.session.get(self.file_url, headers=headers,
+                                    stream=True)
+        with response:
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            if self.record_validators(response.headers, 'file_'):
+                return None
+            return self.read_tar(response.raw)
+
+    def ftp_member(self):
+        ftp, path = self.ftp_connect(self.file_url)
+        with ftp:
+            ftp.voidcmd('TYPE I')
+            with ftp.transfercmd(f'RETR {path}') as conn:
+                stream = conn.makefile('rb')
+                if self.file.endswith(('.zip', '.whl')):
+                    # Zip archives are indexed at their end.
+                    fileobj = io.BytesIO(stream.read())
+                    with zipfile.ZipFile(fileobj) as archive:
+                        for name in archive.namelist():
+                            if self.member_matches(name):
+                                return archive.read(name)
+                    return self.not_found()
+                return self.read_tar(stream)
+
+    def read_tar(self, fileobj):
+        with tarfile.open(fileobj=fileobj, mode='r|*') as tfile:
+            for member in tfile:
+                if member.isfile() and self.member_matches(member.name):
+                    return tfile.extractfile(member).read()
+        return self.not_found()
+
+    def not_found(self):
+        raise RuntimeError(f'{self.version_file} not found in '
+                           f'{self.file_url}.')
+
+    def new_version_available(self):
+        return self.new_ver_data['version'] != self.ref_ver_data['version']
+
+    def version_data(self):
+        '''Return reference dict with updated version and other values.'''
+        return(self.new_ver_data)
+
+    def get_extra(self):
+        '''Return the location of the newest file and the names of the
+        files published since the reference version.'''
+        extra = f'Newest file: [{self.file}]({self.file_url})'
+        ref_key = version_key(str(self.ref_ver_data['version']))
+        newer = [name for name, version in self.files
+                 if version is not None and version_key(version) > ref_key]
+        if newer:
+            newer = newer[::-1]
+            extra += (f'\n\nFiles published since '
+                      f'{self.ref_ver_data["version"]}:\n\n')
+            extra += ''.join(f'- {name}\n'
+                             for name in newer[:max_listed_files])
+            if len(newer) > max_listed_files:
+                extra += f'- ... and {len(newer) - max_listed_files} more\n'
+        return(extra)
@@ -0,0 +1,54 @@
+# PyPI version update checker, selected with 'type: pypi' in the config
+# section of the dependency:
+#
+#   [astropy]
+#   type: pypi
+#
+# Reads the releases of the package from the JSON API of the index
+# (https://pypi.org/pypi/<package>/json). See jsonindex.IndexPlugin for the
+# parameters.
+import re
+
+from .jsonindex import IndexPlugin
+
+# Project URLs, by lower-cased title, likely to point at release notes.
+changelog_titles = re.compile('change|release|history|news|what')
+
+
+class plugin(IndexPlugin):
+    default_index_url = 'https://pypi.org/pypi'
+
+    @classmethod
+    def document_url(cls, params):
+        return f'{cls.index_url(params)}/{cls.package(params)}/json'
+
+    def read_releases(self, document):
+        releases = []
+        for version, files in document.get('releases', {}).items():
+            if not files:
+                continue
+            dates = [f.get('upload_time_iso_8601') or f.get('upload_time')
+                     for f in files]
+            date = min((d for d in dates if d), default=None)
+            yanked = all(f.get('yanked') for f in files)
+            notes = []
+            requires_python = next((f['requires_python'] for f in files
+                                    if f.get('requires_python')), None)
+            if requires_python:
+                notes.append(f'requires Python {requires_python}')
+            reason = next((f['yanked_reason'] for f in files
+                           if f.get('yanked_reason')), None)
+            if yanked and reason:
+                notes.append(f'yanked: {reason}')
+            releases.append((version, date, ', '.join(notes), yanked))
+        return releases
+
+    def read_links(self, document):
+        info = document.get('info') or {}
+        links = [(title, url) for title, url in
+                 (info.get('project_urls') or {}).items()
+                 if changelog_titles.search(title.lower())]
+        page = info.get('package_url') or info.get('project_url')
+        if page:
+            links.append(('Project page', page))
+        return links
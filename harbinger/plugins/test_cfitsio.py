@@ -1,8 +1,11 @@
+import io
 import os
 import shutil
+import tarfile
 import pytest
 from ..plugins import relcheck_cfitsio
 from ..utils import pushd
+from ..mock_http import mock_http_server
 
 # TODO: Make this all self-contained by creating the tar.gz files
 #       from data stored in this file and then running it through
@@ -62,3 +65,67 @@ def test_get_extra_nonstandard_changelog(tmpdir):
     with pushd(tmpdir):
         p = relcheck_cfitsio.plugin(params, test_reference, nonstd_tarball)
         assert p.get_extra() == parsefail_changelog
+
+def test_streamed_download(monkeypatch):
+    with open(os.path.join(test_dir, tarball), 'rb') as f:
+        routes = {'/cfitsio_latest.tar.gz': f.read()}
+    with mock_http_server(routes) as server:
+        monkeypatch.setattr(relcheck_cfitsio, 'latest_URL',
+                            f'{server.url}/cfitsio_latest.tar.gz')
+        p = relcheck_cfitsio.plugin(params, {'version': '1.00', 'soname': '1'})
+    assert not p.new_version_available()
+    assert p.get_extra() == changelog
+
+def test_stream_stops_early():
+    # Append a large incompressible member after the two that are needed.
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w:gz') as out:
+        with tarfile.open(os.path.join(test_dir, tarball)) as src:
+            for member in src.getmembers():
+                out.addfile(member, src.extractfile(member))
+        filler = tarfile.TarInfo('cfitsio/filler.bin')
+        filler.size = 4 * 1024 * 1024
+        out.addfile(filler, io.BytesIO(os.urandom(filler.size)))
+    size = buf.tell()
+    buf.seek(0)
+    p = relcheck_cfitsio.plugin.__new__(relcheck_cfitsio.plugin)
+    p.read_tarball(buf)
+    assert buf.tell() < size / 4
+    assert p.readlines(b'') == []
+    assert any('CFITSIO_VERSION' in line for line in p.header)
+
+@pytest.fixture
+def tarball_server():
+    with open(os.path.join(test_dir, tarball), 'rb') as f:
+        body = f.read()
+    headers = {'ETag': '"abc123"',
+               'Last-Modified': 'Mon, 01 Jun 2020 00:00:00 GMT'}
+    def route(method, path, reqheaders, reqbody):
+        if reqheaders.get('If-None-Match') == headers['ETag']:
+            return (304, headers, b'')
+        return (200, headers, body)
+    with mock_http_server({'/cfitsio_latest.tar.gz': route}) as server:
+        server.params = {'url': f'{server.url}/cfitsio_latest.tar.gz'}
+        yield server
+
+def test_upstream_unchanged(tarball_server):
+    reference = {'version': '1.00', 'soname': '1', 'etag': '"abc123"',
+                 'last_modified': 'Mon, 01 Jun 2020 00:00:00 GMT'}
+    p = relcheck_cfitsio.plugin(tarball_server.params, reference)
+    assert not p.new_version_available()
+    assert p.version_data() == reference
+    assert p.header == []
+    assert tarball_server.requests[0][2]['If-None-Match'] == '"abc123"'
+
+def test_upstream_changed(tarball_server):
+    reference = {'version': '0.99', 'soname': '1', 'etag': '"old"'}
+    p = relcheck_cfitsio.plugin(tarball_server.params, reference)
+    assert p.new_version_available()
+    assert p.version_data()['version'] == '1.00'
+    assert p.version_data()['etag'] == '"abc123"'
+    assert p.version_data()['last_modified'] == 'Mon, 01 Jun 2020 00:00:00 GMT'
+    assert 'content_length' in p.version_data()
+    # The recorded validators take the fast path on the next check.
+    q = relcheck_cfitsio.plugin(tarball_server.params, p.version_data())
+    assert not q.new_version_available()
+    assert q.header == []
@@ -0,0 +1,64 @@
+import json
+import pytest
+from ..plugins import relcheck_condaforge
+from ..mock_http import mock_http_server
+
+test_reference = {'version': '4.0.0'}
+
+
+def conda_file(version, subdir, date, labels=('main',)):
+    return {'version': version, 'upload_time': date,
+            'attrs': {'subdir': subdir}, 'labels': list(labels)}
+
+
+document = {'name': 'cfitsio',
+            'html_url': 'https://anaconda.org/conda-forge/cfitsio',
+            'home': 'https://heasarc.gsfc.nasa.gov/fitsio/',
+            'files': [
+                conda_file('4.0.0', 'linux-64', '2021-06-01 10:00:00+00:00'),
+                conda_file('4.1.0', 'linux-64', '2022-03-02 10:00:00+00:00'),
+                conda_file('4.1.0', 'osx-64', '2022-03-01 10:00:00+00:00'),
+                conda_file('4.2.0', 'linux-64', '2022-11-01 10:00:00+00:00'),
+                conda_file('4.3.0rc1', 'linux-64', '2023-01-01 10:00:00+00:00',
+                           labels=('rc',))]}
+
+
+@pytest.fixture
+def server():
+    routes = {'/package/conda-forge/cfitsio': (200, {'ETag': '"c1"'},
+                                               json.dumps(document))}
+    with mock_http_server(routes) as server:
+        yield server
+
+
+def conda_params(server, **kwargs):
+    return dict(type='condaforge', name='cfitsio-conda', package='cfitsio',
+                index_url=server.url, **kwargs)
+
+
+def test_latest_release(server):
+    p = relcheck_condaforge.plugin(conda_params(server), dict(test_reference))
+    assert p.new_version_available()
+    assert p.version_data() == {'version': '4.2.0', 'etag': '"c1"'}
+    assert p.get_extra() == (
+            'Releases of cfitsio since 4.0.0:\n\n'
+            '- 4.2.0 (2022-11-01): linux-64\n'
+            '- 4.1.0 (2022-03-01): linux-64, osx-64\n\n'
+            'Project page: https://anaconda.org/conda-forge/cfitsio\n'
+            'Home page: https://heasarc.gsfc.nasa.gov/fitsio/')
+
+
+def test_unchanged(server):
+    # The server ignores conditional requests; the ETag shows the document
+    # is the one already seen.
+    ref = {'version': '4.2.0', 'etag': '"c1"'}
+    p = relcheck_condaforge.plugin(conda_params(server), ref)
+    assert not p.new_version_available()
+    assert p.version_data() == ref
+
+
+def test_channel(server):
+    with pytest.raises(Exception):
+        relcheck_condaforge.plugin(conda_params(server, channel='other'),
+                                   dict(test_reference))
+    assert server.requests[-1][1] == '/package/other/cfitsio'
@@ -46,3 +46,193 @@ def test_get_extra(mock_github, tmpdir):
     assert p.get_extra() == changelog
 
 
+
+def test_version_key():
+    ordered = ['1.0a1', '1.0b2', '1.0rc1', '1.0', '1.0.0.post1', '1.0.1',
+               '1.9', '1.10.dev1', '1.10']
+    keys = [relcheck_github.version_key(v) for v in ordered]
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+    assert (relcheck_github.version_key('1.0') ==
+            relcheck_github.version_key('v1.0.0'))
+
+
+tags = ['nightly', 'v2.10.0', 'v2.10.0rc1', 'v2.9.1', 'v2.9.0', 'v2.8.0',
+        'v1.0.0']
+tag_params = {'name': 'org/reponame', 'release_style': 'tag-only'}
+
+
+def test_tag_only_latest():
+    gh = mock_gh('tag', tags=tags)
+    p = relcheck_github.plugin(tag_params, {'version': '1.0.0'}, gh)
+    assert p.new_version_available()
+    assert p.version_data() == {'version': '2.10.0', 'tag': 'v2.10.0'}
+    assert gh.tags_listed == len(tags)
+
+
+def test_tag_only_stops_at_reference():
+    gh = mock_gh('tag', tags=tags)
+    ref = {'version': '2.9.0', 'tag': 'v2.9.0'}
+    # When they can only be listed by name, all tags are listed unless
+    # asked otherwise.
+    p = relcheck_github.plugin(tag_params, ref, gh)
+    assert p.version_data() == {'version': '2.10.0', 'tag': 'v2.10.0'}
+    assert gh.tags_listed == len(tags)
+    gh = mock_gh('tag', tags=tags)
+    params = dict(tag_params, stop_at_reference='yes')
+    p = relcheck_github.plugin(params, ref, gh)
+    assert p.version_data() == {'version': '2.10.0', 'tag': 'v2.10.0'}
+    assert gh.tags_listed == tags.index('v2.9.0') + 1
+
+
+# The same tags, most recently committed first: a backport came after 2.10.0.
+tags_by_date = ['nightly', 'v2.9.1', 'v2.10.0', 'v2.10.0rc1', 'v2.9.0',
+                'v2.8.0', 'v1.0.0']
+
+
+def test_tag_only_by_date(monkeypatch):
+    monkeypatch.setattr(relcheck_github, 'tag_page_size', 2)
+    gh = mock_gh('tag', tags=tags, tags_by_date=tags_by_date)
+    ref = {'version': '2.9.0', 'tag': 'v2.9.0'}
+    # The listing stops at the reference tag by default.
+    p = relcheck_github.plugin(tag_params, ref, gh)
+    assert p.version_data() == {'version': '2.10.0', 'tag': 'v2.10.0'}
+    # Up to the page holding the reference tag.
+    assert gh.tag_pages == 3
+    # Without a reference tag, every page is listed.
+    gh = mock_gh('tag', tags=tags, tags_by_date=tags_by_date)
+    p = relcheck_github.plugin(tag_params, {'version': '1.0.0'}, gh)
+    assert p.version_data() == {'version': '2.10.0', 'tag': 'v2.10.0'}
+    assert gh.tags_listed == len(tags)
+    assert gh.tag_pages == 4
+
+
+def test_tag_only_unchanged():
+    gh = mock_gh('tag', tags=tags[1:])
+    ref = {'version': '2.10.0', 'tag': 'v2.10.0'}
+    p = relcheck_github.plugin(dict(tag_params, stop_at_reference='yes'),
+                               ref, gh)
+    assert not p.new_version_available()
+    assert gh.tags_listed == 1
+
+
+def test_tag_only_regex():
+    gh = mock_gh('tag', tags=tags)
+    params = dict(tag_params, tag_regex=r'^v(\d+\.\d+\.\d+(rc\d+)?)$')
+    p = relcheck_github.plugin(params, {'version': '1.0.0'}, gh)
+    assert p.version_data()['tag'] == 'v2.10.0'
+    gh = mock_gh('tag', tags=['v2.11.0rc1'] + tags)
+    p = relcheck_github.plugin(params, {'version': '1.0.0'}, gh)
+    assert p.version_data() == {'version': '2.11.0rc1', 'tag': 'v2.11.0rc1'}
+    params = dict(tag_params, tag_regex=r'^v2\.9\.')
+    p = relcheck_github.plugin(params, {'version': '1.0.0'}, gh)
+    assert p.version_data() == {'version': 'v2.9.1', 'tag': 'v2.9.1'}
+    with pytest.raises(RuntimeError):
+        relcheck_github.plugin(dict(tag_params, tag_regex='^none$'),
+                               {'version': '1.0.0'}, gh)
+
+
+def test_validate_params():
+    assert relcheck_github.plugin.validate_params(params) == []
+    assert relcheck_github.plugin.validate_params(tag_params) == []
+    problems = relcheck_github.plugin.validate_params(
+            {'release_style': 'tags', 'tag_regex': '(',
+             'changelog_bytes': '4k'})
+    assert len(problems) == 3
+    assert problems[0].startswith("unknown release_style 'tags'")
+    assert relcheck_github.plugin.validate_params({}) == [
+            'release_style is required']
+
+
+def changelog_gh(**kwargs):
+    releases = [mock_gh_release('v2.1.0', 'Release 2.1.0', 'Fixes.'),
+                mock_gh_release('v2.0.0', None, 'Breaking changes.'),
+                mock_gh_release('v2.0.0rc1', 'Draft', 'Draft.', draft=True),
+                mock_gh_release('v1.0.0', 'Release 1.0.0', 'First.'),
+                mock_gh_release('v0.9.0', 'Release 0.9.0', 'Beta.')]
+    commits = [mock_gh_commit('a' * 40, 'Fix a bug\n\nDetails.'),
+               mock_gh_commit('b' * 40, 'Add a feature')]
+    return mock_gh('v2.1.0', releases=releases, commits=commits, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def clear_changelog_cache():
+    relcheck_github.changelog_cache.clear()
+
+
+def test_changelog():
+    gh = changelog_gh()
+    p = relcheck_github.plugin(params, {'version': '1.0.0'}, gh)
+    extra = p.get_extra()
+    assert extra.startswith('## Release 2.1.0\n\nFixes.\n\n## v2.0.0\n\n'
+                            'Breaking changes.')
+    assert 'Draft' not in extra
+    assert 'First.' not in extra
+    assert gh.releases_listed == 4
+    assert gh.compares == [('v1.0.0', 'v2.1.0', 1)]
+    assert ('2 commits since v1.0.0: '
+            'https://github.com/org/reponame/compare/v1.0.0...v2.1.0') in extra
+    assert extra.endswith('- aaaaaaa Fix a bug\n- bbbbbbb Add a feature')
+
+
+def test_changelog_truncated():
+    gh = changelog_gh()
+    params_capped = dict(params, changelog_bytes='30')
+    p = relcheck_github.plugin(params_capped, {'version': '1.0.0'}, gh)
+    extra = p.get_extra()
+    assert extra == '## Release 2.1.0\n\nFixes.\n\n## v\n\n(Truncated.)'
+    assert gh.releases_listed == 2
+    assert gh.compares == []
+
+
+def test_changelog_cached():
+    gh = changelog_gh()
+    p = relcheck_github.plugin(params, {'version': '1.0.0'}, gh)
+    extra = p.get_extra()
+    p = relcheck_github.plugin(params, {'version': '1.0.0'}, gh)
+    assert p.get_extra() == extra
+    assert gh.releases_listed == 4
+    assert len(gh.compares) == 1
+    # A different range is assembled anew.
+    p = relcheck_github.plugin(params, {'version': '2.0.0'}, gh)
+    assert p.get_extra().startswith('## Release 2.1.0\n\nFixes.\n\n'
+                                    '2 commits since v2.0.0')
+    assert gh.compares[-1] == ('v2.0.0', 'v2.1.0', 1)
+
+
+def test_changelog_many_commits():
+    gh = changelog_gh()
+    gh.commits = [mock_gh_commit(f'{i:040x}', f'Change {i}')
+                  for i in range(1, 61)]
+    p = relcheck_github.plugin(dict(params, changelog_bytes='100000'),
+                               {'version': '1.0.0'}, gh)
+    extra = p.get_extra()
+    # The count is the total given by the compare API.
+    assert '60 commits since v1.0.0 (first 50 listed)' in extra
+    assert extra.count('\n- ') == 50
+    assert gh.compares == [('v1.0.0', 'v2.1.0', 1)]
+
+
+def test_changelog_paged_commits():
+    gh = changelog_gh()
+    gh.commits = [mock_gh_commit(f'{i:040x}', f'Change {i}')
+                  for i in range(1, 31)]
+    # The server returns fewer commits per page than asked for.
+    gh.compare_page_size = 20
+    p = relcheck_github.plugin(dict(params, changelog_bytes='100000'),
+                               {'version': '1.0.0'}, gh)
+    extra = p.get_extra()
+    assert '30 commits since v1.0.0: ' in extra
+    assert extra.count('\n- ') == 30
+    assert gh.compares == [('v1.0.0', 'v2.1.0', 1), ('v1.0.0', 'v2.1.0', 2)]
+
+
+def test_changelog_compare_unavailable():
+    gh = changelog_gh()
+    gh.compare_status = 404
+    p = relcheck_github.plugin(params, {'version': '1.0.0'}, gh)
+    extra = p.get_extra()
+    # The release notes are given without the commits.
+    assert extra.startswith('## Release 2.1.0\n\nFixes.')
+    assert 'commits since' not in extra
+    assert len(gh.compares) == 1
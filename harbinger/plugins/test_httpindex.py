@@ -0,0 +1,199 @@
+import io
+import os
+import tarfile
+import zipfile
+import pytest
+from ..plugins import relcheck_httpindex
+from ..plugins.registry import PluginRegistry
+from ..mock_http import mock_http_server
+
+listing_html = '''<html><body><h1>Index of /pub/libfoo/</h1>
+<a href="../">../</a>
+<a href="libfoo-1.2.0.tar.gz">libfoo-1.2.0.tar.gz</a>
+<a href="libfoo-1.10.0.tar.gz">libfoo-1.10.0.tar.gz</a>
+<a href="libfoo-1.9.0.tar.gz">libfoo-1.9.0.tar.gz</a>
+<a href="/pub/libfoo/libfoo-1.10.0.tar.gz.sig">libfoo-1.10.0.tar.gz.sig</a>
+<a href="libfoo_latest.tar.gz">libfoo_latest.tar.gz</a>
+<a href="libfoo_latest.zip">libfoo_latest.zip</a>
+<a href="old/">old/</a>
+</body></html>
+'''
+version_h = b'#define LIBFOO_VERSION "1.10.0"\n'
+filler = os.urandom(1000000)
+test_reference = {'version': '1.2.0'}
+params = {'type': 'httpindex',
+          'filename_regex': r'^libfoo-(\d+(?:\.\d+)*)\.tar\.gz$'}
+
+
+def make_tarball():
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w:gz') as tfile:
+        for name, data in (('libfoo-1.10.0/include/version.h', version_h),
+                           ('libfoo-1.10.0/filler.bin', filler)):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tfile.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def make_zip():
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as archive:
+        archive.writestr('libfoo-1.10.0/include/version.h', version_h)
+        archive.writestr('libfoo-1.10.0/filler.bin', filler)
+    return buf.getvalue()
+
+
+tarball = make_tarball()
+zipball = make_zip()
+
+
+def etag_route(body, etag):
+    def route(method, path, headers, reqbody):
+        if headers.get('If-None-Match') == etag:
+            return (304, {'ETag': etag}, b'')
+        return (200, {'ETag': etag}, body)
+    return route
+
+
+def make_server(ranges=True):
+    routes = {'/pub/libfoo/': etag_route(listing_html, '"listing1"'),
+              '/pub/libfoo/libfoo_latest.tar.gz': etag_route(tarball, '"tar1"'),
+              '/pub/libfoo/libfoo_latest.zip': etag_route(zipball, '"zip1"')}
+    return mock_http_server(routes, ranges=ranges)
+
+
+@pytest.fixture
+def server():
+    with make_server() as server:
+        yield server
+
+
+def test_listing_names():
+    assert relcheck_httpindex.listing_names(listing_html) == [
+            '..', 'libfoo-1.2.0.tar.gz', 'libfoo-1.10.0.tar.gz',
+            'libfoo-1.9.0.tar.gz', 'libfoo-1.10.0.tar.gz.sig',
+            'libfoo_latest.tar.gz', 'libfoo_latest.zip', 'old']
+    text = ('-rw-r--r-- 1 ftp ftp 100 Jan 01 2021 libfoo-1.0.tar.gz\n'
+            '-rw-r--r-- 1 ftp ftp 100 Jan 01 2021 libfoo-1.1.tar.gz\n')
+    assert relcheck_httpindex.listing_names(text) == [
+            'libfoo-1.0.tar.gz', 'libfoo-1.1.tar.gz']
+
+
+def test_newest_file(server):
+    p = relcheck_httpindex.plugin(dict(params, url=f'{server.url}/pub/libfoo'),
+                                  dict(test_reference))
+    assert p.new_version_available()
+    assert p.version_data() == {'version': '1.10.0',
+                                'file': 'libfoo-1.10.0.tar.gz',
+                                'etag': '"listing1"'}
+    assert p.get_extra() == (
+            f'Newest file: [libfoo-1.10.0.tar.gz]'
+            f'({server.url}/pub/libfoo/libfoo-1.10.0.tar.gz)\n\n'
+            'Files published since 1.2.0:\n\n'
+            '- libfoo-1.10.0.tar.gz\n'
+            '- libfoo-1.9.0.tar.gz\n')
+    # Only the listing was requested.
+    assert server.count('GET') == 1
+
+
+def test_listing_unchanged(server):
+    url = f'{server.url}/pub/libfoo/'
+    p = relcheck_httpindex.plugin(dict(params, url=url), dict(test_reference))
+    p = relcheck_httpindex.plugin(dict(params, url=url), p.version_data())
+    assert not p.new_version_available()
+    assert server.requests[-1][2]['If-None-Match'] == '"listing1"'
+
+
+def test_no_matching_file(server):
+    with pytest.raises(RuntimeError):
+        relcheck_httpindex.plugin(dict(params, url=f'{server.url}/pub/libfoo/',
+                                       filename_regex=r'^libbar-(\d+)'),
+                                  dict(test_reference))
+
+
+def latest_params(server, name):
+    return dict(params, url=f'{server.url}/pub/libfoo/',
+                filename_regex=f'^{name}$',
+                version_file='*/version.h',
+                version_regex=r'VERSION "([\d.]+)"')
+
+
+def test_version_file_tarball(server):
+    p = relcheck_httpindex.plugin(latest_params(server, 'libfoo_latest.tar.gz'),
+                                  dict(test_reference))
+    assert p.version_data() == {'version': '1.10.0',
+                                'file': 'libfoo_latest.tar.gz',
+                                'etag': '"listing1"',
+                                'file_etag': '"tar1"'}
+    # The tarball is not read again while unchanged, even if the listing
+    # has changed.
+    ref = p.version_data()
+    del ref['etag']
+    p = relcheck_httpindex.plugin(latest_params(server, 'libfoo_latest.tar.gz'),
+                                  ref)
+    assert not p.new_version_available()
+    assert server.requests[-1][2]['If-None-Match'] == '"tar1"'
+
+
+def range_lengths(server, path):
+    lengths = []
+    for method, reqpath, headers, client in server.requests:
+        if reqpath != path:
+            continue
+        first, last = headers['Range'].split('=')[1].split('-')
+        if not first:
+            lengths.append(int(last))
+        else:
+            lengths.append(int(last) - int(first) + 1)
+    return lengths
+
+
+def test_version_file_zip_ranges(server):
+    p = relcheck_httpindex.plugin(latest_params(server, 'libfoo_latest.zip'),
+                                  dict(test_reference))
+    assert p.version_data()['version'] == '1.10.0'
+    assert p.version_data()['file_etag'] == '"zip1"'
+    # The index at the end of the archive is fetched first, then the
+    # member; the filler is never transferred.
+    lengths = range_lengths(server, '/pub/libfoo/libfoo_latest.zip')
+    assert len(lengths) == 2
+    assert sum(lengths) < len(zipball) // 4
+
+
+def test_version_file_zip_no_ranges():
+    with make_server(ranges=False) as server:
+        p = relcheck_httpindex.plugin(latest_params(server, 'libfoo_latest.zip'),
+                                      dict(test_reference))
+        assert p.version_data()['version'] == '1.10.0'
+        assert server.count('GET', '/pub/libfoo/libfoo_latest.zip') == 1
+
+
+def test_version_file_missing(server):
+    with pytest.raises(RuntimeError):
+        relcheck_httpindex.plugin(
+                dict(latest_params(server, 'libfoo_latest.zip'),
+                     version_file='*/missing.h'),
+                dict(test_reference))
+
+
+def test_validate_params():
+    url = 'https://example.org/pub/libfoo/'
+    assert relcheck_httpindex.plugin.validate_params(
+            dict(params, url=url)) == []
+    assert relcheck_httpindex.plugin.validate_params(
+            {'url': url, 'filename_regex': '^libfoo_latest.zip$',
+             'version_file': 'version.h'}) == []
+    problems = relcheck_httpindex.plugin.validate_params(
+            {'url': 'example.org', 'filename_regex': '^libfoo_latest.zip$',
+             'version_regex': '('})
+    assert len(problems) == 3
+    assert relcheck_httpindex.plugin.validate_params({}) == [
+            'url is required', 'filename_regex is required']
+
+
+def test_selected_by_type():
+    reg = PluginRegistry()
+    assert reg.get('libfoo', params) is relcheck_httpindex.plugin
+    assert reg.plugin_name('libfoo', params) == 'httpindex'
+    assert reg.plugin_name('libfoo') == 'libfoo'
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import yaml
+import pytest
+from ..plugins import relcheck_pypi
+from ..plugins.jsonindex import IndexPlugin
+from ..plugins.registry import PluginRegistry
+from ..lookup_cache import LookupCache
+from ..scanner import Scanner
+from ..session import HTTPSession
+from ..subscribers import build_index
+from ..mock_github3 import mock_gh
+from ..mock_http import mock_http_server
+
+test_reference = {'version': '1.0.0'}
+
+
+def pypi_file(date, requires_python='>=3.8', yanked=False, reason=None):
+    return {'upload_time_iso_8601': date, 'requires_python': requires_python,
+            'yanked': yanked, 'yanked_reason': reason}
+
+
+def pypi_document(package):
+    return {'info': {'name': package,
+                     'version': '1.2.0',
+                     'package_url': f'https://pypi.org/project/{package}/',
+                     'project_urls': {
+                         'Homepage': 'https://example.org',
+                         'Changelog': 'https://example.org/changes.html'}},
+            'releases': {
+                '0.9.0': [pypi_file('2020-01-01T00:00:00Z')],
+                '1.0.0': [pypi_file('2021-01-01T00:00:00Z')],
+                '1.1.0': [pypi_file('2021-06-01T00:00:00Z'),
+                          pypi_file('2021-06-02T00:00:00Z')],
+                '1.1.1': [pypi_file('2021-07-01T00:00:00Z', yanked=True,
+                                    reason='Broken wheel')],
+                '1.10.0': [pypi_file('2022-01-01T00:00:00Z',
+                                     requires_python='>=3.9')],
+                '2.0.0rc1': [pypi_file('2022-02-01T00:00:00Z')],
+                '2.0.0': []}}
+
+
+def index_route(document, etag):
+    def route(method, path, headers, body):
+        if headers.get('If-None-Match') == etag:
+            return (304, {'ETag': etag}, b'')
+        return (200, {'ETag': etag, 'Content-Type': 'application/json'},
+                json.dumps(document))
+    return route
+
+
+packages = ['pkg0', 'pkg1', 'pkg2', 'pkg3']
+
+
+def make_server(delay=0):
+    routes = {f'/pypi/{package}/json': index_route(pypi_document(package),
+                                                   f'"{package}-1"')
+              for package in packages}
+    return mock_http_server(routes, delay=delay)
+
+
+@pytest.fixture
+def server():
+    with make_server() as server:
+        yield server
+
+
+def pypi_params(server, name='pkg0', **kwargs):
+    return dict(type='pypi', name=name, index_url=f'{server.url}/pypi',
+                **kwargs)
+
+
+def test_latest_release(server):
+    p = relcheck_pypi.plugin(pypi_params(server), dict(test_reference))
+    assert p.new_version_available()
+    assert p.version_data() == {'version': '1.10.0', 'etag': '"pkg0-1"'}
+    assert p.get_extra() == (
+            'Releases of pkg0 since 1.0.0:\n\n'
+            '- 1.10.0 (2022-01-01): requires Python >=3.9\n'
+            '- 1.1.1 (2021-07-01) [yanked]: requires Python >=3.8, '
+            'yanked: Broken wheel\n'
+            '- 1.1.0 (2021-06-01): requires Python >=3.8\n\n'
+            'Changelog: https://example.org/changes.html\n'
+            'Project page: https://pypi.org/project/pkg0/')
+
+
+def test_pre_releases(server):
+    p = relcheck_pypi.plugin(pypi_params(server, pre_releases='yes'),
+                             dict(test_reference))
+    assert p.version_data()['version'] == '2.0.0rc1'
+
+
+def test_package_param(server):
+    params = dict(pypi_params(server), name='mydep', package='pkg1')
+    p = relcheck_pypi.plugin(params, dict(test_reference))
+    assert p.version_data()['etag'] == '"pkg1-1"'
+
+
+def test_unchanged(server):
+    p = relcheck_pypi.plugin(pypi_params(server), dict(test_reference))
+    p = relcheck_pypi.plugin(pypi_params(server), p.version_data())
+    assert not p.new_version_available()
+    assert server.requests[-1][2]['If-None-Match'] == '"pkg0-1"'
+
+
+def test_validate_params():
+    assert relcheck_pypi.plugin.validate_params({'type': 'pypi'}) == []
+    assert len(relcheck_pypi.plugin.validate_params(
+            {'index_url': 'pypi.org', 'pre_releases': 'maybe'})) == 2
+
+
+def test_selected_by_type():
+    assert PluginRegistry().get('numpy', {'type': 'pypi'}) is \
+            relcheck_pypi.plugin
+
+
+def test_prefetch(server):
+    lookups = [(pypi_params(server, name=package), dict(test_reference))
+               for package in packages]
+    # The same document requested twice is fetched once.
+    lookups.append(lookups[0])
+    session = HTTPSession()
+    relcheck_pypi.plugin.prefetch(lookups, session=session)
+    assert server.count('GET') == len(packages)
+    for params, ref in lookups[:len(packages)]:
+        p = relcheck_pypi.plugin(params, ref, session=session)
+        assert p.version_data()['version'] == '1.10.0'
+    # All lookups were served by the prefetched responses.
+    assert server.count('GET') == len(packages)
+    assert not session.prefetched
+    # Without a session to keep them on, nothing is prefetched.
+    relcheck_pypi.plugin.prefetch(lookups, session=None)
+    assert server.count('GET') == len(packages)
+
+
+def test_prefetched_dropped_after_run(tmp_path, monkeypatch):
+    with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+        f.write(yaml.safe_dump({package: dict(test_reference)
+                                for package in packages}))
+    def failing_init(self, params, ref_ver_data, session=None):
+        raise RuntimeError('lookup failed')
+    with make_server() as server:
+        scanner = Scanner('testorg', tmp_path, gh=mock_gh('tagname'),
+                          issue_pace=0, dry_run=True)
+        params = {'type': 'pypi', 'index_url': f'{server.url}/pypi'}
+        requests = {f'testorg/repo{i}': {package: params}
+                    for i, package in enumerate(packages)}
+        monkeypatch.setattr(relcheck_pypi.plugin, '__init__', failing_init)
+        scanner.check_subscribers(build_index(requests))
+        assert list(scanner.check_errors) == packages
+        # Responses left over by a run are not served to the next one.
+        assert not scanner.session.prefetched
+
+
+def test_abstract_methods():
+    class incomplete(IndexPlugin):
+        @classmethod
+        def document_url(cls, params):
+            return 'https://example.org/'
+    with pytest.raises(TypeError):
+        incomplete({'name': 'dep'}, dict(test_reference))
+
+
+def test_scanner_batches_lookups(tmp_path):
+    with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+        f.write(yaml.safe_dump({package: dict(test_reference)
+                                for package in packages}))
+    with make_server(delay=0.5) as server:
+        scanner = Scanner('testorg', tmp_path, gh=mock_gh('tagname'),
+                          issue_pace=0, dry_run=True)
+        params = {'type': 'pypi', 'index_url': f'{server.url}/pypi'}
+        requests = {f'testorg/repo{i}': {package: params}
+                    for i, package in enumerate(packages)}
+        start = time.perf_counter()
+        scanner.check_subscribers(build_index(requests))
+        elapsed = time.perf_counter() - start
+        # Checked one at a time, but fetched together beforehand.
+        assert scanner.check_workers == 1
+        assert elapsed < 0.5 * len(packages) * 0.75
+        assert server.count('GET') == len(packages)
+    assert all(scanner.refs[package]['version'] == '1.10.0'
+               for package in packages)
+
+
+def test_prefetch_skips_cached_lookups(tmp_path):
+    with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+        f.write(yaml.safe_dump({package: dict(test_reference)
+                                for package in packages}))
+    cache = LookupCache(os.path.join(tmp_path, 'lookups.db'))
+    with make_server() as server:
+        params = {'type': 'pypi', 'index_url': f'{server.url}/pypi'}
+        for checked in (packages[:2], packages):
+            scanner = Scanner('testorg', tmp_path, gh=mock_gh('tagname'),
+                              issue_pace=0, dry_run=True, lookup_cache=cache)
+            requests = {f'testorg/repo{i}': {package: params}
+                        for i, package in enumerate(checked)}
+            scanner.check_subscribers(build_index(requests))
+        # The lookups made by the first run are not fetched again.
+        assert server.count('GET') == len(packages)
+    assert cache.hits == 2
@@ -0,0 +1,67 @@
+import os
+import pytest
+from ..plugins import plugin, relcheck_test, relcheck_github
+from ..plugins.registry import PluginRegistry
+from ..release_notifier import ReleaseNotifier
+from ..mock_github3 import *
+
+
+class scratch_plugin(plugin.Plugin):
+    needs_scratch_dir = True
+
+    def __init__(self, params, ref_ver_data, scratch_dir):
+        self.scratch_dir = scratch_dir
+        self.existed = os.path.isdir(scratch_dir)
+
+    def new_version_available(self):
+        return(False)
+
+    def version_data(self):
+        return({'version': '0.0.0'})
+
+    def get_extra(self):
+        return('')
+
+
+class mock_entry_point():
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+        self.loads = 0
+
+    def load(self):
+        self.loads += 1
+        return self.value
+
+
+def test_builtin_plugins():
+    reg = PluginRegistry()
+    assert reg.get('test') is relcheck_test.plugin
+    assert reg.get('someorg/somerepo') is relcheck_github.plugin
+    assert reg.get('otherorg/otherrepo') is relcheck_github.plugin
+
+
+def test_plugin_dne():
+    reg = PluginRegistry()
+    with pytest.raises(ImportError):
+        reg.get('plugin_dne')
+
+
+def test_entry_point_resolved_once():
+    reg = PluginRegistry()
+    ep = mock_entry_point('thirdparty', scratch_plugin)
+    reg._entry_points = {'thirdparty': ep}
+    assert reg.get('thirdparty') is scratch_plugin
+    assert reg.get('thirdparty') is scratch_plugin
+    assert ep.loads == 1
+
+
+def test_scratch_dir(monkeypatch):
+    reg = PluginRegistry()
+    reg.register('scratch', scratch_plugin)
+    monkeypatch.setattr('harbinger.release_notifier.registry', reg)
+    n = ReleaseNotifier('scratch', {}, {'version': '0.0.0'},
+                        'testorg/testrepo', mock_gh('tagname'))
+    n.load_plugin()
+    assert n.plugin.existed
+    assert not os.path.exists(n.plugin.scratch_dir)
@@ -0,0 +1,202 @@
+# Github rate limit governor.
+#
+# A single RateLimiter is shared by every part of a run that talks to
+# Github: the repository listing, the config file fetches and the github3.py
+# calls made by the scanner and the plugins. It
+#   - paces requests with a token bucket,
+#   - follows the X-RateLimit-* headers of each response and, once the
+#     remaining quota drops to a reserve, waits for the quota to reset
+#     instead of failing partway through a run. Github keeps a separate
+#     quota per resource (core, search, graphql, ...), named by the
+#     X-RateLimit-Resource header, and each one is tracked on its own,
+#   - waits out secondary rate limits (403/429 with Retry-After) and lets
+#     the request be retried.
+import time
+import threading
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+
+def resource_of(url):
+    '''Return the name of the Github rate limit resource a request to `url`
+    counts against.'''
+    path = urlsplit(url).path.rstrip('/')
+    if path.endswith('/graphql'):
+        return 'graphql'
+    if '/search/' in path:
+        return 'search'
+    return 'core'
+
+
+class Quota():
+    '''Quota of one rate limit resource, as last reported by the server.'''
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+
+
+class RateLimiter():
+    '''RateLimiter class
+
+    Parameters
+    ----------
+    rate: Sustained number of requests per second allowed. None disables
+          pacing; the quota reported by the server is still honoured.
+    burst: Number of requests that may be made back to back before pacing
+           applies.
+    reserve: Remaining quota at or below which requests wait for the quota
+             to reset. It should exceed the number of requests that may be
+             in flight at once, as the quota is only known from responses.
+    max_retries: Number of times a request refused by a secondary rate
+                 limit is retried.
+    clock: Function returning the current time in seconds since the epoch.
+    sleep: Function used to wait.
+    metrics: Optional Metrics object in which to count the waits.
+    '''
+
+    def __init__(self,
+                 rate=None,
+                 burst=10,
+                 reserve=10,
+                 max_retries=3,
+                 clock=time.time,
+                 sleep=time.sleep,
+                 metrics=None):
+        self.rate = rate
+        self.burst = burst
+        self.reserve = reserve
+        self.max_retries = max_retries
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = burst
+        self.last_refill = clock()
+        # Quota objects by resource name.
+        self.quotas = {}
+        self.requests = 0
+        self.waits = 0
+        self.waited = 0.0
+        self.metrics = metrics
+        self._lock = threading.Lock()
+
+    def wait(self, seconds):
+        if seconds <= 0:
+            return
+        self.waits += 1
+        self.waited += seconds
+        if self.metrics is not None:
+            self.metrics.incr('ratelimit_waits')
+            self.metrics.incr('ratelimit_wait_seconds', seconds)
+        self.sleep(seconds)
+
+    def quota(self, resource):
+        if resource not in self.quotas:
+            self.quotas[resource] = Quota()
+        return self.quotas[resource]
+
+    def acquire(self, resource='core'):
+        '''Block until a request counting against the quota of `resource`
+        may be made.'''
+        # The lock is held while waiting so that all requesting threads
+        # pause together.
+        with self._lock:
+            now = self.clock()
+            quota = self.quota(resource)
+            if (quota.remaining is not None and
+                    quota.remaining <= self.reserve and
+                    quota.reset is not None and now < quota.reset):
+                print(f'Rate limit quota low ({quota.remaining} {resource} '
+                      f'requests left), waiting {quota.reset - now:.0f}s '
+                      f'for reset.')
+                self.wait(quota.reset - now)
+                quota.remaining = None
+                now = self.clock()
+            if self.rate:
+                self.tokens = min(self.burst, self.tokens +
+                                  (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens < 1:
+                    self.wait((1 - self.tokens) / self.rate)
+                    self.tokens = 1
+                    self.last_refill = self.clock()
+                self.tokens -= 1
+            self.requests += 1
+
+    def update(self, headers):
+        '''Record the quota reported in the headers of a response.'''
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is None:
+            return
+        with self._lock:
+            quota = self.quota(headers.get('X-RateLimit-Resource', 'core'))
+            quota.remaining = int(remaining)
+            if headers.get('X-RateLimit-Limit') is not None:
+                quota.limit = int(headers['X-RateLimit-Limit'])
+            if headers.get('X-RateLimit-Reset') is not None:
+                quota.reset = float(headers['X-RateLimit-Reset'])
+
+    def retry_delay(self, status, headers):
+        '''Return the number of seconds to wait before retrying a request
+        that was answered with `status`, or None if it was not refused by a
+        rate limit.'''
+        if status not in (403, 429):
+            return None
+        if headers.get('Retry-After') is not None:
+            return float(headers['Retry-After'])
+        if headers.get('X-RateLimit-Remaining') == '0':
+            if headers.get('X-RateLimit-Reset') is not None:
+                return max(0, float(headers['X-RateLimit-Reset']) - self.clock())
+        return None
+
+    def backoff(self, status, headers, attempt):
+        '''Wait as required by a refused request and return True if it
+        should be retried.'''
+        delay = self.retry_delay(status, headers)
+        if delay is None or attempt >= self.max_retries:
+            return False
+        print(f'Rate limited (HTTP {status}), retrying in {delay:.0f}s.')
+        self.wait(delay)
+        return True
+
+    def report(self):
+        '''Return a summary of the requests made and the quota left.'''
+        text = f'{self.requests} requests made'
+        known = [(name, quota) for name, quota in sorted(self.quotas.items())
+                 if quota.remaining is not None]
+        left = []
+        for name, quota in known:
+            item = f'{quota.remaining}'
+            if quota.limit is not None:
+                item += f'/{quota.limit}'
+            if len(known) > 1 or name != 'core':
+                item += f' {name}'
+            left.append(item)
+        if left:
+            text += f', {", ".join(left)} remaining in quota'
+        if self.waits:
+            text += f', {self.waited:.0f}s spent waiting on rate limits'
+        return text
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    '''Transport adapter that routes the requests of a requests.Session,
+    such as the one used by github3.py, through a RateLimiter.'''
+
+    def __init__(self, limiter, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+
+    def send(self, request, **kwargs):
+        attempt = 0
+        while True:
+            self.limiter.acquire(resource_of(request.url))
+            response = super().send(request, **kwargs)
+            self.limiter.update(response.headers)
+            if not self.limiter.backoff(response.status_code,
+                                        response.headers, attempt):
+                return response
+            response.close()
+            attempt += 1
+
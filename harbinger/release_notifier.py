@@ -9,12 +9,13 @@
 # modules.
 
 import os
-import importlib
+import time
 import tempfile
 
 import yaml
 import github3
-from .utils import pushd
+from .plugins.registry import registry
+from .schedule import PollSchedule
 
 
 class ReleaseNotifier():
@@ -36,6 +37,12 @@ class ReleaseNotifier():
     dry_run: If True, no attempt to actually post an issue to Github will be
              made.
              Default value: False
+    session: HTTPSession to hand to plugins that make HTTP requests.
+             Default value: None (such plugins open their own connections)
+    lookup_cache: LookupCache holding recent lookup results, possibly
+                  shared with other harbinger instances.
+                  Default value: None (every check queries upstream)
+    metrics: Optional Metrics object in which to time the lookups.
     '''
     github = None
 
@@ -46,10 +53,13 @@ class ReleaseNotifier():
                  ref,
                  notify_repo,
                  gh,
-                 dry_run=False):
+                 dry_run=False,
+                 session=None,
+                 lookup_cache=None,
+                 metrics=None):
 
         self.dep_name = depname
-        self.plugin_module = None
+        self.plugin_class = None
         self.params = params
         self.plugin = None
         self.notify_repo = notify_repo
@@ -61,35 +71,36 @@ class ReleaseNotifier():
         self.comment_base = (f'This is a message from an automated system '
                              f'that monitors `{self.dep_name}` releases.\n\n')
         self.dry_run = dry_run
+        self.session = session
+        self.lookup_cache = lookup_cache
+        self.metrics = metrics
         self.remote_ver = None
 
     def load_plugin(self):
-        if '/' in self.dep_name:  # Github dependency
-            plugin_name = f'.plugins.relcheck_github'
+        plugin_class = registry.get(self.dep_name, self.params)
+        self.plugin_class = plugin_class
+        # If depdency is hosted on Github, pass in the local github object
+        # to use when making API queries, otherwise instantiate a normal
+        # plugin object.
+        # NOTE: Plugins may be loaded from several threads at once, so they
+        #       must not rely on, or change, the current working directory.
+        # The dependency name (for Github dependencies 'owner/repo') is
+        # handed to the plugin along with a copy of the parameters, which
+        # are shared with the other subscribers.
+        args = [dict(self.params, name=self.dep_name), self.ref]
+        kwargs = {}
+        if getattr(plugin_class, 'needs_github', False):
+            args.append(ReleaseNotifier.github)
+        if getattr(plugin_class, 'needs_session', False):
+            kwargs['session'] = self.session
+        # Only plugins that declare a need for one get a clean scratch
+        # directory in which to create files. It is removed once the plugin
+        # object has been created.
+        if getattr(plugin_class, 'needs_scratch_dir', False):
+            with tempfile.TemporaryDirectory() as tmpdir:
+                self.plugin = plugin_class(*args, scratch_dir=tmpdir, **kwargs)
         else:
-            plugin_name = f'.plugins.relcheck_{self.dep_name}'
-        try:
-            self.plugin_module = importlib.import_module(plugin_name, 'harbinger')
-        except ImportError as e:
-            print(f'Import of plugin {plugin_name} failed.\n\n')
-            raise(ImportError)
-        # Change to temporary directory before creating plugin object
-        # to provide a clean location for it to create files, if necessary.
-        with tempfile.TemporaryDirectory() as tmpdir:
-            with pushd(tmpdir):
-                # If depdency is hosted on Github, pass in the local github object
-                # to use when making API queries, otherwise instantiate a normal
-                # plugin object.
-                if '/' in self.dep_name:  # Github dependency
-                    self.params['name'] = self.dep_name
-                    #print(f'self.ref = {self.ref}')
-                    self.plugin = self.plugin_module.plugin(
-                            self.params,
-                            self.ref,
-                            ReleaseNotifier.github)
-                else:
-                    self.plugin = self.plugin_module.plugin(self.params,
-                                                  self.ref)
+            self.plugin = plugin_class(*args, **kwargs)
 
     def new_version_available(self):
         return self.plugin.new_version_available()
@@ -112,20 +123,71 @@ class ReleaseNotifier():
                     self.issue_title,
                     self.comment)
 
+    def lookup(self):
+        '''Query upstream through the plugin. Returns whether a new version
+        is available, the resulting reference data and, for a new version,
+        the extra information to post.'''
+        start = time.perf_counter()
+        plugin_name = registry.plugin_name(self.dep_name, self.params)
+        try:
+            self.load_plugin()
+            if self.new_version_available():
+                extra = self.get_extra()
+                return True, self.version_data(), extra
+            # Plugins may refresh auxiliary reference values (e.g. upstream
+            # validators) even when the version is unchanged.
+            return False, self.version_data(), None
+        except Exception:
+            if self.metrics is not None:
+                self.metrics.incr('plugin_errors', plugin=plugin_name)
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe('plugin_lookup_seconds',
+                                     time.perf_counter() - start,
+                                     plugin=plugin_name, dep=self.dep_name)
+
+    def lookup_key(self):
+        '''Return the lookup cache key of the lookup this notifier makes.'''
+        plugin_name = registry.plugin_name(self.dep_name, self.params)
+        params = dict(self.params, name=self.dep_name)
+        return self.lookup_cache.key(plugin_name, params, self.ref)
+
+    def cached_lookup(self):
+        '''lookup(), answered from the lookup cache when another run made
+        the same lookup recently.'''
+        if self.lookup_cache is None:
+            return self.lookup()
+        plugin_name = registry.plugin_name(self.dep_name, self.params)
+        key = self.lookup_key()
+        result = self.lookup_cache.get(key)
+        if self.metrics is not None:
+            self.metrics.incr('lookup_cache_hits' if result is not None
+                              else 'lookup_cache_misses')
+        if result is not None:
+            print(f'{self.dep_name}: using recent lookup result')
+            return result['new'], result['ref'], result['extra']
+        new, ref, extra = self.lookup()
+        # Scheduling fields are per-instance and left to the caller.
+        shared_ref = {k: v for k, v in ref.items()
+                      if k not in PollSchedule.fields}
+        self.lookup_cache.put(key, plugin_name,
+                              {'new': new, 'ref': shared_ref, 'extra': extra})
+        return new, ref, extra
+
     def check_for_release(self):
-        self.load_plugin()
-        if self.new_version_available():
+        new, ref, extra = self.cached_lookup()
+        if new:
             print(f'A version change has been detected for {self.dep_name}')
             print(f'Reference: {self.ref}')
-            self.comment = self.get_extra()
             # Update reference data
-            self.ref = self.version_data()
+            self.ref = ref
             print(f'New      : {self.ref}')
             self.new_version_detected = True
-            self.comment = self.comment_base + self.comment
+            self.comment = self.comment_base + extra
             return True
         else:
             print(f'No new version detected for {self.dep_name}')
+            self.ref = ref
             self.new_version_detected = False
             return False
-
@@ -1,11 +1,23 @@
 import os
-import urllib
-from urllib import request
-import configparser
-import yaml
+import time
+import calendar
 import github3
 import json
+import requests
+from concurrent.futures import ThreadPoolExecutor
 from .release_notifier import *
+from .plugins.registry import registry
+from .httpcache import HTTPCache
+from . import discovery as discovery_backends
+from .schedule import PollSchedule
+from .ratelimit import RateLimiter
+from .session import HTTPSession
+from .state import StateStore, open_store
+from .notify import IssueQueue
+from .metrics import Metrics, timed
+from .config import ConfigCache
+from . import subscribers as subscriber_index
+from .utils import atomic_write
 
 class Scanner():
 
@@ -14,91 +26,463 @@ class Scanner():
                  refdir,
                  username=None,
                  password=None,
-                 dry_run=False):
+                 dry_run=False,
+                 workers=1,
+                 gh=None,
+                 cache=True,
+                 discovery='rest',
+                 check_workers=1,
+                 schedule=None,
+                 limiter=None,
+                 pool_size=10,
+                 timeout=30,
+                 incremental=True,
+                 store='yaml',
+                 on_existing='skip',
+                 issue_pace=1,
+                 lookup_cache=None,
+                 metrics=None,
+                 statedir=None,
+                 session=None):
         self.refs = None
         self.org = org
+        # Counters and timings of the run, exported with --metrics.
+        if metrics is None:
+            metrics = Metrics()
+        self.metrics = metrics
         self.refdir = os.path.abspath(refdir)
-        self.refs_file = os.path.join(self.refdir, 'references.yml')
+        # Directory holding the per-organization HTTP cache and scan state,
+        # by default the reference directory.
+        self.statedir = os.path.abspath(statedir or refdir)
+        os.makedirs(self.statedir, exist_ok=True)
+        # Persistent store of the reference values, given by backend name
+        # or as a StateStore object.
+        if not isinstance(store, StateStore):
+            store = open_store(store, self.refdir)
+        self.store = store
         self.read_refs()
+        # Conditional request cache for repo listings and config files.
+        self.cache = None
+        if cache:
+            self.cache = HTTPCache(os.path.join(self.statedir, 'http_cache.json'))
+        # Validated configs by content hash, so that a config file is only
+        # parsed again once it changes.
+        self.configs = ConfigCache(os.path.join(self.statedir,
+                                                'config_cache.json'),
+                                   metrics=self.metrics)
+        # Problems found in the config files by the last scan, by repository.
+        self.config_errors = {}
+        # Config files that could not be retrieved by the last scan, by
+        # repository.
+        self.fetch_errors = {}
+        # Failures of the last dependency checks, by dependency.
+        self.check_errors = {}
+        # Notices that failed to be posted by the last checks, by dependency
+        # and then by target repository.
+        self.notice_errors = {}
         self.dep_requests = {}
+        # Per-repository push time and parsed config from the last scan,
+        # used to skip fetching configs of repositories not pushed to since.
+        self.incremental = incremental
+        self.scan_state_file = os.path.join(self.statedir, 'scan_state.json')
+        # Pushes more recent than this many seconds may not be reflected
+        # yet in the config file contents served; such repositories are
+        # fetched again on the next scan.
+        self.settle_time = 300
         self.processed = []
         self.notifiers = {}
         self.cfg_file = 'harbinger.cfg'
+        self.raw_url = 'https://raw.githubusercontent.com/'
+        self.graphql_url = 'https://api.github.com/graphql'
+        # Number of config files to fetch concurrently during scan().
+        self.workers = workers
+        # Number of dependencies to check for releases concurrently.
+        self.check_workers = check_workers
+        # Decides which dependencies are due for a check on a given run.
+        if schedule is None:
+            schedule = PollSchedule()
+        self.schedule = schedule
         self.username = username
         self.password = password
         self.dry_run = dry_run
         print(f'username {username}')
-        self.gh = github3.GitHub(username, password)
+        # Shared by every request made to Github during the run.
+        if limiter is None:
+            limiter = RateLimiter()
+        if limiter.metrics is None:
+            limiter.metrics = self.metrics
+        self.limiter = limiter
+        # Pooled keep-alive connections for all HTTP traffic of the run,
+        # handed to the plugins that need to make requests of their own.
+        # May be shared with the scanners of other organizations.
+        if session is None:
+            session = HTTPSession(pool_size=pool_size,
+                                  timeout=timeout,
+                                  limiter=self.limiter,
+                                  metrics=self.metrics)
+        self.session = session
+        if gh is None:
+            gh = github3.GitHub(username, password)
+            self.session.share_with(gh.session)
+        self.gh = gh
+        # Posts release notices once all dependencies have been checked.
+        self.issues = IssueQueue(self.gh,
+                                 on_existing=on_existing,
+                                 pace=issue_pace,
+                                 dry_run=dry_run,
+                                 metrics=self.metrics)
         self.acc = self.gh.user(org)
+        # Optional LookupCache of upstream lookup results, which may be
+        # shared with harbinger instances monitoring other organizations.
+        self.lookup_cache = lookup_cache
+        # Backend used to list repositories and retrieve their configs.
+        self.discovery = discovery_backends.backends[discovery](self)
+
+    def fetch(self, url):
+        '''GET `url` and return the decoded response body.
+
+        When a cache is in use, validators saved from a previous response
+        are sent along so an unchanged resource comes back as a 304 and is
+        served from the cache. HTTP errors are raised as
+        requests.HTTPError.'''
+        headers = {}
+        if self.cache:
+            headers = self.cache.request_headers(url)
+        response = self.session.get(url, headers=headers)
+        if self.cache and response.status_code == 304:
+            self.metrics.incr('http_cache_hits')
+            return self.cache.get(url)
+        if self.cache:
+            self.metrics.incr('http_cache_misses')
+        if not response.ok:
+            if self.cache:
+                self.cache.discard(url)
+            response.raise_for_status()
+        payload = response.content.decode()
+        if self.cache:
+            self.cache.store(url, response.headers, payload)
+        return payload
 
     def getjson(self, url):
-        req = request.Request(url)
-        result = request.urlopen(req)
-        payload = result.read()
-        jdata = json.loads(payload.decode())
+        jdata = json.loads(self.fetch(url))
         return jdata
 
+    @timed('phase_seconds', phase='get_repos')
     def get_repos(self):
         repos = []
-        page = 1
-        jdata = [1]
-        while jdata != []:
-            url = f'{self.acc.repos_url}?per_page=100&page={page}'
-            jdata = self.getjson(url)
-            for repo in jdata:
-                repos.append(repo['name'])
-            page += 1
+        for page in self.discovery.pages():
+            repos.extend(page)
         self.repos = repos
+        self.metrics.incr('repos_listed', len(repos))
+        if self.cache:
+            self.cache.save()
         return repos
 
+    @property
+    def refs_file(self):
+        return self.store.path
+
+    @refs_file.setter
+    def refs_file(self, path):
+        self.store.path = path
+
+    @property
+    def dep_requests(self):
+        '''Parsed config of each repository that has one, by repository
+        name. The dependency -> subscribers index is kept in step with it.'''
+        return self._dep_requests
+
+    @dep_requests.setter
+    def dep_requests(self, dep_requests):
+        self._dep_requests = dep_requests
+        self.subscribers = subscriber_index.build_index(
+                {f'{self.org}/{repo}': repoconfig
+                 for repo, repoconfig in dep_requests.items()})
+
+    def write_subscribers(self):
+        subscriber_index.write_index(self.subscribers, self.statedir)
+
     def read_refs(self):
-        with open(self.refs_file) as f:
-            self.refs = yaml.safe_load(f)
+        self.refs = self.store.load()
+
+    def fetch_config(self, repo):
+        '''Return the raw text of the config file found at the root of
+        the 'master' branch of `repo`, or None if the repository has none.'''
+        return self.discovery.fetch_config(repo)
+
+    def retrieve_config(self, repo, previous):
+        '''Return the raw config text of `repo` and whether it could be
+        retrieved. A failure is recorded in self.fetch_errors, and the
+        config seen by the `previous` scan, if any, is used in its place.'''
+        try:
+            return self.fetch_config(repo), True
+        except requests.RequestException as e:
+            print(f'{repo}: config could not be retrieved: {e!r}')
+            self.fetch_errors[repo] = repr(e)
+            self.metrics.incr('config_fetch_errors')
+            entry = previous.get(repo) or {}
+            return entry.get('rawconfig'), False
+
+    def parse_config(self, rawconfig):
+        '''Return the RepoConfig compiled from the config file contents
+        `rawconfig`.'''
+        return self.configs.compile(rawconfig)
+
+    def resolve_config(self, rawconfig):
+        '''Return the dependencies requested by the config file contents
+        `rawconfig` (None if there is no config file) and the problems found
+        with it.'''
+        if rawconfig is None:
+            return None, []
+        compiled = self.parse_config(rawconfig)
+        # The reference values change from run to run, so dependencies are
+        # looked up in them here rather than when the config is compiled.
+        deps = {}
+        errors = list(compiled.errors)
+        for dep, params in compiled.deps.items():
+            if dep in self.refs:
+                deps[dep] = params
+            else:
+                errors.append(f'[{dep}]: no reference value for this dependency')
+        return deps, errors
+
+    def report_config_errors(self, config_errors):
+        '''Record the problems found in the config files, by repository,
+        and list them all at once.'''
+        self.config_errors = config_errors
+        total = sum(len(errors) for errors in config_errors.values())
+        if not total:
+            return
+        self.metrics.incr('config_errors', total)
+        print(f'{total} problem(s) found in {len(config_errors)} config '
+              f'file(s); the dependencies concerned are not checked:')
+        for repo, errors in config_errors.items():
+            for error in errors:
+                print(f'  {repo}: {error}')
+
+    def read_scan_state(self):
+        if not os.path.exists(self.scan_state_file):
+            return {}
+        with open(self.scan_state_file) as f:
+            return json.load(f)
+
+    def write_scan_state(self, state):
+        atomic_write(self.scan_state_file, json.dumps(state))
+
+    def settled(self, pushed_at, now):
+        '''Was the push at `pushed_at` long enough before `now` for its
+        content to be served reliably?'''
+        if not pushed_at:
+            return False
+        pushed = calendar.timegm(time.strptime(pushed_at, '%Y-%m-%dT%H:%M:%SZ'))
+        return now - pushed >= self.settle_time
+
+    def previous_scan(self):
+        '''Return the scan state saved by the previous scan, or an empty
+        one for a full scan.'''
+        return self.read_scan_state() if self.incremental else {}
+
+    def unchanged_config(self, repo, previous):
+        '''Return the state entry of `repo` from the `previous` scan state
+        if the repository has not been pushed to since, otherwise None.'''
+        entry = previous.get(repo)
+        # Entries written before the raw config was saved are refetched.
+        if (entry and entry['pushed_at'] and 'rawconfig' in entry and
+                entry['pushed_at'] == self.discovery.pushed_at.get(repo)):
+            return entry
+        return None
+
+    def state_entry(self, repo, rawconfig, now, retrieved=True):
+        # The raw config is saved rather than its compiled form, so that it
+        # is compiled again through the config cache, which follows schema
+        # changes and newly installed plugins. A config that could not be
+        # retrieved is fetched again by the next scan.
+        pushed_at = self.discovery.pushed_at.get(repo)
+        if not retrieved or not self.settled(pushed_at, now):
+            pushed_at = None
+        return {'pushed_at': pushed_at, 'rawconfig': rawconfig}
 
+    @timed('phase_seconds', phase='scan')
     def scan(self):
         print(f'Scanning {self.org}...')
+        now = time.time()
+        previous = self.previous_scan()
+        self.fetch_errors = {}
+        # Only repositories pushed to since the previous scan, and new ones,
+        # need their config fetched again.
+        unchanged = {}
         for repo in self.repos:
-            # NOTE: This raw link takes a nonzero amount of time to reflect
-            #       the file contents. Try using github3 instead to get a raw
-            #       file blob.
-            base_url = 'https://raw.githubusercontent.com/'
-            url = f'{base_url}{self.org}/{repo}/master/{self.cfg_file}'
-            req = request.Request(url)
-            try:
-                result = request.urlopen(req)
-            except urllib.error.HTTPError as e:
+            entry = self.unchanged_config(repo, previous)
+            if entry:
+                unchanged[repo] = entry
+        to_fetch = [repo for repo in self.repos if repo not in unchanged]
+        if unchanged:
+            print(f'{len(unchanged)} repositories unchanged since last scan')
+            self.metrics.incr('configs_unchanged', len(unchanged))
+        # Config fetches are independent of one another and dominated by
+        # network round trips, so run up to self.workers of them at once.
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            fetched = dict(zip(to_fetch, pool.map(
+                    lambda repo: self.retrieve_config(repo, previous),
+                    to_fetch)))
+        # Results are consumed in repo order, making the outcome identical
+        # to a sequential scan.
+        dep_requests = {}
+        config_errors = {}
+        state = {}
+        for repo in self.repos:
+            retrieved = True
+            if repo in unchanged:
+                rawconfig = unchanged[repo]['rawconfig']
+            else:
+                rawconfig, retrieved = fetched[repo]
+            repoconfig, errors = self.resolve_config(rawconfig)
+            state[repo] = self.state_entry(repo, rawconfig, now, retrieved)
+            if errors:
+                config_errors[repo] = errors
+            if repoconfig is None:
                 continue
             print(f'{repo}: Found config')
-            rawconfig = str(result.read().decode())
-            config = configparser.ConfigParser()
-            config.read_string(rawconfig)
-            sections = config.sections()
-            repoconfig = {}
-            for section in sections:
-                repoconfig[section] = dict(config[section])
-            self.dep_requests[repo] = repoconfig
+            self.metrics.incr('configs_found')
+            dep_requests[repo] = repoconfig
+        # Replaced as a whole, so repeated scans drop configs that have been
+        # removed and a failed scan leaves the previous results in place.
+        self.dep_requests = dep_requests
+        self.report_config_errors(config_errors)
+        self.write_subscribers()
+        if self.incremental:
+            self.write_scan_state(state)
+        self.configs.save()
+        if self.cache:
+            self.cache.save()
+
+    def new_notifier(self, target, dep, params, now):
+        '''Return a ReleaseNotifier for the dependency `dep` as requested,
+        with `params`, by the repository `target` ('owner/repo'), or None if
+        the dependency is not due for a check or has no reference value.'''
+        ref = self.refs.get(dep)
+        if ref is None:
+            print(f'{dep}: no reference value, not checked')
+            self.check_errors[dep] = 'no reference value for this dependency'
+            return None
+        if not self.schedule.is_due(ref, now):
+            print(f'{dep}: not due for a check yet')
+            self.metrics.incr('checks_not_due')
+            return None
+        return ReleaseNotifier(dep,
+                               params,
+                               ref,
+                               target,
+                               self.gh,
+                               dry_run=self.dry_run,
+                               session=self.session,
+                               lookup_cache=self.lookup_cache,
+                               metrics=self.metrics)
 
+    def record_check(self, noti, now):
+        '''Update and persist the reference of a checked dependency.'''
+        self.metrics.incr('checks')
+        if noti.new_version_detected:
+            self.metrics.incr('releases_detected')
+        self.refs[noti.dep_name] = self.schedule.update(
+                self.refs[noti.dep_name],
+                noti.ref,
+                noti.new_version_detected,
+                now)
+        self.store.update(noti.dep_name, self.refs[noti.dep_name])
+
+    @timed('phase_seconds', phase='check_for_releases')
     def check_for_releases(self):
-        self.repos = self.get_repos()
-        for repo in self.dep_requests:
-            print(f'\nProcessing deps defined in {repo}')
-            for dep in self.dep_requests[repo]:
-                print(f'   {dep}')
-                if dep not in self.notifiers:
-                    ref = self.refs[dep]
-                    noti = ReleaseNotifier(dep,
-                                           self.dep_requests[repo][dep],
-                                           ref,
-                                           f'{self.org}/{repo}',
-                                           self.gh,
-                                           dry_run=self.dry_run)
-                    noti.check_for_release()
-                    self.notifiers[dep] = noti
-                    if noti.new_version_detected:
-                        self.refs[dep] = noti.ref
-                if self.notifiers[dep].new_version_detected:
-                    self.notifiers[dep].post_github_issue(f'{self.org}/{repo}')
-                
+        self.check_subscribers(self.subscribers)
+
+    def check_subscribers(self, subscribers):
+        '''Check each dependency of the `subscribers` index once and post
+        a release notice to every repository subscribed to it.'''
+        self.notifiers = {}
+        self.check_errors = {}
+        self.issues.reset()
+        now = self.schedule.clock()
+        # One notifier per dependency that is due for a check, created with
+        # the parameters of its first subscriber.
+        pending = []
+        for dep, subs in subscribers.items():
+            noti = self.new_notifier(subs[0]['repo'], dep,
+                                     subs[0]['params'], now)
+            if noti is not None:
+                self.notifiers[dep] = noti
+                pending.append(noti)
+        self.prefetch(pending)
+        # Upstream queries for different dependencies are independent and
+        # bound by network I/O, so run up to self.check_workers at once.
+        try:
+            with ThreadPoolExecutor(max_workers=self.check_workers) as pool:
+                futures = [pool.submit(noti.check_for_release)
+                           for noti in pending]
+        finally:
+            # Responses no check took are not kept for the next run.
+            self.session.prefetched.clear()
+        # A failed check does not hold back the others. The dependency is
+        # left as it was, so the next run checks it again.
+        checked = []
+        for noti, future in zip(pending, futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f'{noti.dep_name}: check failed: {e!r}')
+                self.check_errors[noti.dep_name] = repr(e)
+                continue
+            checked.append(noti)
+        pending = checked
+        # Reference updates and issue postings happen afterwards, in order.
+        detected = []
+        for noti in pending:
+            if not noti.new_version_detected:
+                self.record_check(noti, now)
+                continue
+            detected.append(noti)
+            for sub in subscribers[noti.dep_name]:
+                print(f'{noti.dep_name}: notifying {sub["repo"]}')
+                self.issues.add(sub['repo'],
+                                noti.issue_title,
+                                noti.comment,
+                                noti.ref.get('version'),
+                                dep=noti.dep_name)
+        self.issues.flush()
+        self.record_detected(detected, now)
+
+    def record_detected(self, detected, now):
+        '''Record the new versions found by the `detected` notifiers.
+
+        A new version only becomes the reference once all of its notices
+        have been posted, so that the next run sends those that failed.
+        Notices that were posted are skipped by then, as already open.'''
+        self.notice_errors = dict(self.issues.errors)
+        for noti in detected:
+            if self.issues.failed(noti.dep_name):
+                continue
+            self.record_check(noti, now)
+
+    def prefetch(self, pending):
+        '''Hand each plugin the lookups it is about to make for the
+        `pending` notifiers, so that it may batch them. Lookups answered by
+        the lookup cache are left out.'''
+        self.session.prefetched.clear()
+        lookups = {}
+        for noti in pending:
+            if (noti.lookup_cache is not None and
+                    noti.lookup_cache.fresh(noti.lookup_key())):
+                continue
+            try:
+                plugin_class = registry.get(noti.dep_name, noti.params)
+            except ImportError:
+                continue  # Reported by the check itself.
+            if getattr(plugin_class, 'prefetch', None) is None:
+                continue
+            lookups.setdefault(plugin_class, []).append(
+                    (dict(noti.params, name=noti.dep_name), noti.ref))
+        for plugin_class, batch in lookups.items():
+            plugin_class.prefetch(batch, session=self.session)
+
+    @timed('phase_seconds', phase='write_refs')
     def write_refs(self):
-        with open(self.refs_file, 'w') as f:
-            f.write(yaml.safe_dump(self.refs))
+        self.store.save(self.refs)
@@ -0,0 +1,81 @@
+# Per-dependency polling schedule.
+#
+# Upstream projects release at very different rates. Rather than querying
+# every dependency on every run, each reference records when the dependency
+# was last checked and when a new release was last seen. A dependency is
+# only checked again once its interval has elapsed, and that interval
+# follows the observed release cadence: a quarter of the time between the
+# last two releases, growing to a quarter of the time since the last one
+# while no new release appears, kept within [min_interval, max_interval].
+import time
+
+
+class PollSchedule():
+    '''PollSchedule class
+
+    Parameters
+    ----------
+    min_interval: Shortest time, in seconds, between two checks of a
+                  dependency.
+    max_interval: Longest time, in seconds, between two checks of a
+                  dependency.
+    cadence_fraction: Fraction of the observed time between releases to
+                      use as the interval.
+    clock: Function returning the current time in seconds since the epoch.
+
+    The schedule is kept in the 'last_checked', 'last_changed' and
+    'interval' entries of each reference dict, all in seconds.
+    With the default bounds of zero every dependency is due on every run.
+    '''
+
+    # Reference dict entries owned by the schedule.
+    fields = ('last_checked', 'last_changed', 'interval')
+
+    def __init__(self,
+                 min_interval=0,
+                 max_interval=0,
+                 cadence_fraction=0.25,
+                 clock=time.time):
+        if max_interval < min_interval:
+            raise ValueError('max_interval must not be less than min_interval.')
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.cadence_fraction = cadence_fraction
+        self.clock = clock
+
+    def clamp(self, interval):
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def is_due(self, ref, now=None):
+        '''Is the dependency with reference dict `ref` due for a check?'''
+        if now is None:
+            now = self.clock()
+        last_checked = ref.get('last_checked')
+        if last_checked is None:
+            return True
+        interval = self.clamp(ref.get('interval', self.min_interval))
+        return now >= last_checked + interval
+
+    def update(self, previous, current, changed, now=None):
+        '''Carry the schedule values of the reference dict `previous` over
+        to `current`, the reference resulting from a check, and update them
+        to reflect that check. Returns `current`.'''
+        if now is None:
+            now = self.clock()
+        last_changed = previous.get('last_changed')
+        interval = previous.get('interval', self.min_interval)
+        if last_changed is None:
+            # First check: take the current version to have appeared now.
+            current['last_changed'] = int(now)
+        elif changed:
+            # Time between the last two releases.
+            interval = self.cadence_fraction * (now - last_changed)
+            current['last_changed'] = int(now)
+        else:
+            # The longer no release appears, the slower the cadence.
+            interval = max(interval,
+                           self.cadence_fraction * (now - last_changed))
+            current['last_changed'] = last_changed
+        current['interval'] = int(self.clamp(interval))
+        current['last_checked'] = int(now)
+        return current
@@ -0,0 +1,77 @@
+# Pooled HTTP session shared by the scanner and the plugins.
+#
+# Opening a new connection for every request means a TCP and TLS handshake
+# per repository during a scan. All HTTP traffic of a run instead goes
+# through one HTTPSession whose connection pools keep connections alive and
+# reuse them. The same transport adapters are mounted on the github3.py
+# session, so API calls made through github3.py share the pools as well.
+# Only requests to the Github API go through the rate limiter, as the
+# quota it follows does not apply to other hosts.
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .ratelimit import RateLimitedAdapter
+
+
+class HTTPSession(requests.Session):
+    '''HTTPSession class
+
+    Parameters
+    ----------
+    pool_size: Number of connections kept open per host. Should be at least
+               the number of worker threads issuing requests.
+    timeout: Seconds to wait for a server to accept a connection or send
+             data before giving up, unless a request specifies otherwise.
+    limiter: Optional RateLimiter through which requests to the Github API
+             are made.
+    metrics: Optional Metrics object in which to count and time the
+             requests made.
+    api_url: Base URL of the Github API.
+             Default value: 'https://api.github.com/'
+    '''
+
+    def __init__(self, pool_size=10, timeout=30, limiter=None, metrics=None,
+                 api_url='https://api.github.com/'):
+        super().__init__()
+        self.timeout = timeout
+        self.metrics = metrics
+        self.api_url = api_url
+        # Responses fetched ahead of the checks of a run by the prefetch()
+        # of plugins, until the plugin objects take them. Emptied by the
+        # scanner before and after each check run.
+        self.prefetched = {}
+        self.adapter = HTTPAdapter(pool_connections=pool_size,
+                                   pool_maxsize=pool_size)
+        if limiter is None:
+            self.api_adapter = self.adapter
+        else:
+            self.api_adapter = RateLimitedAdapter(limiter,
+                                                  pool_connections=pool_size,
+                                                  pool_maxsize=pool_size)
+        self.share_with(self)
+
+    def share_with(self, session):
+        '''Make `session` use this session's connection pools, and record
+        its requests in the same metrics.'''
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+        # The longest matching prefix wins.
+        session.mount(self.api_url, self.api_adapter)
+        if self.metrics is not None:
+            session.hooks['response'].append(self.record)
+
+    def record(self, response, *args, **kwargs):
+        '''Response hook counting and timing each request by host.'''
+        host = urlsplit(response.url).hostname
+        self.metrics.incr('http_requests', host=host,
+                          status=response.status_code)
+        if response.status_code == 404:
+            self.metrics.incr('http_not_found', host=host)
+        self.metrics.observe('http_request_seconds',
+                             response.elapsed.total_seconds(), host=host)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
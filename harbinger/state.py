@@ -0,0 +1,165 @@
+# Persistent storage of the reference values of the monitored dependencies.
+#
+# The reference values are held by a state store. YAMLStore keeps the
+# original single references.yml file, now replaced atomically when written.
+# SQLiteStore keeps one row per dependency, commits each dependency as soon
+# as it has been processed, and records every version seen in a history
+# table. Both stores can be converted into one another through YAML
+# import/export.
+import os
+import json
+import time
+import sqlite3
+from abc import ABC, abstractmethod
+
+import yaml
+
+from .utils import atomic_write
+
+
+class StateStore(ABC):
+    '''StateStore class
+
+    Parameters
+    ----------
+    path: File holding the stored state.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+
+    @abstractmethod
+    def load(self):
+        '''Return the reference dicts of all dependencies, by name.'''
+
+    @abstractmethod
+    def update(self, dep, ref):
+        '''Persist the reference dict `ref` of the single dependency `dep`.'''
+
+    @abstractmethod
+    def save(self, refs):
+        '''Persist the reference dicts of all dependencies in `refs`.'''
+
+    def history(self, dep):
+        '''Return the (time, version) pairs recorded for `dep`, oldest
+        first. Stores that keep no history return an empty list.'''
+        return []
+
+
+def dump_yaml(refs, path):
+    atomic_write(path, yaml.safe_dump(refs))
+
+
+class YAMLStore(StateStore):
+    '''All reference values in a single YAML file, rewritten as a whole by
+    save(). update() defers to the next save().'''
+
+    def load(self):
+        with open(self.path) as f:
+            return yaml.safe_load(f)
+
+    def update(self, dep, ref):
+        pass
+
+    def save(self, refs):
+        dump_yaml(refs, self.path)
+
+
+class SQLiteStore(StateStore):
+    '''Reference values in an SQLite database, one row per dependency.'''
+
+    schema = '''
+CREATE TABLE IF NOT EXISTS refs (
+    dep TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    dep TEXT NOT NULL,
+    version TEXT,
+    data TEXT NOT NULL,
+    recorded REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_dep ON history (dep, recorded);
+'''
+
+    def connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.executescript(self.schema)
+        return conn
+
+    def load(self):
+        conn = self.connect()
+        try:
+            rows = conn.execute('SELECT dep, data FROM refs ORDER BY dep')
+            return {dep: json.loads(data) for dep, data in rows}
+        finally:
+            conn.close()
+
+    def upsert(self, conn, dep, ref, now):
+        row = conn.execute('SELECT data FROM refs WHERE dep = ?',
+                           (dep,)).fetchone()
+        data = json.dumps(ref, sort_keys=True)
+        version = ref.get('version')
+        if row is None or json.loads(row[0]).get('version') != version:
+            conn.execute('INSERT INTO history VALUES (?, ?, ?, ?)',
+                         (dep, None if version is None else str(version),
+                          data, now))
+        conn.execute('INSERT OR REPLACE INTO refs VALUES (?, ?, ?)',
+                     (dep, data, now))
+
+    def update(self, dep, ref):
+        conn = self.connect()
+        try:
+            with conn:
+                self.upsert(conn, dep, ref, time.time())
+        finally:
+            conn.close()
+
+    def save(self, refs):
+        now = time.time()
+        conn = self.connect()
+        try:
+            with conn:
+                for dep, ref in refs.items():
+                    self.upsert(conn, dep, ref, now)
+        finally:
+            conn.close()
+
+    def history(self, dep):
+        conn = self.connect()
+        try:
+            rows = conn.execute('SELECT recorded, version FROM history '
+                                'WHERE dep = ? ORDER BY recorded, rowid',
+                                (dep,))
+            return [(recorded, version) for recorded, version in rows]
+        finally:
+            conn.close()
+
+    def import_yaml(self, path):
+        '''Add the reference values held in the YAML file `path`.'''
+        with open(path) as f:
+            self.save(yaml.safe_load(f) or {})
+
+    def export_yaml(self, path):
+        '''Write all reference values to the YAML file `path`, in the
+        format used by YAMLStore.'''
+        dump_yaml(self.load(), path)
+
+
+backends = {
+    'yaml': (YAMLStore, 'references.yml'),
+    'sqlite': (SQLiteStore, 'references.db'),
+}
+
+
+def open_store(backend, refdir):
+    '''Return the store of type `backend` kept in the directory `refdir`.
+    A new SQLite store is seeded from an existing references.yml.'''
+    store_class, filename = backends[backend]
+    store = store_class(os.path.join(refdir, filename))
+    yaml_file = os.path.join(refdir, backends['yaml'][1])
+    if (store_class is SQLiteStore and not os.path.exists(store.path)
+            and os.path.exists(yaml_file)):
+        store.import_yaml(yaml_file)
+    return store
@@ -0,0 +1,55 @@
+# Dependency -> subscribers index.
+#
+# The configs found by a scan map each repository to the dependencies it
+# requests. The check phase needs the inverse: for each unique dependency,
+# the repositories that request it and the parameters each one gives. The
+# index is built once per scan and saved next to the scan state, so that it
+# can also be queried (`harbinger subscribers DEP`) without a rescan.
+import os
+import json
+
+from .utils import atomic_write
+
+filename = 'subscribers.json'
+
+
+def build_index(requests):
+    '''Invert `requests`, a dict mapping repositories ('owner/repo') to
+    their parsed config, into a dict mapping each dependency to the list of
+    {'repo': ..., 'params': ...} dicts of the repositories requesting it.
+    Dependencies and repositories keep the order in which they appear.'''
+    index = {}
+    for repo, repoconfig in requests.items():
+        for dep, params in repoconfig.items():
+            index.setdefault(dep, []).append({'repo': repo, 'params': params})
+    return index
+
+
+def write_index(index, statedir):
+    atomic_write(os.path.join(statedir, filename), json.dumps(index))
+
+
+def read_index(statedir):
+    '''Return the index saved in `statedir` by the last scan, or an empty
+    one.'''
+    path = os.path.join(statedir, filename)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_all(refdir):
+    '''Return the merged indexes saved in `refdir` and in its immediate
+    subdirectories, where the state of each organization of a
+    multi-organization run is kept.'''
+    statedirs = [refdir] + sorted(
+            os.path.join(refdir, name) for name in os.listdir(refdir)
+            if os.path.isdir(os.path.join(refdir, name)))
+    merged = {}
+    for statedir in statedirs:
+        for dep, subscribers in read_index(statedir).items():
+            known = set(s['repo'] for s in merged.get(dep, []))
+            merged.setdefault(dep, []).extend(
+                    s for s in subscribers if s['repo'] not in known)
+    return merged
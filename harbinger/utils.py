@@ -1,4 +1,7 @@
 import os
+import re
+import stat
+import tempfile
 from contextlib import contextmanager
 
 @contextmanager
@@ -14,3 +17,53 @@ def pushd(newDir):
     os.chdir(newDir)
     yield
     os.chdir(previousDir)
+
+
+def atomic_write(path, text):
+    '''Replace the contents of the file `path` with `text`.
+
+    The text is written to a temporary file in the same directory, which is
+    then moved into place, so that readers and interrupted runs never see a
+    partially written file. The file keeps its permissions; a new one is
+    made readable by all, where mkstemp() would only let its owner read it,
+    as metrics files are read by collectors running as other users.'''
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o644
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmpfile = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.chmod(tmpfile, mode)
+        os.replace(tmpfile, path)
+    except BaseException:
+        os.unlink(tmpfile)
+        raise
+
+
+# Order of the pre-release markers; unknown markers rank with alphas.
+pre_release_ranks = {'dev': 0, 'a': 1, 'alpha': 1, 'b': 2, 'beta': 2,
+                     'c': 3, 'pre': 3, 'rc': 3}
+
+
+def version_key(version):
+    '''Comparable key of a version string. The first run of dot-separated
+    numbers is the release; anything after it marks a pre-release (e.g.
+    'rc1', 'b2', '.dev3'), which sorts before the release, unless it is a
+    post-release ('post1'), which sorts after.'''
+    match = re.search(r'\d+(?:\.\d+)*', version)
+    if match is None:
+        return ((), 0, 0, ())
+    release = [int(n) for n in match.group().split('.')]
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+    suffix = version[match.end():].lower()
+    numbers = tuple(int(n) for n in re.findall(r'\d+', suffix))
+    markers = re.findall('[a-z]+', suffix)
+    if not markers:
+        return (tuple(release), 1, 0, ())
+    if 'post' in markers:
+        return (tuple(release), 2, 0, numbers)
+    return (tuple(release), 0, pre_release_ranks.get(markers[0], 1), numbers)
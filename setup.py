@@ -11,7 +11,8 @@ setup(
     },
     install_requires=[
         'pyyaml',
-        'github3.py'
+        'github3.py',
+        'requests',
     ],
     extras_require={
         'test': [
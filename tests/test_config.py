@@ -0,0 +1,139 @@
+import os
+import yaml
+from harbinger.config import ConfigCache, RepoConfig, compile_config
+from harbinger.scanner import Scanner
+from harbinger.mock_github3 import mock_gh
+from harbinger.mock_http import mock_http_server
+
+valid = '[cfitsio]\n\n[someorg/somedep]\nrelease_style: github\n'
+invalid = ('[cfitsio]\n\n'
+           '[cfitso]\n\n'
+           '[someorg/somedep]\nrelease_style: githbu\n\n'
+           '[someorg/otherdep]\nrelease_style: tag-only\ntag_regex: ^(v\n')
+
+
+def test_compile_valid():
+    repoconfig, cacheable = compile_config(valid)
+    assert repoconfig.valid
+    assert cacheable
+    assert repoconfig.deps == {'cfitsio': {},
+                               'someorg/somedep': {'release_style': 'github'}}
+
+
+def test_compile_invalid():
+    repoconfig, cacheable = compile_config(invalid)
+    # All problems are reported; only the valid dependency is kept.
+    assert list(repoconfig.deps) == ['cfitsio']
+    assert len(repoconfig.errors) == 3
+    assert repoconfig.errors[0].startswith('[cfitso]: no plugin available')
+    assert "unknown release_style 'githbu'" in repoconfig.errors[1]
+    assert repoconfig.errors[2].startswith('[someorg/otherdep]: invalid tag_regex')
+    # The missing plugin may be installed later on.
+    assert not cacheable
+
+
+def test_compile_plugin_type():
+    repoconfig, cacheable = compile_config(
+            '[libfoo]\ntype: httpindex\nurl: https://example.org/libfoo/\n'
+            'filename_regex: ^libfoo-(.*)\\.tar\\.gz$\n\n'
+            '[libbar]\ntype: httpindex\nurl: https://example.org/libbar/\n')
+    assert list(repoconfig.deps) == ['libfoo']
+    assert repoconfig.errors == ['[libbar]: filename_regex is required']
+
+
+def test_compile_unreadable():
+    repoconfig, cacheable = compile_config('release_style: github\n')
+    assert repoconfig.deps == {}
+    assert repoconfig.errors[0].startswith('unreadable config:')
+    assert cacheable
+
+
+def test_repoconfig_copies():
+    repoconfig = RepoConfig({'cfitsio': {'url': 'x'}})
+    data = repoconfig.to_dict()
+    RepoConfig.from_dict(data).deps['cfitsio']['name'] = 'changed'
+    assert data['deps'] == {'cfitsio': {'url': 'x'}}
+
+
+def test_config_cache(tmp_path):
+    path = os.path.join(tmp_path, 'config_cache.json')
+    cache = ConfigCache(path)
+    first = cache.compile(valid)
+    assert cache.compile(valid).deps == first.deps
+    assert (cache.hits, cache.misses) == (1, 1)
+    # Configs with an unavailable plugin are compiled again every time.
+    cache.compile(invalid)
+    cache.compile(invalid)
+    assert cache.misses == 3
+    cache.save()
+    reloaded = ConfigCache(path)
+    assert len(reloaded) == 1
+    assert reloaded.compile(valid).deps == first.deps
+    assert reloaded.hits == 1
+
+
+def test_config_cache_expiry(tmp_path):
+    now = [1000.0]
+    path = os.path.join(tmp_path, 'config_cache.json')
+    cache = ConfigCache(path, max_age=100, clock=lambda: now[0])
+    cache.compile(valid)
+    now[0] += 101
+    cache.save()
+    assert len(ConfigCache(path)) == 0
+
+
+def test_scan_reports_invalid_configs(tmp_path, capsys):
+    configs = {'repo0': valid, 'repo1': invalid, 'repo2': '[cfitsio\n'}
+    routes = {f'/testorg/{repo}/master/harbinger.cfg': cfg
+              for repo, cfg in configs.items()}
+    with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+        f.write(yaml.safe_dump({'cfitsio': {'version': '3.49'},
+                                'someorg/somedep': {'version': '1.0'}}))
+    with mock_http_server(routes) as server:
+        scanner = Scanner('testorg', tmp_path, gh=mock_gh('tagname'),
+                          issue_pace=0)
+        scanner.raw_url = f'{server.url}/'
+        scanner.repos = list(configs)
+        scanner.scan()
+    assert scanner.dep_requests == {
+        'repo0': {'cfitsio': {}, 'someorg/somedep': {'release_style': 'github'}},
+        'repo1': {'cfitsio': {}},
+        'repo2': {}}
+    assert list(scanner.config_errors) == ['repo1', 'repo2']
+    assert len(scanner.config_errors['repo1']) == 3
+    assert scanner.metrics.counter('config_errors') == 4
+    out = capsys.readouterr().out
+    assert '4 problem(s) found in 2 config file(s)' in out
+    assert 'repo2: unreadable config' in out
+    assert list(scanner.subscribers) == ['cfitsio', 'someorg/somedep']
+    assert os.path.exists(os.path.join(tmp_path, 'config_cache.json'))
+
+
+def test_unchanged_configs_recompiled(tmp_path, monkeypatch):
+    configs = {'repo0': valid, 'repo1': invalid}
+    routes = {f'/testorg/{repo}/master/harbinger.cfg': cfg
+              for repo, cfg in configs.items()}
+    with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+        f.write(yaml.safe_dump({'cfitsio': {'version': '3.49'}}))
+    with mock_http_server(routes) as server:
+        scanners = []
+        for i in range(3):
+            if i == 2:
+                # Older cache entries are not used once the schema changes.
+                monkeypatch.setattr('harbinger.config.schema_version', 2)
+            scanner = Scanner('testorg', tmp_path, gh=mock_gh('tagname'),
+                              issue_pace=0)
+            scanner.raw_url = f'{server.url}/'
+            scanner.repos = list(configs)
+            scanner.discovery.pushed_at = {repo: '2020-01-01T00:00:00Z'
+                                           for repo in configs}
+            scanner.scan()
+            scanners.append(scanner)
+        # Configs are only fetched once, but always resolved through the
+        # config cache.
+        assert server.count('GET') == 2
+    assert [s.configs.hits for s in scanners] == [0, 1, 0]
+    assert [s.configs.misses for s in scanners] == [2, 1, 2]
+    for scanner in scanners:
+        assert scanner.dep_requests == scanners[0].dep_requests
+        assert len(scanner.config_errors['repo1']) == 3
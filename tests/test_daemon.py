@@ -0,0 +1,72 @@
+from harbinger.daemon import Daemon
+
+
+class mock_scanner():
+    def __init__(self, fail_check=False):
+        self.calls = []
+        self.fail_check = fail_check
+
+    def get_repos(self):
+        self.calls.append('get_repos')
+
+    def scan(self):
+        self.calls.append('scan')
+
+    def check_for_releases(self):
+        self.calls.append('check_for_releases')
+        if self.fail_check:
+            raise RuntimeError('network down')
+
+    def write_refs(self):
+        self.calls.append('write_refs')
+
+
+class mock_clock():
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def make_daemon(scanner, clock):
+    return Daemon(scanner,
+                  scan_interval=100,
+                  check_interval=30,
+                  jitter=0,
+                  clock=clock,
+                  sleep=clock.sleep)
+
+
+def test_schedule():
+    scanner = mock_scanner()
+    clock = mock_clock()
+    daemon = make_daemon(scanner, clock)
+    daemon.run(cycles=5)
+    # t=0 scan+check, t=30, 60, 90 check, t=100 scan+check
+    assert scanner.calls.count('scan') == 2
+    assert scanner.calls.count('check_for_releases') == 5
+    assert scanner.calls.count('write_refs') == 5
+    assert scanner.calls[:4] == ['get_repos', 'scan',
+                                 'check_for_releases', 'write_refs']
+    assert clock.now == 100
+
+
+def test_jitter():
+    daemon = Daemon(mock_scanner(), jitter=0.2)
+    for i in range(50):
+        assert 80 <= daemon.jittered(100) <= 120
+
+
+def test_failed_cycle_continues(capsys):
+    scanner = mock_scanner(fail_check=True)
+    clock = mock_clock()
+    daemon = make_daemon(scanner, clock)
+    daemon.run(cycles=2)
+    assert scanner.calls.count('check_for_releases') == 2
+    # The references updated before the failure are still written.
+    assert scanner.calls.count('write_refs') == 2
+    assert 'network down' in capsys.readouterr().err
@@ -1,11 +1,17 @@
 import os
 import shutil
 import ast
+import time
+import json
 import yaml
 import pytest
 from harbinger.release_notifier import ReleaseNotifier
 from harbinger.scanner import Scanner
+from harbinger.schedule import PollSchedule
+from harbinger.state import SQLiteStore
 from harbinger.mock_github3 import *
+from harbinger.mock_http import mock_http_server
+from harbinger.notify import version_marker
 
 depname = 'test'
 params = {'plugin': 'relcheck_test'}
@@ -87,3 +93,407 @@ def test_get_extra(notifier):
 
 
 #def test_harbinger_cli():
+
+
+# Scanner tests against a local HTTP stand-in for Github.
+scan_repos = [f'repo{i}' for i in range(20)]
+scan_configs = {
+    'repo3': '[cfitsio]\n',
+    'repo7': '[cfitsio]\n\n[someorg/somedep]\nrelease_style: github\n',
+    'repo15': '[someorg/somedep]\nrelease_style: github\n',
+}
+scan_reference = dict(reference, **{'cfitsio': {'version': '3.49'},
+                                    'someorg/somedep': {'version': '1.0'}})
+
+
+@pytest.fixture
+def scan_server():
+    routes = {}
+    for repo, cfg in scan_configs.items():
+        routes[f'/testorg/{repo}/master/harbinger.cfg'] = cfg
+    with mock_http_server(routes, delay=0.05) as server:
+        yield server
+
+
+def make_scanner(tmp_path, server, **kwargs):
+    with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+        f.write(yaml.safe_dump(scan_reference))
+    kwargs.setdefault('gh', mock_gh('tagname'))
+    kwargs.setdefault('issue_pace', 0)
+    scanner = Scanner('testorg', tmp_path, **kwargs)
+    scanner.raw_url = f'{server.url}/'
+    scanner.repos = scan_repos
+    return scanner
+
+
+def test_scan_sequential(tmp_path, scan_server):
+    scanner = make_scanner(tmp_path, scan_server)
+    scanner.scan()
+    assert list(scanner.dep_requests) == ['repo3', 'repo7', 'repo15']
+    assert scanner.dep_requests['repo7'] == {
+        'cfitsio': {},
+        'someorg/somedep': {'release_style': 'github'}}
+    assert scan_server.count('GET') == len(scan_repos)
+
+
+def test_scan_concurrent_matches_sequential(tmp_path, scan_server):
+    sequential = make_scanner(tmp_path, scan_server)
+    sequential.scan()
+    concurrent = make_scanner(tmp_path, scan_server, workers=8)
+    concurrent.scan()
+    assert concurrent.dep_requests == sequential.dep_requests
+    assert list(concurrent.dep_requests) == list(sequential.dep_requests)
+
+
+def etag_route(body, etag):
+    def route(method, path, headers, reqbody):
+        if headers.get('If-None-Match') == etag:
+            return (304, {'ETag': etag}, b'')
+        return (200, {'ETag': etag}, body)
+    return route
+
+
+def test_scan_conditional_requests(tmp_path):
+    routes = {}
+    for repo, cfg in scan_configs.items():
+        routes[f'/testorg/{repo}/master/harbinger.cfg'] = etag_route(
+                cfg, f'"{repo}"')
+    with mock_http_server(routes) as server:
+        first = make_scanner(tmp_path, server)
+        first.scan()
+        assert os.path.exists(os.path.join(tmp_path, 'http_cache.json'))
+        second = make_scanner(tmp_path, server)
+        second.scan()
+        assert second.dep_requests == first.dep_requests
+        revalidated = [r for r in server.requests
+                       if r[2].get('If-None-Match')]
+        assert len(revalidated) == len(scan_configs)
+
+
+def test_scan_no_cache(tmp_path, scan_server):
+    scanner = make_scanner(tmp_path, scan_server, cache=False)
+    scanner.scan()
+    assert len(scanner.dep_requests) == len(scan_configs)
+    assert not os.path.exists(os.path.join(tmp_path, 'http_cache.json'))
+
+
+def test_get_repos_conditional_requests(tmp_path):
+    pages = {1: json.dumps([{'name': 'repo0'}, {'name': 'repo1'}]),
+             2: json.dumps([{'name': 'repo2'}]),
+             3: json.dumps([])}
+    def route(method, path, headers, body):
+        page = int(path.split('page=')[-1])
+        return etag_route(pages[page], f'"page{page}"')(method, path,
+                                                         headers, body)
+    with mock_http_server({'/users/testorg/repos': route}) as server:
+        repos_url = f'{server.url}/users/testorg/repos'
+        for i in range(2):
+            with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+                f.write(yaml.safe_dump(reference))
+            scanner = Scanner('testorg', tmp_path,
+                              gh=mock_gh('tagname', repos_url=repos_url))
+            assert scanner.get_repos() == ['repo0', 'repo1', 'repo2']
+        assert server.count('GET') == 6
+        assert len([r for r in server.requests
+                    if r[2].get('If-None-Match')]) == 3
+
+
+def graphql_route(repos, configs, page_size=100):
+    def route(method, path, headers, body):
+        variables = json.loads(body)['variables']
+        assert variables['expression'] == 'master:harbinger.cfg'
+        start = int(variables['cursor'] or 0)
+        nodes = []
+        for repo in repos[start:start + page_size]:
+            blob = None
+            if repo in configs:
+                blob = {'text': configs[repo]}
+            nodes.append({'name': repo, 'object': blob})
+        end = start + page_size
+        page_info = {'hasNextPage': end < len(repos), 'endCursor': str(end)}
+        data = {'repositoryOwner': {'repositories': {'pageInfo': page_info,
+                                                     'nodes': nodes}}}
+        return json.dumps({'data': data})
+    return route
+
+
+def test_scan_graphql_discovery(tmp_path, scan_server):
+    rest = make_scanner(tmp_path, scan_server)
+    rest.scan()
+    route = graphql_route(scan_repos, scan_configs, page_size=8)
+    with mock_http_server({'/graphql': route}) as server:
+        with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+            f.write(yaml.safe_dump(scan_reference))
+        scanner = Scanner('testorg', tmp_path, password='token',
+                          gh=mock_gh('tagname'), discovery='graphql')
+        scanner.graphql_url = f'{server.url}/graphql'
+        assert scanner.get_repos() == scan_repos
+        scanner.scan()
+        assert scanner.dep_requests == rest.dep_requests
+        assert server.count('POST', '/graphql') == 3
+        assert server.requests[0][2]['Authorization'] == 'bearer token'
+
+
+def test_check_for_releases_ordered(tmp_path, scan_server, monkeypatch):
+    gh = mock_gh('tagname')
+    monkeypatch.setattr(ReleaseNotifier, 'github', None)
+    scanner = make_scanner(tmp_path, scan_server, check_workers=4, gh=gh)
+    scanner.dep_requests = {'repo1': {'test': {}},
+                            'repo2': {'test': {}},
+                            'repo3': {'test': {}}}
+    scanner.check_for_releases()
+    assert list(scanner.notifiers) == ['test']
+    assert scanner.refs['test']['version'] == '0.0.0'
+    assert [issue[0] for issue in gh.issues] == ['testorg/repo1',
+                                                 'testorg/repo2',
+                                                 'testorg/repo3']
+
+
+def test_check_for_releases_concurrent(tmp_path, scan_server, monkeypatch):
+    running = []
+    peak = []
+    def check_for_release(self):
+        running.append(self.dep_name)
+        peak.append(len(running))
+        time.sleep(0.1)
+        running.remove(self.dep_name)
+        self.new_version_detected = False
+        return False
+    monkeypatch.setattr(ReleaseNotifier, 'check_for_release',
+                        check_for_release)
+    scanner = make_scanner(tmp_path, scan_server, check_workers=3)
+    deps = [f'dep{i}' for i in range(6)]
+    scanner.refs = {dep: {'version': '1.0'} for dep in deps}
+    scanner.dep_requests = {'repo1': {dep: {} for dep in deps[:4]},
+                            'repo2': {dep: {} for dep in deps[2:]}}
+    scanner.check_for_releases()
+    assert list(scanner.notifiers) == deps
+    assert max(peak) == 3
+
+
+def test_check_for_releases_schedule(tmp_path, scan_server, monkeypatch):
+    checked = []
+    def check_for_release(self):
+        checked.append(self.dep_name)
+        self.new_version_detected = False
+        return False
+    monkeypatch.setattr(ReleaseNotifier, 'check_for_release',
+                        check_for_release)
+    clock = [1000000]
+    schedule = PollSchedule(min_interval=60, max_interval=3600,
+                            clock=lambda: clock[0])
+    scanner = make_scanner(tmp_path, scan_server, schedule=schedule)
+    scanner.refs = {'dep1': {'version': '1.0'},
+                    'dep2': {'version': '1.0', 'last_checked': clock[0] - 30,
+                             'last_changed': clock[0] - 30, 'interval': 60}}
+    scanner.dep_requests = {'repo1': {'dep1': {}, 'dep2': {}}}
+    scanner.check_for_releases()
+    assert checked == ['dep1']
+    assert scanner.refs['dep1']['last_checked'] == clock[0]
+    assert scanner.refs['dep1']['interval'] == 60
+    clock[0] += 60
+    scanner.check_for_releases()
+    assert checked == ['dep1', 'dep1', 'dep2']
+
+
+def test_incremental_scan(tmp_path, scan_server):
+    pushed_at = {repo: '2020-01-01T00:00:00Z' for repo in scan_repos}
+    first = make_scanner(tmp_path, scan_server)
+    first.discovery.pushed_at = dict(pushed_at)
+    first.scan()
+    assert scan_server.count('GET') == len(scan_repos)
+    # Nothing pushed since.
+    second = make_scanner(tmp_path, scan_server)
+    second.discovery.pushed_at = dict(pushed_at)
+    second.scan()
+    assert scan_server.count('GET') == len(scan_repos)
+    assert second.dep_requests == first.dep_requests
+    # One repository pushed to, one just pushed to and one new repository.
+    third = make_scanner(tmp_path, scan_server)
+    third.repos = scan_repos + ['repo20']
+    third.discovery.pushed_at = dict(pushed_at)
+    third.discovery.pushed_at['repo7'] = '2020-02-01T00:00:00Z'
+    third.discovery.pushed_at['repo20'] = '2020-02-01T00:00:00Z'
+    third.discovery.pushed_at['repo3'] = time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                                                       time.gmtime())
+    third.scan()
+    assert scan_server.count('GET') == len(scan_repos) + 3
+    assert third.dep_requests == first.dep_requests
+    # The recent push is not trusted until it has settled.
+    fourth = make_scanner(tmp_path, scan_server)
+    fourth.repos = third.repos
+    fourth.discovery.pushed_at = third.discovery.pushed_at
+    fourth.scan()
+    assert scan_server.count('GET') == len(scan_repos) + 4
+
+
+def test_incremental_scan_failed_fetch(tmp_path, scan_server):
+    pushed_at = {repo: '2020-01-01T00:00:00Z' for repo in scan_repos}
+    path = '/testorg/repo15/master/harbinger.cfg'
+    config = scan_server.routes[path]
+    scan_server.routes[path] = (503, {}, 'Service Unavailable')
+    first = make_scanner(tmp_path, scan_server)
+    first.discovery.pushed_at = dict(pushed_at)
+    first.scan()
+    assert list(first.fetch_errors) == ['repo15']
+    assert list(first.dep_requests) == ['repo3', 'repo7']
+    # The config is fetched again by the next scan, although the repository
+    # was not pushed to.
+    scan_server.routes[path] = config
+    second = make_scanner(tmp_path, scan_server)
+    second.discovery.pushed_at = dict(pushed_at)
+    second.scan()
+    assert scan_server.count('GET', path) == 2
+    assert second.fetch_errors == {}
+    assert list(second.dep_requests) == ['repo3', 'repo7', 'repo15']
+    # Then counts as unchanged.
+    third = make_scanner(tmp_path, scan_server)
+    third.discovery.pushed_at = dict(pushed_at)
+    third.scan()
+    assert scan_server.count('GET', path) == 2
+    # A failure to fetch a changed config falls back on the one seen before.
+    scan_server.routes[path] = (500, {}, 'Internal Server Error')
+    fourth = make_scanner(tmp_path, scan_server)
+    fourth.discovery.pushed_at = dict(pushed_at,
+                                      repo15='2020-02-01T00:00:00Z')
+    fourth.scan()
+    assert list(fourth.fetch_errors) == ['repo15']
+    assert fourth.dep_requests == second.dep_requests
+    assert fourth.read_scan_state()['repo15']['pushed_at'] is None
+
+
+def test_full_scan(tmp_path, scan_server):
+    for i in range(2):
+        scanner = make_scanner(tmp_path, scan_server, incremental=False)
+        scanner.discovery.pushed_at = {repo: '2020-01-01T00:00:00Z'
+                                       for repo in scan_repos}
+        scanner.scan()
+    assert scan_server.count('GET') == 2 * len(scan_repos)
+    assert not os.path.exists(os.path.join(tmp_path, 'scan_state.json'))
+
+
+def test_check_for_releases_sqlite_store(tmp_path, scan_server, monkeypatch):
+    monkeypatch.setattr(ReleaseNotifier, 'github', None)
+    scanner = make_scanner(tmp_path, scan_server, store='sqlite')
+    scanner.dep_requests = {'repo1': {'test': {}}}
+    scanner.check_for_releases()
+    # Committed as soon as the dependency was processed.
+    reloaded = SQLiteStore(os.path.join(tmp_path, 'references.db')).load()
+    assert reloaded['test'] == scanner.refs['test']
+
+
+def test_check_for_releases_failed_check(tmp_path, scan_server,
+                                         monkeypatch):
+    check_for_release = ReleaseNotifier.check_for_release
+    def failing_check(self):
+        if self.dep_name == 'broken':
+            raise RuntimeError('upstream unreachable')
+        return check_for_release(self)
+    monkeypatch.setattr(ReleaseNotifier, 'check_for_release', failing_check)
+    monkeypatch.setattr(ReleaseNotifier, 'github', None)
+    gh = mock_gh('tagname')
+    scanner = make_scanner(tmp_path, scan_server, gh=gh, check_workers=4)
+    scanner.refs['broken'] = {'version': '1.0'}
+    scanner.dep_requests = {'repo1': {'broken': {}, 'test': {}}}
+    scanner.check_for_releases()
+    # The other dependency is still checked and notified.
+    assert [issue[1] for issue in gh.issues] == [
+            'Upstream release of dependency: test']
+    assert list(scanner.check_errors) == ['broken']
+    assert 'upstream unreachable' in scanner.check_errors['broken']
+    assert scanner.refs['broken'] == {'version': '1.0'}
+
+
+def test_check_for_releases_missing_reference(tmp_path, scan_server,
+                                              monkeypatch):
+    monkeypatch.setattr(ReleaseNotifier, 'github', None)
+    scan_server.routes['/testorg/repo1/master/harbinger.cfg'] = (
+            '[someorg/typo]\nrelease_style: github\n\n[test]\n')
+    gh = mock_gh('tagname')
+    scanner = make_scanner(tmp_path, scan_server, gh=gh)
+    scanner.scan()
+    # Reported along with the other problems found in the config.
+    assert scanner.config_errors['repo1'] == [
+            '[someorg/typo]: no reference value for this dependency']
+    assert scanner.dep_requests['repo1'] == {'test': {}}
+    # A dependency given without going through scan() is reported by the
+    # check phase, which goes on with the other dependencies.
+    scanner.dep_requests = {'repo1': {'someorg/typo': {}, 'test': {}}}
+    scanner.check_for_releases()
+    assert [issue[1] for issue in gh.issues] == [
+            'Upstream release of dependency: test']
+    assert list(scanner.check_errors) == ['someorg/typo']
+
+
+def test_check_for_releases_failed_notice(tmp_path, scan_server,
+                                          monkeypatch):
+    def check_for_release(self):
+        self.new_version_detected = self.ref['version'] != '2.0'
+        if self.new_version_detected:
+            self.ref = dict(self.ref, version='2.0')
+            self.comment = 'notice'
+        return self.new_version_detected
+    monkeypatch.setattr(ReleaseNotifier, 'check_for_release',
+                        check_for_release)
+    gh = mock_gh('tagname')
+    create_issue = gh.create_issue
+    def archived_create_issue(owner, repo, title, body):
+        if repo == 'archived':
+            raise RuntimeError('410 Issues are disabled')
+        return create_issue(owner, repo, title, body)
+    gh.create_issue = archived_create_issue
+    scanner = make_scanner(tmp_path, scan_server, store='sqlite', gh=gh)
+    scanner.refs['other'] = {'version': '1.0'}
+    scanner.dep_requests = {'archived': {'test': {}},
+                            'repo1': {'test': {}, 'other': {}}}
+    scanner.check_for_releases()
+    scanner.write_refs()
+    # The failed notice does not hold back the others.
+    assert sorted(issue[:2] for issue in gh.issues) == [
+            ('testorg/repo1', 'Upstream release of dependency: other'),
+            ('testorg/repo1', 'Upstream release of dependency: test')]
+    assert list(scanner.notice_errors) == ['test']
+    assert 'Issues are disabled' in \
+            scanner.notice_errors['test']['testorg/archived']
+    # Only the new version of the dependency with a failed notice is not
+    # saved, so the next run notifies again.
+    reloaded = SQLiteStore(os.path.join(tmp_path, 'references.db')).load()
+    assert reloaded['test']['version'] == '0.0.0'
+    assert reloaded['other']['version'] == '2.0'
+    gh.create_issue = create_issue
+    scanner = make_scanner(tmp_path, scan_server, store='sqlite', gh=gh)
+    scanner.dep_requests = {'archived': {'test': {}},
+                            'repo1': {'test': {}, 'other': {}}}
+    scanner.check_for_releases()
+    # The notice already posted is found open and skipped.
+    assert gh.issues[-1] == ('testorg/archived',
+                             'Upstream release of dependency: test',
+                             f'notice\n\n{version_marker("2.0")}')
+    assert len(gh.issues) == 3
+    assert scanner.issues.skipped == 1
+    assert scanner.notice_errors == {}
+    reloaded = SQLiteStore(os.path.join(tmp_path, 'references.db')).load()
+    assert reloaded['test']['version'] == '2.0'
+
+
+def test_check_for_releases_existing_issues(tmp_path, scan_server,
+                                           monkeypatch):
+    gh = mock_gh('tagname')
+    title = 'Upstream release of dependency: test'
+    gh.open_issues['testorg/repo2'] = [
+            mock_gh_issue(title, f'old notice\n\n{version_marker("0.0.0")}')]
+    monkeypatch.setattr(ReleaseNotifier, 'github', None)
+    scanner = make_scanner(tmp_path, scan_server, gh=gh)
+    scanner.dep_requests = {'repo1': {'test': {}},
+                            'repo2': {'test': {}}}
+    scanner.check_for_releases()
+    assert [issue[0] for issue in gh.issues] == ['testorg/repo1']
+    assert scanner.issues.skipped == 1
+    # A rerun finds the issue it created before.
+    scanner.refs = {'test': {'version': '0.0.0'}}
+    scanner.check_for_releases()
+    assert len(gh.issues) == 1
+    assert scanner.issues.skipped == 3
+    # Open issues are listed again on every run, as they may have been
+    # closed in between.
+    assert gh.repository_calls == 4
@@ -0,0 +1,29 @@
+from harbinger.httpcache import (conditional_headers, response_validators,
+                                 validators_match)
+
+
+def test_conditional_headers():
+    saved = {'etag': '"a"', 'file_last_modified': 'Mon, 01 Jan 2024'}
+    assert conditional_headers(saved) == {'If-None-Match': '"a"'}
+    assert conditional_headers(saved, 'file_') == {
+            'If-Modified-Since': 'Mon, 01 Jan 2024'}
+    assert conditional_headers({}) == {}
+
+
+def test_response_validators():
+    headers = {'ETag': '"a"', 'Content-Length': '10'}
+    assert response_validators(headers) == {'etag': '"a"'}
+    assert response_validators(headers, 'file_') == {'file_etag': '"a"'}
+    assert response_validators(
+            headers, extra=(('content_length', 'Content-Length'),)) == {
+            'etag': '"a"', 'content_length': '10'}
+
+
+def test_validators_match():
+    saved = {'etag': '"a"', 'content_length': '10'}
+    assert validators_match(saved, {'etag': '"a"', 'content_length': '10'})
+    assert not validators_match(saved, {'etag': '"a"', 'content_length': '9'})
+    assert not validators_match(saved, {'etag': '"b"'})
+    # Content-Length alone does not identify the content.
+    assert not validators_match(saved, {'content_length': '10'})
+    assert not validators_match(saved, {})
@@ -0,0 +1,104 @@
+import os
+from harbinger.lookup_cache import LookupCache
+from harbinger.plugins import plugin
+from harbinger.plugins.registry import registry
+from harbinger.release_notifier import ReleaseNotifier
+
+
+class clock():
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class counted_plugin(plugin.Plugin):
+    lookups = 0
+
+    def __init__(self, params, ref_ver_data):
+        counted_plugin.lookups += 1
+        self.ref = ref_ver_data
+
+    def new_version_available(self):
+        return(self.ref['version'] != '2.0')
+
+    def version_data(self):
+        return({'version': '2.0'})
+
+    def get_extra(self):
+        return('Changes')
+
+
+def test_ttl(tmp_path):
+    t = clock()
+    cache = LookupCache(os.path.join(tmp_path, 'lookups.db'), ttl=60, clock=t)
+    cache.put('k', 'test', {'new': False})
+    t.now += 59
+    assert cache.get('k') == {'new': False}
+    t.now += 1
+    assert cache.get('k') is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_eviction(tmp_path):
+    t = clock()
+    cache = LookupCache(os.path.join(tmp_path, 'lookups.db'),
+                        max_entries=2, clock=t)
+    cache.put('a', 'test', 1)
+    t.now += 1
+    cache.put('b', 'test', 2)
+    t.now += 1
+    cache.get('a')
+    t.now += 1
+    cache.put('c', 'test', 3)
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_key_ignores_schedule():
+    key = LookupCache.key('test', {'a': '1'}, {'version': '1.0'})
+    assert key == LookupCache.key('test', {'a': '1'},
+                                  {'version': '1.0', 'last_checked': 5,
+                                   'last_changed': 1, 'interval': 60})
+    assert key != LookupCache.key('test', {'a': '2'}, {'version': '1.0'})
+    assert key != LookupCache.key('test', {'a': '1'}, {'version': '1.1'})
+
+
+def test_shared_between_instances(tmp_path, monkeypatch):
+    monkeypatch.setattr(ReleaseNotifier, 'github', None)
+    monkeypatch.setitem(registry.classes, 'counted', counted_plugin)
+    monkeypatch.setattr(counted_plugin, 'lookups', 0)
+    path = os.path.join(tmp_path, 'lookups.db')
+    results = []
+    for org in ('org1', 'org2'):
+        noti = ReleaseNotifier('counted', {}, {'version': '1.0', 'interval': 7},
+                               f'{org}/repo', None,
+                               lookup_cache=LookupCache(path))
+        noti.check_for_release()
+        results.append((noti.new_version_detected, noti.ref, noti.comment))
+    assert counted_plugin.lookups == 1
+    assert results[0] == results[1]
+    assert results[1][0]
+    assert results[1][1] == {'version': '2.0'}
+    assert results[1][2].endswith('Changes')
+    # A different reference version is a different lookup.
+    noti = ReleaseNotifier('counted', {}, {'version': '2.0'}, 'org3/repo',
+                           None, lookup_cache=LookupCache(path))
+    noti.check_for_release()
+    assert not noti.new_version_detected
+    assert counted_plugin.lookups == 2
+
+
+def test_fresh(tmp_path):
+    t = clock()
+    cache = LookupCache(os.path.join(tmp_path, 'lookups.db'), ttl=60, clock=t)
+    assert not cache.fresh('k')
+    cache.put('k', 'test', {'new': False})
+    assert cache.fresh('k')
+    t.now += 60
+    assert not cache.fresh('k')
+    assert (cache.hits, cache.misses) == (0, 0)
@@ -0,0 +1,84 @@
+import os
+import json
+import yaml
+from harbinger.metrics import Metrics
+from harbinger.scanner import Scanner
+from harbinger.release_notifier import ReleaseNotifier
+from harbinger.mock_github3 import *
+from harbinger.mock_org import mock_org
+
+
+def test_counters_and_histograms():
+    metrics = Metrics()
+    metrics.incr('http_requests', host='a', status=200)
+    metrics.incr('http_requests', 2, host='a', status=200)
+    metrics.incr('http_requests', host='b', status=404)
+    assert metrics.counter('http_requests', host='a', status=200) == 3
+    assert metrics.counter('http_requests', status=404, host='b') == 1
+    assert metrics.counter('http_requests', host='c', status=200) == 0
+    for value in (0.003, 0.02, 0.02, 100):
+        metrics.observe('latency', value, plugin='x')
+    hist = metrics.histogram('latency', plugin='x')
+    assert (hist.count, hist.min, hist.max) == (4, 0.003, 100)
+    cumulative = dict(hist.cumulative())
+    assert cumulative[0.005] == 1
+    assert cumulative[0.025] == 3
+    assert cumulative[60] == 3
+    assert cumulative['+Inf'] == 4
+
+
+def test_export(tmp_path):
+    metrics = Metrics()
+    metrics.incr('checks')
+    metrics.incr('http_requests', host='api.github.com', status=200)
+    metrics.observe('phase_seconds', 0.2, phase='scan')
+    text = metrics.prometheus()
+    assert '# TYPE harbinger_checks_total counter' in text
+    assert 'harbinger_checks_total 1' in text
+    assert ('harbinger_http_requests_total{host="api.github.com",'
+            'status="200"} 1') in text
+    assert '# TYPE harbinger_phase_seconds histogram' in text
+    assert 'harbinger_phase_seconds_bucket{phase="scan",le="0.25"} 1' in text
+    assert 'harbinger_phase_seconds_bucket{phase="scan",le="0.1"} 0' in text
+    assert 'harbinger_phase_seconds_count{phase="scan"} 1' in text
+    prom = os.path.join(tmp_path, 'harbinger.prom')
+    metrics.write(prom)
+    with open(prom) as f:
+        assert f.read() == text
+    report = os.path.join(tmp_path, 'report.json')
+    metrics.write(report)
+    with open(report) as f:
+        data = json.load(f)
+    assert data['counters'][0] == {'name': 'checks', 'labels': {}, 'value': 1}
+    assert data['histograms'][0]['labels'] == {'phase': 'scan'}
+    assert sorted(os.listdir(tmp_path)) == ['harbinger.prom', 'report.json']
+
+
+def test_run_metrics(tmp_path, monkeypatch):
+    monkeypatch.setattr(ReleaseNotifier, 'github', None)
+    with mock_org('testorg', 50, density=0.2, deps=3) as org:
+        with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+            f.write(yaml.safe_dump(org.references()))
+        scanner = Scanner('testorg', tmp_path,
+                          gh=mock_gh('tagname', repos_url=org.repos_url),
+                          issue_pace=0)
+        scanner.raw_url = f'{org.url}/'
+        scanner.get_repos()
+        scanner.scan()
+        scanner.check_for_releases()
+        scanner.write_refs()
+        served = org.server.count()
+    metrics = scanner.metrics
+    for phase in ('get_repos', 'scan', 'check_for_releases', 'write_refs'):
+        assert metrics.histogram('phase_seconds', phase=phase).count == 1
+    host = '127.0.0.1'
+    assert (metrics.counter('http_requests', host=host, status=200) +
+            metrics.counter('http_requests', host=host, status=404)) == served
+    assert metrics.counter('http_not_found', host=host) == 50 - len(org.requested)
+    assert metrics.histogram('http_request_seconds', host=host).count == served
+    assert metrics.counter('configs_found') == len(org.requested)
+    assert metrics.counter('checks') == 3
+    assert metrics.counter('releases_detected') == 3
+    assert metrics.histogram('plugin_lookup_seconds', plugin='cfitsio',
+                             dep='cfitsio').count == 1
+    assert metrics.counter('issues_created') == len(scanner.gh.issues)
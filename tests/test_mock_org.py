@@ -0,0 +1,46 @@
+import os
+import yaml
+import pytest
+from harbinger.scanner import Scanner
+from harbinger.release_notifier import ReleaseNotifier
+from harbinger.mock_github3 import *
+from harbinger.mock_org import mock_org
+from harbinger.plugins.registry import registry
+
+
+@pytest.mark.parametrize('discovery', ['rest', 'graphql'])
+def test_full_run(tmp_path, monkeypatch, discovery):
+    monkeypatch.setattr(ReleaseNotifier, 'github', None)
+    with mock_org('benchorg', 250, density=0.2, deps=5) as org:
+        with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+            f.write(yaml.safe_dump(org.references()))
+        scanner = Scanner('benchorg', tmp_path,
+                          gh=mock_gh('tagname', repos_url=org.repos_url),
+                          discovery=discovery, workers=4, check_workers=4,
+                          issue_pace=0)
+        scanner.raw_url = f'{org.url}/'
+        scanner.graphql_url = f'{org.url}/graphql'
+        assert scanner.get_repos() == org.repos
+        scanner.scan()
+        assert sorted(scanner.dep_requests) == sorted(org.requested)
+        scanner.check_for_releases()
+        scanner.write_refs()
+    assert scanner.refs['cfitsio']['version'] == '4.0.0'
+    assert scanner.refs['cfitsio']['soname'] == '9'
+    assert scanner.refs['upstream000']['version'] == '1.0'
+    assert len(scanner.gh.issues) == sum(len(deps) for deps in
+                                         org.requested.values())
+
+
+def test_plugins_unregistered():
+    class other_plugin():
+        pass
+    registry.register('upstream001', other_plugin)
+    try:
+        with mock_org('benchorg', 10, deps=3):
+            assert registry.get('upstream001') is not other_plugin
+        # The synthetic plugins are gone, and the one replaced is back.
+        assert 'upstream000' not in registry.classes
+        assert registry.classes['upstream001'] is other_plugin
+    finally:
+        registry.unregister('upstream001')
@@ -0,0 +1,66 @@
+import os
+import json
+import yaml
+import pytest
+from harbinger.multiscanner import MultiScanner, read_targets
+from harbinger.release_notifier import ReleaseNotifier
+from harbinger.mock_github3 import *
+from harbinger.mock_http import mock_http_server
+
+listings = {'org1': ['repo1', 'repo2', 'repo3'],
+            'org2': ['repo1', 'repo4']}
+configs = {'org1/repo1': '[test]\n',
+           'org1/repo3': '[test]\n',
+           'org2/repo4': '[test]\n'}
+
+
+@pytest.fixture
+def server():
+    routes = {}
+    for org, repos in listings.items():
+        routes[f'/users/{org}/repos?per_page=100&page=1'] = json.dumps(
+                [{'name': repo} for repo in repos])
+        routes[f'/users/{org}/repos?per_page=100&page=2'] = '[]'
+    for repo, cfg in configs.items():
+        routes[f'/{repo}/master/harbinger.cfg'] = cfg
+    with mock_http_server(routes) as server:
+        yield server
+
+
+def test_multiple_orgs(tmp_path, server, monkeypatch):
+    monkeypatch.setattr(ReleaseNotifier, 'github', None)
+    with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+        f.write(yaml.safe_dump({'test': {'version': '1.0.0'}}))
+    gh = mock_gh('tagname', repos_url=f'{server.url}/users/{{login}}/repos')
+    scanner = MultiScanner(['org1', 'org2'], tmp_path, gh=gh, issue_pace=0)
+    for sub in scanner.scanners:
+        sub.raw_url = f'{server.url}/'
+    assert scanner.get_repos() == ['org1/repo1', 'org1/repo2', 'org1/repo3',
+                                   'org2/repo1', 'org2/repo4']
+    scanner.scan()
+    assert list(scanner.dep_requests) == list(configs)
+    scanner.check_for_releases()
+    scanner.write_refs()
+    # One upstream check, fanned out to every subscribing repository.
+    assert list(scanner.notifiers) == ['test']
+    assert scanner.metrics.counter('checks') == 1
+    assert [issue[0] for issue in gh.issues] == list(configs)
+    with open(os.path.join(tmp_path, 'references.yml')) as f:
+        assert yaml.safe_load(f)['test']['version'] == '0.0.0'
+    # All organizations go through the same connection pools.
+    assert all(sub.session is scanner.primary.session
+               for sub in scanner.scanners)
+    for org in listings:
+        assert os.path.exists(os.path.join(tmp_path, org, 'scan_state.json'))
+        assert os.path.exists(os.path.join(tmp_path, org, 'http_cache.json'))
+
+
+def test_read_targets(tmp_path):
+    path = os.path.join(tmp_path, 'targets.yml')
+    with open(path, 'w') as f:
+        f.write('- org1\n- user2\n')
+    assert read_targets(path) == ['org1', 'user2']
+    with open(path, 'w') as f:
+        f.write('org1: true\n')
+    with pytest.raises(ValueError):
+        read_targets(path)
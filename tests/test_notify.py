@@ -0,0 +1,135 @@
+import pytest
+from harbinger.notify import IssueQueue, version_marker
+from harbinger.mock_github3 import *
+
+title = 'Upstream release of dependency: dep'
+
+
+def test_skip_existing():
+    gh = mock_gh('tagname')
+    gh.open_issues['org/repo1'] = [mock_gh_issue(title, 'old')]
+    queue = IssueQueue(gh, pace=0)
+    queue.add('org/repo1', title, 'new')
+    queue.add('org/repo2', title, 'new')
+    queue.flush()
+    assert gh.issues == [('org/repo2', title, 'new')]
+    assert gh.open_issues['org/repo1'][0].comment_bodies == []
+    assert (queue.created, queue.skipped) == (1, 1)
+
+
+def test_comment_existing():
+    gh = mock_gh('tagname')
+    gh.open_issues['org/repo1'] = [mock_gh_issue(title, 'old')]
+    queue = IssueQueue(gh, on_existing='comment', pace=0)
+    queue.add('org/repo1', title, 'new')
+    queue.flush()
+    assert gh.issues == []
+    assert gh.open_issues['org/repo1'][0].comment_bodies == ['new']
+
+
+def test_listing_cached():
+    gh = mock_gh('tagname')
+    queue = IssueQueue(gh, pace=0)
+    for i in range(3):
+        queue.add('org/repo1', f'{title}{i}', 'new')
+    queue.flush()
+    assert len(gh.issues) == 3
+    assert gh.repository_calls == 1
+
+
+def test_listing_kept_across_flushes():
+    gh = mock_gh('tagname')
+    queue = IssueQueue(gh, pace=0)
+    for i in range(3):
+        queue.add('org/repo1', f'{title}{i}', 'new')
+        queue.flush()
+    assert len(gh.issues) == 3
+    assert gh.repository_calls == 1
+
+
+def test_listing_refreshed():
+    gh = mock_gh('tagname')
+    queue = IssueQueue(gh, pace=0)
+    queue.add('org/repo1', title, 'new', '1.0')
+    queue.flush()
+    # The issue is closed before the next run: it is opened again.
+    gh.open_issues['org/repo1'] = []
+    queue.reset()
+    queue.add('org/repo1', title, 'new', '1.0')
+    queue.flush()
+    assert len(gh.issues) == 2
+    assert gh.repository_calls == 2
+
+
+def test_same_version_skipped():
+    gh = mock_gh('tagname')
+    queue = IssueQueue(gh, pace=0)
+    queue.add('org/repo1', title, 'new', '1.0')
+    queue.flush()
+    queue.add('org/repo1', title, 'new', '1.0')
+    queue.flush()
+    assert len(gh.issues) == 1
+    assert queue.skipped == 1
+    assert gh.issues[0][2] == f'new\n\n{version_marker("1.0")}'
+
+
+def test_newer_version_commented():
+    gh = mock_gh('tagname')
+    issue = mock_gh_issue(title, f'old\n\n{version_marker("1.0")}')
+    gh.open_issues['org/repo1'] = [issue]
+    queue = IssueQueue(gh, pace=0)
+    queue.add('org/repo1', title, 'newer', '1.1')
+    queue.flush()
+    assert gh.issues == []
+    assert issue.comment_bodies == [f'newer\n\n{version_marker("1.1")}']
+    # Once commented, the newer release counts as notified.
+    queue.add('org/repo1', title, 'newer', '1.1')
+    queue.flush()
+    assert len(issue.comment_bodies) == 1
+    assert (queue.commented, queue.skipped) == (1, 1)
+
+
+def test_failed_notice():
+    gh = mock_gh('tagname')
+    create_issue = gh.create_issue
+    def archived_create_issue(owner, repo, title, body):
+        if repo == 'archived':
+            raise RuntimeError('410 Issues are disabled')
+        return create_issue(owner, repo, title, body)
+    gh.create_issue = archived_create_issue
+    queue = IssueQueue(gh, pace=0)
+    queue.add('org/archived', title, 'new', dep='dep')
+    queue.add('org/repo1', title, 'new', dep='dep')
+    queue.add('org/repo1', f'{title}2', 'new', dep='dep2')
+    queue.flush()
+    # The other notices are still posted.
+    assert [issue[0] for issue in gh.issues] == ['org/repo1', 'org/repo1']
+    assert queue.failed('dep') and not queue.failed('dep2')
+    assert list(queue.errors['dep']) == ['org/archived']
+    queue.reset()
+    assert not queue.failed('dep')
+
+
+def test_pacing():
+    sleeps = []
+    gh = mock_gh('tagname')
+    queue = IssueQueue(gh, pace=5, sleep=sleeps.append)
+    for i in range(3):
+        queue.add(f'org/repo{i}', title, 'new')
+    queue.flush()
+    assert len(sleeps) == 2
+    assert all(4 < s <= 5 for s in sleeps)
+
+
+def test_dry_run(capsys):
+    gh = mock_gh('tagname')
+    queue = IssueQueue(gh, dry_run=True)
+    queue.add('org/repo1', title, 'notice text')
+    queue.flush()
+    assert gh.issues == []
+    assert 'notice text' in capsys.readouterr().out
+
+
+def test_invalid_on_existing():
+    with pytest.raises(ValueError):
+        IssueQueue(mock_gh('tagname'), on_existing='replace')
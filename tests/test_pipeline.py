@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import yaml
+import pytest
+from harbinger.pipeline import Pipeline
+from harbinger.release_notifier import ReleaseNotifier
+from harbinger.scanner import Scanner
+from harbinger.mock_github3 import *
+from harbinger.mock_http import mock_http_server
+
+listing = '/users/testorg/repos'
+pages = [['repo0', 'repo1', 'repo2'], ['repo3', 'repo4'], []]
+configs = {'repo0': '[test]\n',
+           'repo2': '[test]\n\n[other]\n',
+           'repo4': '[test]\n'}
+
+
+class recording_gh(mock_gh):
+    '''Records how many listing pages had been requested when each issue
+    was created.'''
+    def __init__(self, server):
+        super().__init__('tagname', repos_url=f'{server.url}{listing}')
+        self.server = server
+        self.pages_at_issue = []
+
+    def create_issue(self, owner, repo, title, body):
+        self.pages_at_issue.append(self.server.count('GET', listing))
+        return super().create_issue(owner, repo, title, body)
+
+
+@pytest.fixture
+def server():
+    def page(method, path, headers, body):
+        number = int(path.split('page=')[-1])
+        if number == 2:
+            time.sleep(0.5)
+        return json.dumps([{'name': name} for name in pages[number - 1]])
+    routes = {listing: page}
+    for repo, cfg in configs.items():
+        routes[f'/testorg/{repo}/master/harbinger.cfg'] = cfg
+    with mock_http_server(routes) as server:
+        yield server
+
+
+def make_scanner(tmp_path, server, monkeypatch):
+    monkeypatch.setattr(ReleaseNotifier, 'github', None)
+    with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+        f.write(yaml.safe_dump({'test': {'version': '1.0.0'},
+                                'other': {'version': '1.0.0'}}))
+    scanner = Scanner('testorg', tmp_path, gh=recording_gh(server),
+                      issue_pace=0, workers=2, check_workers=2)
+    scanner.raw_url = f'{server.url}/'
+    return scanner
+
+
+def test_pipeline_matches_phased_run(tmp_path, server, monkeypatch):
+    # 'other' has no plugin; keep it from being checked.
+    phased = make_scanner(tmp_path, server, monkeypatch)
+    phased.refs['other']['last_checked'] = time.time()
+    phased.refs['other']['interval'] = 3600
+    phased.schedule.max_interval = 3600
+    phased.get_repos()
+    phased.scan()
+    phased.check_for_releases()
+    streamed = make_scanner(tmp_path, server, monkeypatch)
+    streamed.refs['other'] = dict(phased.refs['other'])
+    streamed.schedule.max_interval = 3600
+    Pipeline(streamed).run()
+    assert streamed.repos == phased.repos
+    assert streamed.dep_requests == phased.dep_requests
+    assert list(streamed.notifiers) == ['test']
+    assert streamed.refs['test']['version'] == '0.0.0'
+    assert sorted(streamed.gh.issues) == sorted(phased.gh.issues)
+    assert len(streamed.gh.issues) == 3
+    # Open issues are listed once per target repository.
+    assert streamed.gh.repository_calls == phased.gh.repository_calls == 3
+
+
+def test_pipeline_overlaps_stages(tmp_path, server, monkeypatch):
+    scanner = make_scanner(tmp_path, server, monkeypatch)
+    scanner.refs['other']['last_checked'] = time.time()
+    scanner.refs['other']['interval'] = 3600
+    scanner.schedule.max_interval = 3600
+    Pipeline(scanner).run()
+    # Notices for repositories on the first page went out before the
+    # listing was complete.
+    assert scanner.gh.pages_at_issue[0] < len(pages)
+    assert scanner.gh.pages_at_issue[-1] == len(pages)
+
+
+def test_pipeline_failed_check(tmp_path, server, monkeypatch):
+    check_for_release = ReleaseNotifier.check_for_release
+    def failing_check(self):
+        if self.dep_name == 'someorg/broken':
+            raise RuntimeError('upstream unreachable')
+        return check_for_release(self)
+    monkeypatch.setattr(ReleaseNotifier, 'check_for_release', failing_check)
+    server.routes['/testorg/repo0/master/harbinger.cfg'] = (
+            '[someorg/broken]\nrelease_style: github\n\n[test]\n')
+    scanner = make_scanner(tmp_path, server, monkeypatch)
+    scanner.refs['someorg/broken'] = {'version': '1.0.0'}
+    Pipeline(scanner).run()
+    # The other dependency is still checked and notified.
+    assert len(scanner.gh.issues) == 3
+    assert list(scanner.check_errors) == ['someorg/broken']
+    assert 'upstream unreachable' in scanner.check_errors['someorg/broken']
+    assert scanner.refs['someorg/broken'] == {'version': '1.0.0'}
+    # The scan results are saved all the same.
+    assert os.path.exists(os.path.join(tmp_path, 'scan_state.json'))
+
+
+def test_pipeline_lists_open_issues_once(tmp_path, server, monkeypatch):
+    def check_for_release(self):
+        self.new_version_detected = True
+        self.ref = dict(self.ref, version='2.0')
+        self.comment = 'notice'
+        return True
+    monkeypatch.setattr(ReleaseNotifier, 'check_for_release',
+                        check_for_release)
+    server.routes['/testorg/repo0/master/harbinger.cfg'] = (
+            '[someorg/dep]\nrelease_style: github\n\n[test]\n')
+    scanner = make_scanner(tmp_path, server, monkeypatch)
+    scanner.refs['someorg/dep'] = {'version': '1.0.0'}
+    Pipeline(scanner).run()
+    assert len(scanner.gh.issues) == 4
+    # Once per target repository, however many notices it receives.
+    assert scanner.gh.repository_calls == 3
+
+
+def test_pipeline_missing_reference(tmp_path, server, monkeypatch):
+    scanner = make_scanner(tmp_path, server, monkeypatch)
+    del scanner.refs['test']
+    Pipeline(scanner).run()
+    assert scanner.gh.issues == []
+    assert scanner.config_errors['repo0'] == [
+            '[test]: no reference value for this dependency']
+
+
+def test_pipeline_failure(tmp_path, server, monkeypatch):
+    def flush():
+        raise RuntimeError('Github is down')
+    scanner = make_scanner(tmp_path, server, monkeypatch)
+    monkeypatch.setattr(scanner.issues, 'flush', flush)
+    with pytest.raises(RuntimeError):
+        Pipeline(scanner).run()
@@ -0,0 +1,137 @@
+import os
+import yaml
+import pytest
+import requests
+from harbinger.ratelimit import RateLimiter, resource_of
+from harbinger.session import HTTPSession
+from harbinger.scanner import Scanner
+from harbinger.mock_github3 import *
+from harbinger.mock_http import mock_http_server
+
+
+class mock_clock():
+    def __init__(self):
+        self.now = 1000000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return mock_clock()
+
+
+def make_limiter(clock, **kwargs):
+    return RateLimiter(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def quota_route(clock, remaining, resource='core'):
+    def route(method, path, headers, body):
+        headers = {'X-RateLimit-Limit': '5000',
+                   'X-RateLimit-Remaining': str(remaining.pop(0)),
+                   'X-RateLimit-Reset': str(int(clock.now + 600)),
+                   'X-RateLimit-Resource': resource}
+        return (200, headers, '[]')
+    return route
+
+
+def test_token_bucket(clock):
+    limiter = make_limiter(clock, rate=10, burst=2)
+    for i in range(5):
+        limiter.acquire()
+    assert clock.sleeps == pytest.approx([0.1, 0.1, 0.1])
+    clock.now += 10
+    limiter.acquire()
+    limiter.acquire()
+    assert len(clock.sleeps) == 3
+
+
+def test_waits_for_reset(tmp_path, clock):
+    with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+        f.write(yaml.safe_dump({}))
+    limiter = make_limiter(clock, reserve=10)
+    route = quota_route(clock, [11, 10, 4999])
+    with mock_http_server({'/api': route}) as server:
+        scanner = Scanner('testorg', tmp_path, gh=mock_gh('tagname'),
+                          cache=False, limiter=limiter)
+        scanner.session.mount(f'{server.url}/', scanner.session.api_adapter)
+        scanner.getjson(f'{server.url}/api')
+        assert clock.sleeps == []
+        scanner.getjson(f'{server.url}/api')
+        assert clock.sleeps == []
+        scanner.getjson(f'{server.url}/api')
+        assert clock.sleeps == [600]
+    assert limiter.quotas['core'].remaining == 4999
+    assert limiter.report() == ('3 requests made, 4999/5000 remaining in '
+                                'quota, 600s spent waiting on rate limits')
+    assert scanner.metrics.counter('ratelimit_waits') == 1
+    assert scanner.metrics.counter('ratelimit_wait_seconds') == 600
+
+
+def test_secondary_rate_limit(tmp_path, clock):
+    with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+        f.write(yaml.safe_dump({}))
+    responses = [(403, {'Retry-After': '30'}, 'slow down'),
+                 (200, {}, '[1]')]
+    route = lambda method, path, headers, body: responses.pop(0)
+    with mock_http_server({'/api': route}) as server:
+        scanner = Scanner('testorg', tmp_path, gh=mock_gh('tagname'),
+                          cache=False, limiter=make_limiter(clock))
+        scanner.session.mount(f'{server.url}/', scanner.session.api_adapter)
+        assert scanner.getjson(f'{server.url}/api') == [1]
+    assert clock.sleeps == [30]
+
+
+def test_governed_session(clock):
+    limiter = make_limiter(clock, reserve=10)
+    route = quota_route(clock, [10, 4999])
+    session = requests.Session()
+    with mock_http_server({'/api': route}) as server:
+        HTTPSession(limiter=limiter,
+                    api_url=f'{server.url}/').share_with(session)
+        session.get(f'{server.url}/api')
+        session.get(f'{server.url}/api')
+    assert clock.sleeps == [600]
+    assert limiter.requests == 2
+
+
+def test_other_hosts_not_governed(clock):
+    limiter = make_limiter(clock, reserve=10)
+    route = quota_route(clock, [10, 4999])
+    with mock_http_server({'/api': route}) as server:
+        session = HTTPSession(limiter=limiter)
+        session.get(f'{server.url}/api')
+        session.get(f'{server.url}/api')
+    assert clock.sleeps == []
+    assert limiter.requests == 0
+
+
+def test_quota_per_resource(clock):
+    limiter = make_limiter(clock, reserve=10)
+    routes = {'/graphql': quota_route(clock, [5, 4999], 'graphql'),
+              '/repos': quota_route(clock, [4000, 3999, 2], 'core')}
+    with mock_http_server(routes) as server:
+        session = HTTPSession(limiter=limiter, api_url=f'{server.url}/')
+        session.post(f'{server.url}/graphql')
+        # The graphql quota running low does not hold back core requests.
+        session.get(f'{server.url}/repos')
+        session.get(f'{server.url}/repos')
+        assert clock.sleeps == []
+        session.post(f'{server.url}/graphql')
+        assert clock.sleeps == [600]
+        session.get(f'{server.url}/repos')
+    assert limiter.report() == ('5 requests made, 2/5000 core, 4999/5000 '
+                                'graphql remaining in quota, 600s spent '
+                                'waiting on rate limits')
+
+
+def test_resource_of():
+    assert resource_of('https://api.github.com/graphql') == 'graphql'
+    assert resource_of('https://api.github.com/search/issues?q=x') == 'search'
+    assert resource_of('https://api.github.com/repos/o/r/tags') == 'core'
@@ -0,0 +1,41 @@
+import pytest
+from harbinger.schedule import PollSchedule
+
+day = 86400
+
+
+def test_default_always_due():
+    schedule = PollSchedule()
+    ref = schedule.update({'version': '1.0'}, {'version': '1.0'}, False, 0)
+    assert schedule.is_due(ref, 0)
+
+
+def test_first_check_due():
+    schedule = PollSchedule(min_interval=day, max_interval=30 * day)
+    assert schedule.is_due({'version': '1.0'}, 0)
+
+
+def test_cadence():
+    schedule = PollSchedule(min_interval=day, max_interval=30 * day)
+    ref = schedule.update({'version': '1.0'}, {'version': '1.0'}, False, 0)
+    assert ref['interval'] == day
+    assert not schedule.is_due(ref, day - 1)
+    assert schedule.is_due(ref, day)
+    # A release 8 days later sets the interval to a quarter of that.
+    ref = schedule.update(ref, {'version': '1.1'}, True, 8 * day)
+    assert ref['last_changed'] == 8 * day
+    assert ref['interval'] == 2 * day
+    # Checks without a release keep that interval...
+    ref = schedule.update(ref, {'version': '1.1'}, False, 10 * day)
+    assert ref['interval'] == 2 * day
+    # ...and back off once the release is overdue.
+    ref = schedule.update(ref, {'version': '1.1'}, False, 28 * day)
+    assert ref['interval'] == 5 * day
+    ref = schedule.update(ref, {'version': '1.1'}, False, 400 * day)
+    assert ref['interval'] == 30 * day
+    assert ref['last_changed'] == 8 * day
+
+
+def test_invalid_bounds():
+    with pytest.raises(ValueError):
+        PollSchedule(min_interval=10, max_interval=5)
@@ -0,0 +1,45 @@
+import os
+import yaml
+from harbinger.session import HTTPSession
+from harbinger.scanner import Scanner
+from harbinger.mock_github3 import *
+from harbinger.mock_http import mock_http_server
+
+
+def test_keep_alive():
+    with mock_http_server({'/file': 'contents'}) as server:
+        session = HTTPSession(pool_size=2)
+        for i in range(10):
+            assert session.get(f'{server.url}/file').text == 'contents'
+        assert server.count('GET') == 10
+        assert server.connections() == 1
+
+
+def test_default_timeout(monkeypatch):
+    session = HTTPSession(timeout=5)
+    seen = {}
+    def request(self, method, url, **kwargs):
+        seen.update(kwargs)
+    monkeypatch.setattr('requests.Session.request', request)
+    session.get('http://localhost/')
+    assert seen['timeout'] == 5
+
+
+def test_scanner_session_shared_with_plugins(tmp_path):
+    with open(os.path.join('tests', 'cfitsio_test.tar.gz'), 'rb') as f:
+        tarball = f.read()
+    routes = {'/cfitsio_latest.tar.gz': tarball,
+              '/testorg/repo1/master/harbinger.cfg': '[cfitsio]\n'}
+    with mock_http_server(routes) as server:
+        with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+            f.write(yaml.safe_dump({'cfitsio': {'version': '1.00'}}))
+        scanner = Scanner('testorg', tmp_path, gh=mock_gh('tagname'))
+        scanner.raw_url = f'{server.url}/'
+        scanner.repos = ['repo1']
+        scanner.scan()
+        scanner.dep_requests['repo1']['cfitsio']['url'] = (
+                f'{server.url}/cfitsio_latest.tar.gz')
+        scanner.check_for_releases()
+        assert scanner.notifiers['cfitsio'].session is scanner.session
+        assert server.count('GET') == 2
+        assert server.connections() == 1
@@ -0,0 +1,47 @@
+import os
+import yaml
+import pytest
+from harbinger.state import YAMLStore, SQLiteStore, open_store
+
+refs = {'cfitsio': {'version': '3.47', 'soname': '8'},
+        'org/dep': {'version': '1.0.3'}}
+
+
+def test_yaml_store(tmp_path):
+    store = YAMLStore(os.path.join(tmp_path, 'references.yml'))
+    store.save(refs)
+    assert store.load() == refs
+    assert os.listdir(tmp_path) == ['references.yml']
+
+
+def test_yaml_store_failed_write_keeps_file(tmp_path):
+    store = YAMLStore(os.path.join(tmp_path, 'references.yml'))
+    store.save(refs)
+    with pytest.raises(Exception):
+        store.save({'bad': object()})
+    assert store.load() == refs
+    assert os.listdir(tmp_path) == ['references.yml']
+
+
+def test_sqlite_store(tmp_path):
+    store = SQLiteStore(os.path.join(tmp_path, 'references.db'))
+    store.save(refs)
+    assert store.load() == refs
+    store.update('cfitsio', {'version': '3.47', 'soname': '8',
+                             'etag': '"x"'})
+    store.update('cfitsio', {'version': '3.48', 'soname': '9'})
+    assert store.load()['cfitsio'] == {'version': '3.48', 'soname': '9'}
+    assert [v for t, v in store.history('cfitsio')] == ['3.47', '3.48']
+    assert [v for t, v in store.history('org/dep')] == ['1.0.3']
+
+
+def test_sqlite_yaml_round_trip(tmp_path):
+    yaml_file = os.path.join(tmp_path, 'references.yml')
+    with open(yaml_file, 'w') as f:
+        f.write(yaml.safe_dump(refs))
+    store = open_store('sqlite', tmp_path)
+    assert store.path == os.path.join(tmp_path, 'references.db')
+    assert store.load() == refs
+    export = os.path.join(tmp_path, 'export.yml')
+    store.export_yaml(export)
+    assert YAMLStore(export).load() == refs
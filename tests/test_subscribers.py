@@ -0,0 +1,67 @@
+import os
+import sys
+import yaml
+from harbinger import subscribers
+from harbinger.cli.main import main
+from harbinger.scanner import Scanner
+from harbinger.release_notifier import ReleaseNotifier
+from harbinger.mock_github3 import *
+from harbinger.mock_org import mock_org
+
+
+def test_build_index():
+    requests = {'org/repo1': {'cfitsio': {}, 'org/dep': {'release_style': 'github'}},
+                'org/repo2': {'org/dep': {'release_style': 'tag-only'}}}
+    assert subscribers.build_index(requests) == {
+        'cfitsio': [{'repo': 'org/repo1', 'params': {}}],
+        'org/dep': [{'repo': 'org/repo1', 'params': {'release_style': 'github'}},
+                    {'repo': 'org/repo2', 'params': {'release_style': 'tag-only'}}]}
+
+
+def test_scan_saves_index(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(ReleaseNotifier, 'github', None)
+    with mock_org('testorg', 40, density=0.3, deps=3) as org:
+        with open(os.path.join(tmp_path, 'references.yml'), 'w') as f:
+            f.write(yaml.safe_dump(org.references()))
+        scanner = Scanner('testorg', tmp_path,
+                          gh=mock_gh('tagname', repos_url=org.repos_url),
+                          issue_pace=0)
+        scanner.raw_url = f'{org.url}/'
+        scanner.get_repos()
+        scanner.scan()
+        scanner.check_for_releases()
+    expected = [f'testorg/{repo}' for repo, deps in org.requested.items()
+                if 'cfitsio' in deps]
+    index = subscribers.read_index(tmp_path)
+    assert index == scanner.subscribers
+    assert [sub['repo'] for sub in index['cfitsio']] == expected
+    # Each dependency checked once, notices fanned out to its subscribers.
+    assert scanner.metrics.counter('checks') == 3
+    assert len(scanner.gh.issues) == sum(len(subs) for subs in index.values())
+    # Queried without Github credentials or network access.
+    monkeypatch.delenv('HARBINGER_USER', raising=False)
+    monkeypatch.delenv('HARBINGER_PW', raising=False)
+    monkeypatch.setattr(sys, 'argv', ['harbinger', '-r', str(tmp_path),
+                                      'subscribers', 'cfitsio'])
+    capsys.readouterr()
+    main()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == f'cfitsio is requested by {len(expected)} repositories:'
+    assert lines[1].startswith(f'  {expected[0]} (url: {org.url}/FTP/')
+    monkeypatch.setattr(sys, 'argv', ['harbinger', '-r', str(tmp_path),
+                                      'subscribers', 'nothing'])
+    main()
+    assert capsys.readouterr().out == 'No repository requests nothing.\n'
+
+
+def test_read_all(tmp_path):
+    os.mkdir(os.path.join(tmp_path, 'org2'))
+    subscribers.write_index({'dep': [{'repo': 'org1/a', 'params': {}}]},
+                            tmp_path)
+    subscribers.write_index({'dep': [{'repo': 'org2/b', 'params': {}}],
+                             'other': [{'repo': 'org2/b', 'params': {}}]},
+                            os.path.join(tmp_path, 'org2'))
+    assert subscribers.read_all(tmp_path) == {
+        'dep': [{'repo': 'org1/a', 'params': {}},
+                {'repo': 'org2/b', 'params': {}}],
+        'other': [{'repo': 'org2/b', 'params': {}}]}
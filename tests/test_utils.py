@@ -0,0 +1,26 @@
+import os
+import stat
+import pytest
+from harbinger.utils import atomic_write
+
+
+def test_atomic_write(tmp_path):
+    path = os.path.join(tmp_path, 'state.json')
+    atomic_write(path, 'one')
+    assert open(path).read() == 'one'
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+    os.chmod(path, 0o600)
+    atomic_write(path, 'two')
+    assert open(path).read() == 'two'
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert os.listdir(tmp_path) == ['state.json']
+
+
+def test_atomic_write_failure(tmp_path):
+    path = os.path.join(tmp_path, 'state.json')
+    atomic_write(path, 'one')
+    with pytest.raises(TypeError):
+        atomic_write(path, None)
+    # The file is left as it was, without a temporary file behind.
+    assert open(path).read() == 'one'
+    assert os.listdir(tmp_path) == ['state.json']